@@ -5,9 +5,19 @@ from rest_framework.decorators import parser_classes, api_view
 from rest_framework.parsers import JSONParser
 from rest_framework.request import Request
 
-from authapp.envs import JWT_URL
+from authapp.envs import JWT_ALGORITHM, JWT_CHANGES_POLL_SECONDS, JWT_SECRET, JWT_URL
 from authapp.requests import post
 from exceptions.CustomException import BadRequestException, UnauthenticatedException
+from shared.jwt_verify import JwtCheckError, JwtVerifier
+
+
+jwt_verifier = JwtVerifier(
+    JWT_SECRET,
+    JWT_ALGORITHM,
+    JWT_URL,
+    post,
+    JWT_CHANGES_POLL_SECONDS,
+)
 
 
 def api_endpoint(http_method_names: List[str]):
@@ -54,12 +64,12 @@ def authenticated(skip_2fa=False):
                 raise UnauthenticatedException()
 
             jwt = authorization_header[7:]
-            res = post(f"{JWT_URL}/jwt/check", json={"jwt": jwt, "skip_2fa": skip_2fa})
-            if not res.ok:
-                return HttpResponse(res.content, status=res.status_code)
+            try:
+                user_id = jwt_verifier.verify(jwt, skip_2fa)
+            except JwtCheckError as e:
+                return HttpResponse(e.content, status=e.status_code)
 
-            res = res.json()
-            return func(req, user_id=int(res["user_id"]), *args, *kwargs)
+            return func(req, user_id=user_id, *args, *kwargs)
 
         return wrapper
 
@@ -14,6 +14,21 @@ def get_os_int(key: str) -> int:
     return int(get_os_str(key))
 
 
+def get_os_str_or(key: str, default: str) -> str:
+    val: str | None = os.getenv(key)
+    if val is None or val == "":
+        return default
+    return val
+
+
+def get_os_int_or(key: str, default: int) -> int:
+    return int(get_os_str_or(key, str(default)))
+
+
+def get_os_float_or(key: str, default: float) -> float:
+    return float(get_os_str_or(key, str(default)))
+
+
 FORTY_TWO_API_URL = get_os_str("FORTY_TWO_API_URL")
 
 OAUTH_42_URL = get_os_str("OAUTH_42_URL")
@@ -26,3 +41,14 @@ JWT_URL = get_os_str("JWT_URL")
 TWOFA_URL = get_os_str("TWOFA_URL")
 USER_URL = get_os_str("USER_URL")
 FRONTEND_URL = get_os_str("FRONTEND_URL")
+
+JWT_SECRET = get_os_str("JWT_SECRET")
+JWT_ALGORITHM = get_os_str("JWT_ALGORITHM")
+# How often the changes of the JWT service are polled, see `shared.jwt_verify`
+JWT_CHANGES_POLL_SECONDS = get_os_float_or("JWT_CHANGES_POLL_SECONDS", 5)
+
+# Inter-service HTTP client, see requests.py
+HTTP_CONNECT_TIMEOUT_SECONDS = get_os_int_or("HTTP_CONNECT_TIMEOUT_SECONDS", 3)
+HTTP_READ_TIMEOUT_SECONDS = get_os_int_or("HTTP_READ_TIMEOUT_SECONDS", 10)
+HTTP_RETRIES = get_os_int_or("HTTP_RETRIES", 2)
+HTTP_POOL_SIZE = get_os_int_or("HTTP_POOL_SIZE", 20)
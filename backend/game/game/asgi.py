@@ -2,6 +2,7 @@
 ASGI config for game project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Used with `GAME_SERVER_MODE=asgi`, where `gameapp.sio.sio` is a `socketio.AsyncServer`.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -9,8 +10,23 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 
+import django
+import socketio
 from django.core.asgi import get_asgi_application
 
+from gameapp.runtime import bind_loop
+from gameapp.sio import sio
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "game.settings")
+django.setup()
+
+# Registers the Socket.IO handlers and the registry commands
+import game.events
+from gameapp.outbox import outbox_dispatcher
+from gameapp.registry import match_registry
+
+match_registry.start()
+outbox_dispatcher.start()
 
 application = get_asgi_application()
+application = socketio.ASGIApp(sio, application, on_startup=bind_loop)
@@ -2,9 +2,11 @@ import logging
 from datetime import datetime, timezone, timedelta
 from http.client import INTERNAL_SERVER_ERROR
 
+from asgiref.sync import sync_to_async
 from socketio.exceptions import ConnectionRefusedError
 
 from exceptions.CustomException import CustomException
+from gameapp.envs import IS_ASGI
 from gameapp.sio import sio
 
 logger = logging.getLogger(__name__)
@@ -36,6 +38,15 @@ def event_on(event: str, *args, **kwargs):
                 elapsed = datetime.now(timezone.utc) - start
                 logger.debug(f"Elapsed = {elapsed / timedelta(milliseconds=1)}ms")
 
+        if IS_ASGI:
+            # Handlers use the ORM and blocking HTTP calls, keep them off the loop
+            async def _async_wrapper(*args, **kwargs):
+                return await sync_to_async(_wrapper, thread_sensitive=False)(
+                    *args, **kwargs
+                )
+
+            return sio.on(event, *args, **kwargs)(_async_wrapper)  # type: ignore
+
         _outer = sio.on(event, *args, **kwargs)(_wrapper)  # type: ignore
         return _outer
 
@@ -0,0 +1,89 @@
+"""
+Benchmark of the simulation hot path (no Django required):
+
+    python -m gameapp.bench
+    python -m gameapp.bench --matches 1 64 1024 --controller random
+
+For every match count, the same matches are played with single stepping
+(one `BatchPhysics` per match) and batched stepping (every match in one
+`BatchPhysics`), and the throughput is reported in ticks/s and matches/s.
+The `physics` rows time `BatchPhysics.step()` alone, without rules and controllers.
+
+With `--tick-rate 30`, matches last as long in game time but take half the steps.
+"""
+
+import argparse
+import sys
+import time
+
+from gameapp.headless import (
+    CONTROLLERS,
+    DEFAULT_MAX_TICKS,
+    DEFAULT_WINNING_SCORE,
+    HeadlessResult,
+    run_matches,
+)
+from gameapp.physics import TICK_RATE, BatchPhysics
+
+DEFAULT_MATCHES = [1, 16, 256]
+PHYSICS_TICKS = 2000
+
+
+def bench_physics_step(count: int, ticks: int = PHYSICS_TICKS) -> float:
+    """
+    Match-ticks per second of `BatchPhysics.step()` with `count` active slots.
+    Nothing resets the balls, only the cost of the step is measured.
+    """
+    physics = BatchPhysics(capacity=count)
+    for _ in range(count):
+        physics.set_active(physics.allocate(0.0, 0.0, 0.1, 0.1), True)
+
+    start = time.perf_counter()
+    for _ in range(ticks):
+        physics.step()
+    elapsed = time.perf_counter() - start
+    return count * ticks / max(elapsed, 1e-9)
+
+
+def format_row(name: str, count: int, result: HeadlessResult) -> str:
+    return (
+        f"{name:<8} {count:>6} {result.ticks_per_sec:>14,.0f} "
+        f"{result.matches_per_sec:>12,.1f} {result.finished:>6}/{result.matches:<6}"
+    )
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python -m gameapp.bench")
+    parser.add_argument("--matches", type=int, nargs="+", default=DEFAULT_MATCHES)
+    parser.add_argument(
+        "--controller", choices=sorted(CONTROLLERS), default="tracking"
+    )
+    parser.add_argument("--winning-score", type=int, default=DEFAULT_WINNING_SCORE)
+    parser.add_argument("--max-ticks", type=int, default=DEFAULT_MAX_TICKS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tick-rate", type=int, default=TICK_RATE)
+    args = parser.parse_args(argv)
+
+    controller = CONTROLLERS[args.controller]
+    print(f"{'mode':<8} {'count':>6} {'ticks/s':>14} {'matches/s':>12} {'finished':>13}")
+    for count in args.matches:
+        for name, batched in (("single", False), ("batched", True)):
+            result = run_matches(
+                count,
+                controller,
+                batched=batched,
+                seed=args.seed,
+                winning_score=args.winning_score,
+                max_ticks=args.max_ticks,
+                tick_rate=args.tick_rate,
+            )
+            print(format_row(name, count, result))
+        print(
+            f"{'physics':<8} {count:>6} {bench_physics_step(count):>14,.0f} "
+            f"{'-':>12} {'-':>13}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
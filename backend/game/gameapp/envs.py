@@ -14,9 +14,51 @@ def get_os_int(key: str) -> int:
     return int(get_os_str(key))
 
 
+def get_os_str_or(key: str, default: str) -> str:
+    val: str | None = os.getenv(key)
+    if val is None or val == "":
+        return default
+    return val
+
+
+def get_os_int_or(key: str, default: int) -> int:
+    return int(get_os_str_or(key, str(default)))
+
+
+def get_os_float_or(key: str, default: float) -> float:
+    return float(get_os_str_or(key, str(default)))
+
+
 USER_URL = get_os_str("USER_URL")
 JWT_URL = get_os_str("JWT_URL")
 GAME_URL = get_os_str("GAME_URL")
 GAMEAI_URL = get_os_str("GAMEAI_URL")
 FRONTEND_URL = get_os_str("FRONTEND_URL")
 WINNING_SCORE = get_os_int("WINNING_SCORE")
+
+# "wsgi": gunicorn with threads, "asgi": uvicorn with `socketio.AsyncServer`
+GAME_SERVER_MODE = get_os_str_or("GAME_SERVER_MODE", "wsgi")
+IS_ASGI = GAME_SERVER_MODE == "asgi"
+# Sharding of the tournament rooms, see `gameapp.registry`. Every worker process
+# claims its own id in `[0, GAME_WORKER_COUNT)` on start.
+GAME_WORKER_COUNT = get_os_int_or("GAME_WORKER_COUNT", 1)
+# Redis URL of the Socket.IO message queue and of the registry, local when empty
+GAME_MESSAGE_QUEUE = get_os_str_or("GAME_MESSAGE_QUEUE", "")
+# Rate of the authoritative simulation, velocities stay in 60 Hz units
+GAME_TICK_RATE = get_os_int_or("GAME_TICK_RATE", 60)
+# "full": emit `updateBall` every tick, "delta": only on discontinuities and keyframes
+BALL_BROADCAST = get_os_str_or("BALL_BROADCAST", "full")
+BALL_KEYFRAME_TICKS = get_os_int_or("BALL_KEYFRAME_TICKS", 30)
+# Directory to write the replay log of every match to, disabled when empty
+REPLAY_DIR = get_os_str_or("REPLAY_DIR", "")
+
+JWT_SECRET = get_os_str("JWT_SECRET")
+JWT_ALGORITHM = get_os_str("JWT_ALGORITHM")
+# How often the changes of the JWT service are polled, see `shared.jwt_verify`
+JWT_CHANGES_POLL_SECONDS = get_os_float_or("JWT_CHANGES_POLL_SECONDS", 5)
+
+# Inter-service HTTP client, see requests.py
+HTTP_CONNECT_TIMEOUT_SECONDS = get_os_int_or("HTTP_CONNECT_TIMEOUT_SECONDS", 3)
+HTTP_READ_TIMEOUT_SECONDS = get_os_int_or("HTTP_READ_TIMEOUT_SECONDS", 10)
+HTTP_RETRIES = get_os_int_or("HTTP_RETRIES", 2)
+HTTP_POOL_SIZE = get_os_int_or("HTTP_POOL_SIZE", 20)
@@ -0,0 +1,189 @@
+"""
+Headless simulator: runs matches on the same physics and rules as the server
+(`BatchPhysics` and `MatchSimulation`), with scripted or AI paddles,
+as fast as possible and without Django, Postgres or Socket.IO.
+
+Controllers decide the moves of every slot of a `BatchPhysics` at once,
+and return an array of shape `(size, 2)` holding `-1`, `0` or `1`.
+"""
+
+import time
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+from gameapp.physics import PADDLE_MOVE, TICK_RATE, BatchPhysics, tick_scale
+from gameapp.replay import ReplayLog
+from gameapp.simulation import MatchSimulation
+
+DEFAULT_WINNING_SCORE = 5
+DEFAULT_MAX_TICKS = 60 * 60 * 60
+
+Controller = Callable[[BatchPhysics, np.random.Generator], np.ndarray]
+
+
+def idle_controller(physics: BatchPhysics, rng: np.random.Generator) -> np.ndarray:
+    """
+    Never moves, so every ball that is not aimed at a paddle scores.
+    """
+    return np.zeros((physics.size, 2), dtype=np.int8)
+
+
+def random_controller(physics: BatchPhysics, rng: np.random.Generator) -> np.ndarray:
+    """
+    Scripted input noise, like a player mashing the keys.
+    """
+    return rng.integers(-1, 2, size=(physics.size, 2), dtype=np.int8)
+
+
+def tracking_controller(physics: BatchPhysics, rng: np.random.Generator) -> np.ndarray:
+    """
+    AI that follows the ball, with a dead zone of one move to avoid jittering.
+    Rallies last long, so it is the most expensive controller.
+    """
+    n = physics.size
+    diff = physics.x[:n, None] - physics.paddle[:n]
+    moves = np.sign(diff) * (np.abs(diff) > PADDLE_MOVE)
+    return moves.astype(np.int8)
+
+
+CONTROLLERS: dict[str, Controller] = {
+    "idle": idle_controller,
+    "random": random_controller,
+    "tracking": tracking_controller,
+}
+
+
+class HeadlessResult(NamedTuple):
+    matches: int
+    finished: int
+    ticks: int
+    """Sum of the ticks simulated by every match"""
+    elapsed: float
+    scores: list[list[int]]
+    replays: list[ReplayLog]
+    """Replay log of every match, empty unless `record` was set"""
+
+    @property
+    def ticks_per_sec(self) -> float:
+        return self.ticks / max(self.elapsed, 1e-9)
+
+    @property
+    def matches_per_sec(self) -> float:
+        return self.finished / max(self.elapsed, 1e-9)
+
+
+def _step_until_over(
+    physics: BatchPhysics,
+    sims: list[MatchSimulation],
+    controller: Controller,
+    rng: np.random.Generator,
+    winning_score: int,
+    max_ticks: int,
+    dt: float,
+) -> tuple[int, int]:
+    """
+    Step every match of `physics` together until each of them has a winner
+    or reached `max_ticks`. Returns `(finished, ticks)`.
+    """
+    live = sims[:]
+    for sim in live:
+        physics.set_active(sim.slot, True)
+
+    finished = 0
+    ticks = 0
+    for _ in range(max_ticks):
+        if not live:
+            break
+
+        moves = controller(physics, rng)
+        for sim in live:
+            if sim.replay is None:
+                continue
+            for idx in (0, 1):
+                move = int(moves[sim.slot, idx])
+                if move != 0:
+                    sim.replay.record_input(sim.tick, idx, move)
+        physics.move_paddles(moves, dt)
+        scorer = physics.step(dt).scorer
+        ticks += len(live)
+
+        still_live = []
+        for sim in live:
+            sim.after_step(int(scorer[sim.slot]))
+            if sim.get_winner(winning_score) != -1:
+                physics.set_active(sim.slot, False)
+                finished += 1
+            else:
+                still_live.append(sim)
+        live = still_live
+
+    return finished, ticks
+
+
+def run_matches(
+    count: int,
+    controller: Controller = tracking_controller,
+    batched: bool = True,
+    seed: int = 0,
+    winning_score: int = DEFAULT_WINNING_SCORE,
+    max_ticks: int = DEFAULT_MAX_TICKS,
+    tick_rate: int = TICK_RATE,
+    record: bool = False,
+) -> HeadlessResult:
+    """
+    Play `count` matches to `winning_score`.
+
+    With `batched`, every match lives in one `BatchPhysics` advanced by a single
+    vectorized step per tick, like in the server's `tick_engine`.
+    Otherwise each match has its own `BatchPhysics` and is played to the end
+    before the next one starts.
+    Match `i` uses the seed `seed + i`, so with a deterministic controller
+    the results do not depend on `batched`.
+    `max_ticks` is counted at `tick_rate`.
+    With `record`, the seed and inputs of every match are kept in a `ReplayLog`,
+    which `gameapp.replay.resimulate()` can play again.
+    """
+    rng = np.random.default_rng(seed)
+    dt = tick_scale(tick_rate)
+    finished = 0
+    ticks = 0
+    sims: list[MatchSimulation] = []
+
+    def make_sim(physics: BatchPhysics, i: int) -> MatchSimulation:
+        replay = (
+            ReplayLog(seed + i, False, winning_score, tick_rate) if record else None
+        )
+        return MatchSimulation(physics, False, seed + i, replay, tick_rate)
+
+    start = time.perf_counter()
+    if batched:
+        physics = BatchPhysics(capacity=max(count, 1))
+        sims = [make_sim(physics, i) for i in range(count)]
+        finished, ticks = _step_until_over(
+            physics, sims, controller, rng, winning_score, max_ticks, dt
+        )
+    else:
+        for i in range(count):
+            physics = BatchPhysics(capacity=1)
+            sim = make_sim(physics, i)
+            sims.append(sim)
+            f, t = _step_until_over(
+                physics, [sim], controller, rng, winning_score, max_ticks, dt
+            )
+            finished += f
+            ticks += t
+    elapsed = time.perf_counter() - start
+
+    for sim in sims:
+        if sim.replay is not None:
+            sim.replay.finish(sim.tick, sim.score)
+
+    return HeadlessResult(
+        matches=count,
+        finished=finished,
+        ticks=ticks,
+        elapsed=elapsed,
+        scores=[sim.score for sim in sims],
+        replays=[sim.replay for sim in sims if sim.replay is not None],
+    )
@@ -0,0 +1,155 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from gameapp.db_utils import get_room_user_or_none
+from gameapp.utils import get_match_user_or_none
+from gameapp.wsgi_utils import (
+    _get_room_name_of_match,
+    get_next_match_user,
+    load_bracket,
+)
+
+ROOM_PREFIX = "bench_lookups_"
+# Far above the real user ids. The foreign keys are deferred and never checked,
+# because every run is rolled back.
+USER_ID_BASE = 10**12
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN ANALYZE the lookups of connect, nextGame and room initialization "
+        "against synthetic rooms. Every run is rolled back, so it can be used "
+        "against a live database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rooms", type=int, default=100_000)
+        parser.add_argument("--players", type=int, default=4, choices=[2, 4, 8, 16])
+        parser.add_argument("--runs", type=int, default=100)
+
+    def handle(self, *args, **options):
+        rooms: int = options["rooms"]
+        players: int = options["players"]
+        runs: int = options["runs"]
+
+        with transaction.atomic():
+            start = time.perf_counter()
+            self.populate(rooms, players)
+            self.stdout.write(
+                f"{rooms} rooms of {players} players generated "
+                f"in {time.perf_counter() - start:.1f}s"
+            )
+
+            user_id = USER_ID_BASE + (rooms // 2) * players
+            room_user = get_room_user_or_none(user_id)
+            room_name = room_user.temp_match_room.room_name  # type: ignore
+
+            elapsed: list[float] = []
+            for _ in range(runs):
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    get_room_user_or_none(user_id)
+                    match_user = get_match_user_or_none(user_id)
+                    get_next_match_user(user_id)
+                    _get_room_name_of_match(match_user.temp_match_id)  # type: ignore
+                    load_bracket(room_name)
+                    elapsed.append((time.perf_counter() - start) * 1000)
+
+            self.stdout.write(f"{'exec ms':>8}  {'seq scan':<24} query")
+            for query in ctx.captured_queries:
+                self.explain(query["sql"])
+
+            elapsed.sort()
+            self.stdout.write(
+                f"lookups: {len(ctx.captured_queries)} queries, "
+                f"mean {statistics.mean(elapsed):.2f} ms, "
+                f"p50 {elapsed[len(elapsed) // 2]:.2f} ms"
+            )
+            transaction.set_rollback(True)
+
+    def populate(self, rooms: int, players: int):
+        params = {
+            "rooms": rooms,
+            "players": players,
+            "base": USER_ID_BASE,
+            "prefix": f"{ROOM_PREFIX}%",
+        }
+        bench_rooms = """
+            SELECT id, row_number() OVER (ORDER BY id) AS rn
+            FROM temp_match_room WHERE room_name LIKE %(prefix)s
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+            cursor.execute(
+                f"""
+                INSERT INTO temp_match_room (room_name, start_at)
+                SELECT '{ROOM_PREFIX}' || g, now() FROM generate_series(1, %(rooms)s) g
+                """,
+                params,
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO temp_match_room_user
+                    (user_id, temp_match_room_id, is_online)
+                SELECT %(base)s + (r.rn - 1) * %(players)s + k, r.id, false
+                FROM ({bench_rooms}) r, generate_series(0, %(players)s - 1) k
+                """,
+                params,
+            )
+            round_ = players
+            while round_ >= 2:
+                cursor.execute(
+                    f"""
+                    INSERT INTO temp_match (match_room_id, round, is_with_ai)
+                    SELECT r.id, %(round)s, false
+                    FROM ({bench_rooms}) r, generate_series(1, %(round)s / 2)
+                    """,
+                    {**params, "round": round_},
+                )
+                round_ //= 2
+            # Users k and k + 1 of a room play the (k / 2)th match of the first round
+            cursor.execute(
+                """
+                INSERT INTO temp_match_user (user_id, temp_match_id, score)
+                SELECT ru.user_id, m.id, 0
+                FROM temp_match_room_user ru
+                JOIN (
+                    SELECT id, match_room_id,
+                        row_number() OVER (PARTITION BY match_room_id ORDER BY id) - 1
+                        AS idx
+                    FROM temp_match WHERE round = %(players)s
+                ) m ON m.match_room_id = ru.temp_match_room_id
+                    AND m.idx = ((ru.user_id - %(base)s) %% %(players)s) / 2
+                WHERE ru.user_id >= %(base)s
+                """,
+                params,
+            )
+            for table in (
+                "temp_match_room",
+                "temp_match_room_user",
+                "temp_match",
+                "temp_match_user",
+            ):
+                cursor.execute(f"ANALYZE {table}")
+
+    def explain(self, sql: str):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")
+            plan = cursor.fetchone()[0][0]
+
+        seq_scans: list[str] = []
+        nodes = [plan["Plan"]]
+        while nodes:
+            node = nodes.pop()
+            if node["Node Type"] == "Seq Scan":
+                seq_scans.append(node["Relation Name"])
+            nodes.extend(node.get("Plans", []))
+
+        self.stdout.write(
+            f"{plan['Execution Time']:>8.3f}  {','.join(seq_scans) or '-':<24} "
+            f"{sql[:100]}"
+        )
@@ -0,0 +1,64 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from gameapp.match_objects import match_dict
+from gameapp.match_objects.waiting import waiting_dict
+from gameapp.models import User
+from gameapp.wsgi_utils import make_rooms
+
+PLAYER_COUNTS = [2, 4, 8, 16]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the latency of `make_rooms` (bracket creation) for 2/4/8/16 players. "
+        "Every run is rolled back, so it can be used against a live database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=50)
+        parser.add_argument("--players", type=int, nargs="+", default=PLAYER_COUNTS)
+
+    def handle(self, *args, **options):
+        runs: int = options["runs"]
+        players: list[int] = options["players"]
+
+        user_ids = list(
+            User.objects.filter(tempmatchroomuser__isnull=True)
+            .order_by("id")
+            .values_list("id", flat=True)[: max(players)]
+        )
+        if len(user_ids) < max(players):
+            raise CommandError(
+                f"{max(players)} users not in a room are required, found {len(user_ids)}"
+            )
+
+        self.stdout.write(
+            f"{'players':>7} {'queries':>7} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}"
+        )
+        for count in players:
+            elapsed: list[float] = []
+            queries = 0
+            for run in range(runs):
+                room_name = f"bench_{count}_{run}"
+                with transaction.atomic():
+                    with CaptureQueriesContext(connection) as ctx:
+                        start = time.perf_counter()
+                        make_rooms(room_name, user_ids[:count])
+                        elapsed.append((time.perf_counter() - start) * 1000)
+                    queries = len(ctx.captured_queries)
+                    transaction.set_rollback(True)
+
+                match_dict.clear()
+                waiting_dict.remove(room_name)
+
+            elapsed.sort()
+            self.stdout.write(
+                f"{count:>7} {queries:>7} {statistics.mean(elapsed):>9.2f} "
+                f"{elapsed[len(elapsed) // 2]:>9.2f} "
+                f"{elapsed[int(len(elapsed) * 0.95)]:>9.2f}"
+            )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from gameapp.models import TempMatch, TempMatchRoom, TempMatchRoomUser, TempMatchUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the rooms and matches left by a previous run. "
+        "Unlike `flush`, it keeps the match result outbox and the id sequences, "
+        "so undelivered results are still sent and match ids are never reused."
+    )
+
+    def handle(self, *args, **options):
+        # Children first, the rest also goes by CASCADE
+        for model in (TempMatchUser, TempMatchRoomUser, TempMatch, TempMatchRoom):
+            count, _ = model.objects.all().delete()
+            self.stdout.write(f"{model._meta.db_table}: {count} deleted")
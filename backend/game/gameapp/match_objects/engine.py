@@ -0,0 +1,188 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Callable
+
+from gameapp.envs import GAME_TICK_RATE, IS_ASGI
+from gameapp.physics import BatchPhysics, tick_scale
+from gameapp.runtime import run_coroutine
+
+if TYPE_CHECKING:
+    from .process import MatchProcess
+
+# If the loop falls behind by more than this, the missed ticks are dropped
+# instead of being replayed in a burst.
+MAX_LAG_SEC = 0.25
+
+
+class TickEngine:
+    """
+    Steps every running `MatchProcess` from a single thread on a fixed clock.
+
+    The ball and paddle state of every match lives in `physics`, which advances
+    all running matches in one vectorized step per tick, after which every match
+    gets `MatchProcess.tick()` with its own collision and scoring result.
+    Paddle inputs queued since the previous tick are applied before the step.
+
+    The simulation runs on a fixed timestep decoupled from the wall clock:
+    elapsed time is accumulated and one step of `dt` base ticks is taken per
+    `tick_sec` of it, so the game speed does not depend on scheduler jitter or
+    on the load. As collisions are swept, `GAME_TICK_RATE` can be lowered
+    (e.g. to 30) without changing the outcome of the physics.
+    Delayed work such as the serve delay after a point is registered with
+    `schedule()` and executed on the tick it falls due, instead of spawning
+    a `threading.Timer` per call.
+
+    The loop is started lazily on the first `add()`/`schedule()`, so that
+    every gunicorn worker starts its own engine after forking.
+    With `GAME_SERVER_MODE=asgi` it runs as a task on the event loop instead of
+    a thread, and the task ends whenever the engine becomes idle.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, tick_rate: int = GAME_TICK_RATE):
+        self.tick_rate = tick_rate
+        self.tick_sec = 1 / tick_rate
+        self.dt = tick_scale(tick_rate)
+        self.tick = 0
+
+        self.physics = BatchPhysics()
+
+        # Protected by lock, keyed by physics slot
+        self.processes: dict[int, "MatchProcess"] = {}
+        # Protected by lock, keyed by id(process)
+        self.input_pending: dict[int, "MatchProcess"] = {}
+        self.scheduled: list[tuple[int, int, Callable[[], None]]] = []
+        self.started = False
+
+        self.counter = itertools.count()
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+
+    def __ensure_started(self):
+        if not self.started:
+            self.started = True
+            if IS_ASGI:
+                run_coroutine(self.run_async())
+            else:
+                threading.Thread(target=self.run, daemon=True).start()
+        self.wakeup.set()
+
+    def add(self, process: "MatchProcess"):
+        with self.lock:
+            self.processes[process.slot] = process
+            self.physics.set_active(process.slot, True)
+            self.__ensure_started()
+
+    def remove(self, process: "MatchProcess"):
+        with self.lock:
+            if self.processes.get(process.slot) is process:
+                del self.processes[process.slot]
+                self.physics.set_active(process.slot, False)
+
+    def request_inputs(self, process: "MatchProcess"):
+        """
+        Let `process.apply_inputs()` run once at the start of the next tick.
+        """
+        with self.lock:
+            self.input_pending[id(process)] = process
+            self.__ensure_started()
+
+    def schedule(self, delay_sec: float, func: Callable[[], None]):
+        """
+        Run `func` on the engine thread after `delay_sec` seconds, rounded to ticks.
+        """
+        with self.lock:
+            due_tick = self.tick + max(1, round(delay_sec / self.tick_sec))
+            heapq.heappush(self.scheduled, (due_tick, next(self.counter), func))
+            self.__ensure_started()
+
+    def __is_idle(self) -> bool:
+        with self.lock:
+            if self.processes or self.scheduled or self.input_pending:
+                return False
+            self.wakeup.clear()
+            if IS_ASGI:
+                self.started = False
+            return True
+
+    def __step(self):
+        due: list[Callable[[], None]] = []
+        with self.lock:
+            self.tick += 1
+            while self.scheduled and self.scheduled[0][0] <= self.tick:
+                due.append(heapq.heappop(self.scheduled)[2])
+
+        # Before the snapshot: a due function may add or remove a match,
+        # which then takes part in this step or not at all
+        for func in due:
+            try:
+                func()
+            except Exception as e:
+                self.logger.error("scheduled function raised an exception")
+                self.logger.exception(e)
+
+        with self.lock:
+            processes = dict(self.processes)
+            input_pending = list(self.input_pending.values())
+            self.input_pending.clear()
+
+        for process in input_pending:
+            try:
+                process.apply_inputs()
+            except Exception as e:
+                self.logger.error(f"apply_inputs failed, room_name={process.room_name}")
+                self.logger.exception(e)
+
+        # Only the slots of the snapshot, so every slot stepped gets its `tick()`
+        # even if a match is added or removed from another thread meanwhile
+        events = self.physics.step(self.dt, list(processes))
+        collided = events.wall | events.paddle
+        for slot, process in processes.items():
+            try:
+                process.tick(bool(collided[slot]), int(events.scorer[slot]))
+            except Exception as e:
+                self.logger.error(f"tick failed, room_name={process.room_name}")
+                self.logger.exception(e)
+
+    def __advance(self, prev: float, accumulated: float) -> tuple[float, float]:
+        """
+        Take the steps due since `prev`. Returns the new `(prev, accumulated)`.
+        """
+        current = time.monotonic()
+        accumulated += current - prev
+
+        if accumulated > MAX_LAG_SEC:
+            self.logger.warning(f"tick engine is lagging by {accumulated:.3f}s")
+            accumulated = self.tick_sec
+
+        while accumulated >= self.tick_sec:
+            self.__step()
+            accumulated -= self.tick_sec
+        return current, accumulated
+
+    def run(self):
+        prev = time.monotonic()
+        accumulated = 0.0
+        while True:
+            if self.__is_idle():
+                self.wakeup.wait()
+                prev = time.monotonic()
+                accumulated = 0.0
+
+            prev, accumulated = self.__advance(prev, accumulated)
+            time.sleep(self.tick_sec - accumulated)
+
+    async def run_async(self):
+        prev = time.monotonic()
+        accumulated = 0.0
+        while not self.__is_idle():
+            prev, accumulated = self.__advance(prev, accumulated)
+            await asyncio.sleep(self.tick_sec - accumulated)
+
+
+tick_engine = TickEngine()
@@ -4,21 +4,22 @@ import threading
 from typing import TYPE_CHECKING
 
 from exceptions.CustomException import InternalException
-from gameapp.envs import USER_URL
-from gameapp.models import (
-    TempMatch,
-    TempMatchRoom,
-    TempMatchRoomUser,
-    TempMatchUser,
+from gameapp.models import TempMatch, TempMatchUser
+from gameapp.persistence import (
+    CreateMatchUser,
+    DeleteMatchUser,
+    DeleteRoom,
+    DeleteRoomUser,
+    SaveMatchResult,
+    write_behind,
 )
-from gameapp.requests import post
 from gameapp.sio import (
     GAME_OVER_EVENT,
     INIT_EVENT,
     OPPONENT_EVENT,
     sio_disconnect,
     sio_emit,
-    sio_enter_room,
+    sio_enter_match_room,
 )
 from gameapp.utils import get_match_name, now
 from .matchdict import match_dict
@@ -139,10 +140,10 @@ class Match:
         If the second situation happens, `__set_win_and_lose()` method is called,
             which results in calling this method.
         """
-        TempMatchRoomUser.objects.filter(
-            user_id=self.users[loser_idx]["id"],
-            temp_match_room_id=self.match.match_room.id,
-        ).delete()
+        write_behind.enqueue(
+            self.match.match_room.room_name,
+            DeleteRoomUser(self.users[loser_idx]["id"], self.match.match_room_id),  # type: ignore
+        )
         self.stage = MatchStage.FINISHED
 
     def __set_win(self, winner_idx: int):
@@ -179,6 +180,7 @@ class Match:
         )
 
         json_obj = {
+            "match_id": self.match.id,
             "player1_id": self.users[0]["id"],
             "player1_score": scores[0],
             "player2_id": self.users[1]["id"],
@@ -202,31 +204,27 @@ class Match:
 
         sio_emit(GAME_OVER_EVENT, game_over_data, self.room_name)
 
-        resp = post(
-            f"{USER_URL}/_internal/dashboard",
-            json=json_obj,
+        write_behind.enqueue(
+            self.match.match_room.room_name, SaveMatchResult(self.match.id, json_obj)
         )
-        if not resp.ok:
-            self.logger.error(f"resp is not ok, resp = {resp.text}")
 
         if self.match.winner_match is not None:
             self.logger.info(f"winner match id: {self.match.winner_match.id}")
-            TempMatchUser.objects.create(
-                user_id=winner["id"],
-                temp_match_id=self.match.winner_match.id,
+            write_behind.enqueue(
+                self.match.match_room.room_name,
+                CreateMatchUser(winner["id"], self.match.winner_match.id),
             )
             match_decided(match_dict, winner, self.match.winner_match)  # type: ignore
         else:
             self.logger.info(f"deleting winner id = {winner['id']}")
-            TempMatchRoomUser.objects.filter(user_id=winner["id"]).delete()
-
-            # Dependency on CASCADE
             self.logger.info(
                 f"Deleting match room name ={self.match.match_room.room_name}"
             )
-            TempMatchRoom.objects.filter(
-                room_name=self.match.match_room.room_name
-            ).delete()
+            write_behind.enqueue(
+                self.match.match_room.room_name,
+                DeleteRoomUser(winner["id"]),
+                DeleteRoom(self.match.match_room.room_name),
+            )
 
             self.emit_final_opponent()
 
@@ -303,9 +301,10 @@ class Match:
                 {"paddleId": "paddle1" if idx == 0 else "paddle2"},
                 to=user["sid"],
             )
-            sio_enter_room(user["sid"], self.room_name)
+            sio_enter_match_room(user["sid"], self.room_name)
             self.users[idx] = user
             self.online[idx] = True
+            match_dict.index_user(user, self.match.id)
 
             if self.stage == MatchStage.FINISHED:
                 self.logger.info(
@@ -344,12 +343,14 @@ class Match:
                 f"When AI is connected, self.users len is not 1! users={self.users}"
             )
 
-        self.users.append(AiUser(is_ai=True, sid=sid, id=AI_ID))
+        ai_user = AiUser(is_ai=True, sid=sid, id=AI_ID)
+        self.users.append(ai_user)
         self.online.append(True)
+        match_dict.index_user(ai_user, self.match.id)
 
         with self.lock:
             sio_emit(INIT_EVENT, {"paddleId": "paddle2"}, to=sid)
-            sio_enter_room(sid, self.room_name)
+            sio_enter_match_room(sid, self.room_name)
 
             self.logger.info("waiting process stop")
             self.waiting_process.stop()
@@ -381,8 +382,11 @@ class Match:
         ai_sid = self.users[1]["sid"]
         sio_disconnect(ai_sid)
 
-        TempMatchRoomUser.objects.filter(user_id=user["id"]).delete()
-        TempMatchUser.objects.filter(user_id=user["id"]).delete()
+        write_behind.enqueue(
+            self.match.match_room.room_name,
+            DeleteRoomUser(user["id"]),
+            DeleteMatchUser(user["id"]),
+        )
 
     def user_disconnected(self, user: RealUser):
         with self.lock:
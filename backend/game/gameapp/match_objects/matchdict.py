@@ -1,5 +1,7 @@
+import threading
 from typing import TYPE_CHECKING
 
+from .matchuser import AI_ID
 
 if TYPE_CHECKING:
     from .match import Match
@@ -7,35 +9,78 @@ if TYPE_CHECKING:
 
 
 class MatchDict:
+    """
+    Besides the matches keyed by match id, keeps secondary indexes
+    (sid -> match id, user id -> match id) of the connected users,
+    so that routing a socket event to its match does not scan every match.
+    """
+
     match_dict_2: dict[int, "Match"]
 
     def __init__(self) -> None:
         self.match_dict_2 = {}
 
+        # Protected by lock
+        self.sid_index: dict[str, int] = {}
+        self.user_index: dict[int, int] = {}
+        self.lock = threading.Lock()
+
     def delete_match_id(self, match_id: int):
-        del self.match_dict_2[match_id]
+        match = self.match_dict_2.pop(match_id)
+        with self.lock:
+            for user in match.users:
+                if self.sid_index.get(user["sid"]) == match_id:
+                    del self.sid_index[user["sid"]]
+                if self.user_index.get(user["id"]) == match_id:
+                    del self.user_index[user["id"]]
 
     def get_dict(self) -> dict[int, "Match"]:
         return self.match_dict_2
 
     def clear(self):
         self.match_dict_2 = {}
+        with self.lock:
+            self.sid_index = {}
+            self.user_index = {}
 
     def get(self, match_id: int) -> "Match | None":
         if match_id in self.match_dict_2:
             return self.match_dict_2[match_id]
         return None
 
+    def index_user(self, user: "MatchUser", match_id: int):
+        with self.lock:
+            self.sid_index[user["sid"]] = match_id
+            # Every AI shares `AI_ID`, so AI is only reachable by its sid
+            if user["id"] != AI_ID:
+                self.user_index[user["id"]] = match_id
+
+    def unindex_user(self, sid: str, user_id: int):
+        with self.lock:
+            match_id = self.sid_index.pop(sid, None)
+            if match_id is not None and self.user_index.get(user_id) == match_id:
+                del self.user_index[user_id]
+
     def get_room_by_user_dto(self, user_dto: "MatchUser"):
-        for match in self.match_dict_2.values():
-            if match.is_user_dto_connected(user_dto):
-                return match
+        with self.lock:
+            match_id = self.sid_index.get(user_dto["sid"])
+        if match_id is None:
+            return None
+
+        match = self.get(match_id)
+        if match is not None and match.is_user_dto_connected(user_dto):
+            return match
         return None
 
     def get_room_by_userid(self, user_id: int) -> "Match | None":
-        for match in self.match_dict_2.values():
-            if match.is_user_connected(user_id):
-                return match
+        with self.lock:
+            match_id = self.user_index.get(user_id)
+        if match_id is None:
+            return None
+
+        match = self.get(match_id)
+        if match is not None and match.is_user_connected(user_id):
+            return match
         return None
 
     def __getitem__(self, match_id: int) -> "Match":
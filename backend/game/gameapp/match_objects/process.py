@@ -1,11 +1,21 @@
+import itertools
 import logging
-import random
+import os
+import secrets
 import threading
 from typing import TYPE_CHECKING
 
 from exceptions.CustomException import InternalException
-from gameapp.envs import WINNING_SCORE
-from gameapp.models import TempMatch, TempMatchUser
+from gameapp.envs import (
+    BALL_BROADCAST,
+    BALL_KEYFRAME_TICKS,
+    REPLAY_DIR,
+    WINNING_SCORE,
+)
+from gameapp.models import TempMatch
+from gameapp.persistence import SaveMatchStart, SaveScore, write_behind
+from gameapp.replay import ReplayLog
+from gameapp.runtime import run_in_background
 from gameapp.sio import (
     GAME_OVER_EVENT,
     RESET_POSITIONS_EVENT,
@@ -13,25 +23,35 @@ from gameapp.sio import (
     UPDATE_PADDLE_EVENT,
     UPDATE_SCORE_EVENT,
     sio_emit,
+    sio_emit_packed,
 )
+from gameapp.simulation import MatchSimulation
 from gameapp.utils import get_match_name, now
+from .engine import tick_engine
 from .matchuser import MatchUser
 
 if TYPE_CHECKING:
     from .match import Match
 
-GAME_BOUNDS = {"x": 5, "y": 7}
-PADDLE_WIDTH = 1
-PADDLE_HEIGHT = 0.2
-BALL_RADIUS = 0.2
-PADDLE_MOVE = 0.075
-INITIAL_SPEED = 0.05
-BALL_SIZE = {"x": 0.4, "y": 0.4, "z": 0.4}
+START_DELAY_SEC = 3.0
+
+
+class MatchProcess:
+    """
+    Simulation of a single match. It does not own a thread:
+    `start()` registers it to `tick_engine`, which calls `tick()` at a fixed rate.
 
-GAME_RIGHTEND = GAME_BOUNDS["x"] - PADDLE_WIDTH / 2
+    The rules live in `sim` (`MatchSimulation`), whose ball and paddles are stored
+    in the `slot` of `tick_engine.physics`. This class adds the broadcasting and
+    the persistence around it. When `REPLAY_DIR` is set, the seed and inputs of
+    the match are written there as a replay log (see `gameapp.replay`).
 
+    With `BALL_BROADCAST=delta`, `updateBall` is only emitted when the ball moves
+    discontinuously (bounce, paddle hit, reset, serve) and every
+    `BALL_KEYFRAME_TICKS` ticks; clients extrapolate from `vx/vy` in between.
+    Matches with AI always broadcast every tick, as the AI client relies on it.
+    """
 
-class MatchProcess(threading.Thread):
     logger = logging.getLogger(__name__)
 
     def __init__(
@@ -41,8 +61,6 @@ class MatchProcess(threading.Thread):
         match_manager: "Match",
         users: list[MatchUser],
     ):
-        super().__init__()
-
         self.is_with_ai = is_with_ai
         self.match_manager = match_manager
         self.room_name = get_match_name(match)
@@ -52,13 +70,33 @@ class MatchProcess(threading.Thread):
             self.logger.error(f"users len is not 2, users={users}")
             raise InternalException()
 
-        self.ball = {"x": 0.0, "y": 0.0, "vx": 0.1, "vy": 0.1}
+        seed = secrets.randbits(32)
+        self.replay = (
+            ReplayLog(seed, is_with_ai, WINNING_SCORE, tick_engine.tick_rate)
+            if REPLAY_DIR != ""
+            else None
+        )
+        self.sim = MatchSimulation(
+            tick_engine.physics,
+            is_with_ai,
+            seed,
+            self.replay,
+            tick_engine.tick_rate,
+        )
+        self.slot = self.sim.slot
+        self.physics = tick_engine.physics
         self.score = [0, 0]
         self.match = match
 
+        self.is_delta_broadcast = BALL_BROADCAST == "delta" and not is_with_ai
+        self.seq = itertools.count()
+        self.ticks_since_ball_emit = 0
+        self.ball_dirty = True
+
         # Protected by lock
-        self.paddle = [0.0, 0.0]
+        self.pending_moves = [0, 0]
         self.game_over = False
+        self.released = False
 
         self.event = threading.Event()
         self.lock = threading.Lock()
@@ -70,62 +108,61 @@ class MatchProcess(threading.Thread):
             return 1
         return -1
 
-    def set_paddle(self, user_id: int, paddle_direction: float):
+    def __release(self):
         with self.lock:
-            self.logger.info(
-                f"user_id={user_id}, room_name={self.room_name}, direction={paddle_direction}"
-            )
-            idx = self.__get_idx(user_id)
-
-        self.logger.debug(
-            f"user_id={user_id}, idx={idx}, paddle_direction={paddle_direction}"
-        )
+            if self.released:
+                return
+            self.released = True
+        tick_engine.remove(self)
+        # Freed on the engine thread, after a step that may still use the slot
+        tick_engine.schedule(0, self.sim.release)
+
+    def queue_paddle(self, user_id: int, paddle_direction: float):
+        """
+        Queue one paddle input. Inputs are coalesced and applied by `apply_inputs()`
+        once per tick, so a client cannot trigger more than one `updatePaddle` per tick.
+        """
         if paddle_direction == 0:
-            self.logger.info(f"user_id={user_id}, paddle_direction is zero, returning")
+            self.logger.debug(f"user_id={user_id}, paddle_direction is zero, returning")
             return
 
         with self.lock:
-            paddle_pos = self.paddle[idx]
-
-        normalized_direction = PADDLE_MOVE if paddle_direction > 0 else -PADDLE_MOVE
-        self.logger.debug(
-            f"user_id={user_id} paddle_pos was={paddle_pos} normalized_direction={normalized_direction}"
-        )
-        x = paddle_pos + normalized_direction
-        x = max(-GAME_RIGHTEND, min(GAME_RIGHTEND, x))
-        self.logger.debug(f"user_id={user_id}, prev val={paddle_pos}, become x={x}")
-
-        with self.lock:
-            self.paddle[idx] = x
-
-        emit_json = {"paddleId": "paddle1" if idx == 0 else "paddle2", "position": x}
-        sio_emit(
-            UPDATE_PADDLE_EVENT,
-            emit_json,
-            self.room_name,
-        )
+            if self.released:
+                return
+            idx = self.__get_idx(user_id)
+            if idx == -1:
+                self.logger.error(
+                    f"user_id={user_id} is not a player of room_name={self.room_name}"
+                )
+                return
+            self.pending_moves[idx] += 1 if paddle_direction > 0 else -1
 
-    def reset_game(self, scorer_idx: int):
-        self.ball = {"x": 0.0, "y": 0.0, "vx": 0.0, "vy": 0.0}
+        tick_engine.request_inputs(self)
 
-        paddle = [0.0, 0.0]
+    def apply_inputs(self):
+        """
+        Called by `tick_engine` before the physics step when inputs are queued.
+        The net direction of every input received since the last tick moves
+        the paddle by at most one `PADDLE_MOVE`.
+        """
         with self.lock:
-            self.paddle = paddle[:]
-        sio_emit(RESET_POSITIONS_EVENT, {}, self.room_name)
-
-        def start_game_func():
-            initial_speed = INITIAL_SPEED
-            self.ball["vx"] = initial_speed * (
-                (int(random.random() * 10000) % 2) * 2 - 1
+            if self.released:
+                return
+            moves = self.pending_moves
+            self.pending_moves = [0, 0]
+
+        for idx, move in enumerate(moves):
+            if move == 0:
+                continue
+
+            x = self.sim.move_paddle(idx, move)
+            emit_json = {"paddleId": "paddle1" if idx == 0 else "paddle2", "position": x}
+            sio_emit_packed(
+                UPDATE_PADDLE_EVENT,
+                emit_json,
+                self.room_name,
+                next(self.seq),
             )
-            if self.is_with_ai:
-                self.ball["vy"] = initial_speed if scorer_idx == 0 else -initial_speed
-            else:
-                self.ball["vy"] = -initial_speed
-            sio_emit(UPDATE_BALL_EVENT, self.ball, self.room_name)
-
-        t = threading.Timer(3.0, start_game_func)
-        t.start()
 
     def __is_not_decided(self):
         if not self.is_with_ai and len(self.users) != 2:
@@ -134,73 +171,53 @@ class MatchProcess(threading.Thread):
 
     def __start_hook(self):
         self.match.start_at = now()
-        self.match.save()
-
-    def __move_ball(self):
-        ball = self.ball
-        ball["x"] += ball["vx"]
-        ball["y"] += ball["vy"]
-
-    def __check_ball_hit_wall(self):
-        ball = self.ball
-        if (
-            ball["x"] >= GAME_BOUNDS["x"] - BALL_SIZE["x"] / 2
-            or ball["x"] <= -GAME_BOUNDS["x"] + BALL_SIZE["x"] / 2
-        ):
-            ball["vx"] *= -1
-            if ball["x"] > 0:
-                ball["x"] = GAME_BOUNDS["x"] - BALL_SIZE["x"] / 2
-            else:
-                ball["x"] = -GAME_BOUNDS["x"] + BALL_SIZE["x"] / 2
-
-    def __check_ball_hit_paddle(self, paddle: list[float]):
-        ball = self.ball
-        hit_bottom_paddle = (
-            ball["y"] - BALL_SIZE["y"] / 2 <= -GAME_BOUNDS["y"] + PADDLE_HEIGHT
-            and ball["x"] + BALL_SIZE["x"] / 2 >= paddle[0] - PADDLE_WIDTH / 2
-            and ball["x"] - BALL_SIZE["x"] / 2 <= paddle[0] + PADDLE_WIDTH / 2
+        write_behind.enqueue(
+            self.match.match_room.room_name,
+            SaveMatchStart(self.match.id, self.match.start_at),
         )
 
-        hit_top_paddle = (
-            ball["y"] + BALL_SIZE["y"] / 2 >= GAME_BOUNDS["y"] - PADDLE_HEIGHT
-            and ball["x"] + BALL_SIZE["x"] / 2 >= paddle[1] - PADDLE_WIDTH / 2
-            and ball["x"] - BALL_SIZE["x"] / 2 <= paddle[1] + PADDLE_WIDTH / 2
+    def __emit_ball(self):
+        self.ticks_since_ball_emit = 0
+        self.ball_dirty = False
+        sio_emit_packed(
+            UPDATE_BALL_EVENT,
+            self.physics.get_ball(self.slot),
+            self.room_name,
+            next(self.seq),
         )
 
-        if hit_bottom_paddle or hit_top_paddle:
-            ball["vy"] *= -1.05
-            ball["vx"] *= 1.05
-
-            ball["vy"] = min(ball["vy"], 0.2)
-            ball["vy"] = max(ball["vy"], -0.2)
-
-    def __check_scorer(self):
-        ball = self.ball
-        score = self.score
-
-        scorer = -1
-        if ball["y"] >= GAME_BOUNDS["y"] - BALL_SIZE["y"] / 2:
-            scorer = 0
-        elif ball["y"] <= -GAME_BOUNDS["y"] + BALL_SIZE["y"] / 2:
-            scorer = 1
+    def __should_emit_ball(self, collided: bool) -> bool:
+        if not self.is_delta_broadcast:
+            return True
+        return (
+            collided
+            or self.ball_dirty
+            or self.ticks_since_ball_emit >= BALL_KEYFRAME_TICKS
+        )
 
-        if scorer == -1:
-            return
+    def __on_scored(self):
+        with self.lock:
+            self.score = self.sim.score[:]
+            score = self.score[:]
 
-        score[scorer] += 1
-        sio_emit(
+        sio_emit_packed(
             UPDATE_SCORE_EVENT,
             {"paddle1": score[0], "paddle2": score[1]},
             self.room_name,
+            next(self.seq),
         )
+        sio_emit(RESET_POSITIONS_EVENT, {}, self.room_name)
+        self.ball_dirty = True
 
-        self.reset_game(scorer)
-
-    def __is_winner(self) -> bool:
-        self.logger.debug(f"[__is_winner] self.is_with_ai={self.is_with_ai}")
-        if self.is_with_ai:
-            return False
-        return self.score[0] == WINNING_SCORE or self.score[1] == WINNING_SCORE
+    def __finish_replay(self):
+        """
+        Must be called on the engine thread, after this match left the engine.
+        """
+        if self.replay is None:
+            return
+        self.replay.finish(self.sim.tick, self.sim.score)
+        path = os.path.join(REPLAY_DIR, f"{self.room_name}.json.gz")
+        run_in_background(self.replay.save, path)
 
     def __finish_match(self):
         with self.lock:
@@ -221,8 +238,11 @@ class MatchProcess(threading.Thread):
             },
             self.room_name,
         )
-        set_score(self.users[0]["id"], self.match.id, self.score[0])
-        set_score(self.users[1]["id"], self.match.id, self.score[1])
+        write_behind.enqueue(
+            self.match.match_room.room_name,
+            SaveScore(self.users[0]["id"], self.match.id, self.score[0]),
+            SaveScore(self.users[1]["id"], self.match.id, self.score[1]),
+        )
         self.match_manager.alert_winner(winner_idx)
 
     def is_event_set(self):
@@ -233,41 +253,56 @@ class MatchProcess(threading.Thread):
         with self.lock:
             return self.score[:]
 
-    def run(self):
+    def start(self):
         with self.lock:
-            if self.__is_not_decided():
-                return
+            not_decided = self.__is_not_decided()
+        if not_decided:
+            self.__release()
+            return
         self.__start_hook()
 
-        self.event.wait(3)
-
-        while not self.is_event_set():
+        def add_to_engine():
+            # Checked under the lock, so a released slot is never re-activated
             with self.lock:
-                paddle = self.paddle[:]
-                game_over = self.game_over
+                if not self.event.is_set() and not self.released:
+                    tick_engine.add(self)
 
-            if game_over:
-                break
+        tick_engine.schedule(START_DELAY_SEC, add_to_engine)
 
-            self.__move_ball()
-            self.__check_ball_hit_wall()
-            self.__check_ball_hit_paddle(paddle)
-            self.__check_scorer()
+    def tick(self, collided: bool, scorer: int):
+        """
+        Called by `tick_engine` after every physics step.
+        `collided` is True when the ball bounced off a wall or a paddle in this step,
+        `scorer` is the index of the player who scored in this step, or `-1`.
+        """
+        with self.lock:
+            game_over = self.game_over
 
-            if self.__is_winner():
-                self.__finish_match()
-            else:
-                sio_emit(UPDATE_BALL_EVENT, self.ball, self.room_name)
+        if game_over:
+            return
 
-            self.event.wait(0.016)
+        scored, served = self.sim.after_step(scorer)
+        if scored:
+            self.__on_scored()
+        if served:
+            self.ball_dirty = True
+
+        if self.sim.get_winner(WINNING_SCORE) != -1:
+            self.__release()
+            self.__finish_replay()
+            # Finishing the match touches the database and the user service,
+            # so it must not block the engine thread shared by every match.
+            run_in_background(self.__finish_match)
+        else:
+            self.ticks_since_ball_emit += 1
+            if self.__should_emit_ball(collided):
+                self.__emit_ball()
 
     def stop(self):
         self.logger.info(f"Process stopped! name={self.room_name}")
         with self.lock:
             self.event.set()
-
-
-def set_score(user_id: int, match_id: int, score: int):
-    user = TempMatchUser.objects.get(user_id=user_id, temp_match_id=match_id)
-    user.score = score
-    user.save()
+            released = self.released
+        self.__release()
+        if not released:
+            tick_engine.schedule(0, self.__finish_replay)
@@ -1,23 +1,34 @@
 import threading
 from typing import TYPE_CHECKING
 
+from gameapp.runtime import Timer, call_later
+
 if TYPE_CHECKING:
     from .match import Match
 
 TIMEOUT_SEC = 10
 
 
-class WaitingProcess(threading.Thread):
+class WaitingProcess:
+    """
+    Calls `match.timed_out()` after `timeout_sec`, unless stopped before.
+    Runs on a `gameapp.runtime.Timer`, so it does not hold a thread while waiting
+    in the ASGI mode.
+    """
+
     def __init__(self, match: "Match", timeout_sec: int = TIMEOUT_SEC):
-        super().__init__()
         self.event = threading.Event()
         self.time_out = False
         self.match = match
         self.timeout_sec = timeout_sec
+        self.timer: Timer | None = None
 
-    def run(self):
+    def start(self):
         print("WatingProcess - Run start")
-        self.event.wait(self.timeout_sec)
+        if self.timer is None:
+            self.timer = call_later(self.timeout_sec, self.__run)
+
+    def __run(self):
         if self.event.is_set():
             return
         self.time_out = True
@@ -27,6 +38,8 @@ class WaitingProcess(threading.Thread):
     def stop(self):
         print("WaitingProcess - Run Stopped")
         self.event.set()
+        if self.timer is not None:
+            self.timer.cancel()
 
     def is_time_out(self) -> bool:
         if not self.event.is_set():
@@ -3,6 +3,7 @@ import threading
 from typing import TYPE_CHECKING
 
 from gameapp.connect_utils import connect_users, disconnect_users
+from gameapp.runtime import Timer, call_later, run_in_background
 
 
 if TYPE_CHECKING:
@@ -12,23 +13,45 @@ if TYPE_CHECKING:
 WAITING_SEC = 10
 
 
-class WaitingUsersJoin(threading.Thread):
+class WaitingUsersJoin:
+    """
+    Waits up to `WAITING_SEC` for every user of the room to join, then connects
+    them to their matches, or disconnects all of them if someone failed to join.
+    """
+
     def __init__(self, users: "list[RealUser]", room_name: str):
-        super().__init__()
         self.event = threading.Event()
         self.users = users
         self.room_name = room_name
 
         self.lock = threading.Lock()
         self.ok = False
+        self.started = False
+        self.finished = False
+        self.timer: Timer | None = None
 
-    def run(self):
-        self.event.wait(WAITING_SEC)
+    def start(self):
+        with self.lock:
+            self.started = True
+            done = self.event.is_set()
+            if not done:
+                self.timer = call_later(WAITING_SEC, self.__run)
+        if done:
+            run_in_background(self.__run)
+
+    def __run(self):
         with self.lock:
+            if self.finished:
+                return
+            self.finished = True
             if not self.event.is_set():
                 self.event.set()
                 self.ok = False
             ok = self.ok
+            timer = self.timer
+
+        if timer is not None:
+            timer.cancel()
 
         if ok:
             connect_users(self.users)
@@ -42,6 +65,9 @@ class WaitingUsersJoin(threading.Thread):
                 return
             self.event.set()
             self.ok = True
+            started = self.started
+        if started:
+            run_in_background(self.__run)
 
     def fail(self):
         with self.lock:
@@ -49,7 +75,10 @@ class WaitingUsersJoin(threading.Thread):
                 return False
             self.event.set()
             self.ok = False
-            return True
+            started = self.started
+        if started:
+            run_in_background(self.__run)
+        return True
 
 
 class Waiting:
@@ -0,0 +1,33 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gameapp", "0003_remove_tempmatch_joined_user_tempmatch_is_with_ai"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MatchResultOutbox",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("match_id", models.BigIntegerField(unique=True)),
+                ("payload", models.JSONField()),
+                ("attempts", models.IntegerField(default=0)),
+                (
+                    "created_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "match_result_outbox",
+            },
+        ),
+    ]
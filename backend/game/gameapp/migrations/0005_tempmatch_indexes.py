@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("gameapp", "0004_matchresultoutbox"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="tempmatch",
+            index=models.Index(
+                fields=["match_room", "round"], name="temp_match_room_round_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tempmatchuser",
+            index=models.Index(
+                fields=["user", "temp_match"], name="temp_match_user_user_match_idx"
+            ),
+        ),
+    ]
@@ -56,6 +56,12 @@ class TempMatch(models.Model):
 
     class Meta:
         db_table = "temp_match"
+        indexes = [
+            # Matches of a room by round (bracket reload, next round lookup)
+            models.Index(
+                fields=["match_room", "round"], name="temp_match_room_round_idx"
+            ),
+        ]
 
 
 class TempMatchUser(models.Model):
@@ -67,3 +73,26 @@ class TempMatchUser(models.Model):
 
     class Meta:
         db_table = "temp_match_user"
+        indexes = [
+            # Connect, score and next game lookups by user, then by match
+            models.Index(
+                fields=["user", "temp_match"], name="temp_match_user_user_match_idx"
+            ),
+        ]
+
+
+class MatchResultOutbox(models.Model):
+    """
+    Match results not yet accepted by the user service (see `gameapp.outbox`).
+    Unlike the temp tables, it is kept across restarts.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    match_id = models.BigIntegerField(unique=True)
+    payload = models.JSONField()
+    attempts = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=now)
+    next_attempt_at = models.DateTimeField(default=now, db_index=True)
+
+    class Meta:
+        db_table = "match_result_outbox"
@@ -0,0 +1,184 @@
+"""
+Durable delivery of match results to the user service.
+
+A finished match inserts its result into `MatchResultOutbox` (once per match:
+the match id is unique), in the same transaction as the rest of its state.
+`outbox_dispatcher` sends the due rows in batches to
+`/_internal/dashboard/batch` and deletes them once the user service accepted
+them. Failed rows are retried with exponential backoff,
+so results survive user-service outages and restarts of this service.
+
+A row that failed once is retried alone, so a result the user service cannot
+take does not hold back the others sent with it. A row refused alone with a
+4xx, or failed `MAX_ATTEMPTS` times, is dropped and logged with its payload.
+"""
+
+import datetime
+import enum
+import logging
+import threading
+
+from django.db import close_old_connections, transaction
+
+from gameapp.envs import USER_URL
+from gameapp.models import MatchResultOutbox
+from gameapp.requests import post
+from gameapp.utils import now
+
+BATCH_SIZE = 50
+POLL_SEC = 5.0
+BACKOFF_BASE_SEC = 1.0
+BACKOFF_MAX_SEC = 300.0
+# Claimed rows are due again after this, if their worker died while sending.
+# Longer than one request with its retries.
+CLAIM_LEASE_SEC = 60.0
+# About an hour of retries with the backoff below
+MAX_ATTEMPTS = 20
+# 4xx that may succeed later
+TEMPORARY_STATUSES = (408, 429)
+
+
+def get_backoff(attempts: int) -> datetime.timedelta:
+    return datetime.timedelta(
+        seconds=min(BACKOFF_BASE_SEC * 2 ** (attempts - 1), BACKOFF_MAX_SEC)
+    )
+
+
+class SendResult(enum.Enum):
+    SENT = 0
+    # May succeed later: no response, 5xx, 408 or 429
+    FAILED = 1
+    # Will never succeed as sent: any other 4xx
+    REFUSED = 2
+
+
+class OutboxDispatcher:
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, batch_size: int = BATCH_SIZE, poll_sec: float = POLL_SEC):
+        self.batch_size = batch_size
+        self.poll_sec = poll_sec
+        self.wakeup_event = threading.Event()
+        self.started = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        """
+        Started by the server entrypoints, so results left by a previous run
+        are sent without waiting for a new match to finish.
+        """
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        threading.Thread(target=self.__run, daemon=True).start()
+
+    def wakeup(self):
+        self.wakeup_event.set()
+
+    def __run(self):
+        while True:
+            self.wakeup_event.wait(self.poll_sec)
+            self.wakeup_event.clear()
+            try:
+                close_old_connections()
+                # Keep going while rows are due
+                while self.dispatch_due() > 0:
+                    pass
+            except Exception as e:
+                self.logger.error("outbox dispatch failed")
+                self.logger.exception(e)
+
+    def __send(self, rows: list[MatchResultOutbox]) -> SendResult:
+        try:
+            resp = post(
+                f"{USER_URL}/_internal/dashboard/batch",
+                json={"matches": [row.payload for row in rows]},
+            )
+        except Exception as e:
+            self.logger.error(f"{len(rows)} results could not be sent, e={e}")
+            return SendResult.FAILED
+
+        if not resp.ok:
+            self.logger.error(f"{len(rows)} results were rejected, resp = {resp.text}")
+            if 400 <= resp.status_code < 500:
+                if resp.status_code not in TEMPORARY_STATUSES:
+                    return SendResult.REFUSED
+            return SendResult.FAILED
+
+        rejected = resp.json().get("rejected", [])
+        if rejected:
+            # Retrying cannot help, e.g. a player was deleted
+            self.logger.error(f"match_ids={rejected} were rejected by the user service")
+        return SendResult.SENT
+
+    def __claim(self) -> list[MatchResultOutbox]:
+        """
+        Lock the due rows with `SKIP LOCKED` and push their next attempt past
+        the lease, so no other dispatcher picks them up once committed.
+
+        Rows that never failed are claimed together. A row that failed before
+        is claimed alone, when it is the next one due.
+        """
+        with transaction.atomic():
+            rows = list(
+                MatchResultOutbox.objects.select_for_update(skip_locked=True)
+                .filter(next_attempt_at__lte=now())
+                .order_by("next_attempt_at")[: self.batch_size]
+            )
+            if rows and rows[0].attempts > 0:
+                rows = rows[:1]
+            else:
+                rows = [row for row in rows if row.attempts == 0]
+            # The other rows are unlocked on commit
+            if rows:
+                MatchResultOutbox.objects.filter(id__in=[r.id for r in rows]).update(
+                    next_attempt_at=now() + datetime.timedelta(seconds=CLAIM_LEASE_SEC)
+                )
+        return rows
+
+    def __drop(self, rows: list[MatchResultOutbox], reason: str):
+        for row in rows:
+            self.logger.error(
+                f"dropping the result of match_id={row.match_id} ({reason}), "
+                f"payload={row.payload}"
+            )
+        MatchResultOutbox.objects.filter(id__in=[r.id for r in rows]).delete()
+
+    def dispatch_due(self) -> int:
+        """
+        Send one batch of due results, in one request.
+        Returns the number of rows handled.
+
+        The rows are claimed in a short transaction, sent outside of any
+        transaction, then deleted or rescheduled. Several workers can run a
+        dispatcher without sending a result twice, unless a request outlives
+        the lease: the user service ignores the match ids it already recorded.
+        """
+        rows = self.__claim()
+        if not rows:
+            return 0
+
+        result = self.__send(rows)
+        if result == SendResult.SENT:
+            MatchResultOutbox.objects.filter(id__in=[r.id for r in rows]).delete()
+        elif result == SendResult.REFUSED and len(rows) == 1:
+            self.__drop(rows, "refused by the user service")
+        else:
+            # Each of them is retried alone, see `__claim()`
+            for row in rows:
+                row.attempts += 1
+                row.next_attempt_at = now() + get_backoff(row.attempts)
+            expired = [row for row in rows if row.attempts >= MAX_ATTEMPTS]
+            if expired:
+                self.__drop(expired, f"failed {MAX_ATTEMPTS} times")
+            MatchResultOutbox.objects.bulk_update(
+                [row for row in rows if row.attempts < MAX_ATTEMPTS],
+                ["attempts", "next_attempt_at"],
+            )
+
+        self.logger.info(f"outbox: {len(rows)} rows, {result.name.lower()}")
+        return len(rows)
+
+
+outbox_dispatcher = OutboxDispatcher()
@@ -0,0 +1,239 @@
+"""
+Write-behind persistence of the match state.
+
+The match code enqueues commands to `write_behind` instead of calling the ORM,
+and a background flusher applies them in order, in batches: database commands
+in one transaction (adjacent commands of the same type are merged), then the
+external commands, if any. Match results go through the outbox
+(`gameapp.outbox`) in the same transaction.
+
+Commands are enqueued with the name of their tournament room. Code that reads
+the state of a room back from the database must call
+`write_behind.sync(room_name)` first, on the worker that owns the room
+(`gameapp.registry`): it waits for the commands of that room only.
+"""
+
+import datetime
+import itertools
+import logging
+import threading
+import time
+from typing import Any
+
+from django.db import close_old_connections, transaction
+
+from exceptions.CustomException import InternalException
+from gameapp.models import (
+    MatchResultOutbox,
+    TempMatch,
+    TempMatchRoom,
+    TempMatchRoomUser,
+    TempMatchUser,
+)
+from gameapp.outbox import outbox_dispatcher
+
+# Commands enqueued within this delay are flushed together
+FLUSH_LINGER_SEC = 0.05
+SYNC_TIMEOUT_SEC = 5.0
+
+
+class Command:
+    # Sent to another service: applied after the database transaction
+    is_external = False
+
+    def apply(self):
+        raise NotImplementedError()
+
+    @classmethod
+    def apply_batch(cls, commands: "list[Command]"):
+        for command in commands:
+            command.apply()
+
+
+class SaveMatchStart(Command):
+    def __init__(self, match_id: int, start_at: datetime.datetime):
+        self.match_id = match_id
+        self.start_at = start_at
+
+    def apply(self):
+        TempMatch.objects.filter(id=self.match_id).update(start_at=self.start_at)
+
+
+class SaveScore(Command):
+    def __init__(self, user_id: int, match_id: int, score: int):
+        self.user_id = user_id
+        self.match_id = match_id
+        self.score = score
+
+    def apply(self):
+        TempMatchUser.objects.filter(
+            user_id=self.user_id, temp_match_id=self.match_id
+        ).update(score=self.score)
+
+
+class CreateMatchUser(Command):
+    def __init__(self, user_id: int, match_id: int):
+        self.user_id = user_id
+        self.match_id = match_id
+
+    def apply(self):
+        self.apply_batch([self])
+
+    @classmethod
+    def apply_batch(cls, commands: "list[Command]"):
+        TempMatchUser.objects.bulk_create(
+            [
+                TempMatchUser(user_id=c.user_id, temp_match_id=c.match_id)  # type: ignore
+                for c in commands
+            ]
+        )
+
+
+class DeleteRoomUser(Command):
+    def __init__(self, user_id: int, room_id: int | None = None):
+        self.user_id = user_id
+        self.room_id = room_id
+
+    def apply(self):
+        room_users = TempMatchRoomUser.objects.filter(user_id=self.user_id)
+        if self.room_id is not None:
+            room_users = room_users.filter(temp_match_room_id=self.room_id)
+        room_users.delete()
+
+
+class DeleteMatchUser(Command):
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+
+    def apply(self):
+        TempMatchUser.objects.filter(user_id=self.user_id).delete()
+
+
+class DeleteRoom(Command):
+    def __init__(self, room_name: str):
+        self.room_name = room_name
+
+    def apply(self):
+        # Dependency on CASCADE
+        TempMatchRoom.objects.filter(room_name=self.room_name).delete()
+
+
+class SaveMatchResult(Command):
+    """
+    Insert the result into the outbox, from which `outbox_dispatcher` sends it
+    to the user service. A result is saved once per match.
+    """
+
+    def __init__(self, match_id: int, json: dict[str, Any]):
+        self.match_id = match_id
+        self.json = json
+
+    def apply(self):
+        self.apply_batch([self])
+
+    @classmethod
+    def apply_batch(cls, commands: "list[Command]"):
+        MatchResultOutbox.objects.bulk_create(
+            [
+                MatchResultOutbox(match_id=c.match_id, payload=c.json)  # type: ignore
+                for c in commands
+            ],
+            ignore_conflicts=True,
+        )
+        transaction.on_commit(outbox_dispatcher.wakeup)
+
+
+class WriteBehindQueue:
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, linger_sec: float = FLUSH_LINGER_SEC):
+        self.linger_sec = linger_sec
+
+        # Protected by cond
+        self.pending: list[Command] = []
+        self.enqueued = 0
+        self.applied = 0
+        # room_name -> position of its last enqueued command, until applied
+        self.last_of_room: dict[str, int] = {}
+        self.started = False
+
+        self.cond = threading.Condition()
+
+    def enqueue(self, room_name: str, *commands: Command):
+        with self.cond:
+            self.pending.extend(commands)
+            self.enqueued += len(commands)
+            self.last_of_room[room_name] = self.enqueued
+            if not self.started:
+                # Started lazily, so that every gunicorn worker has its own flusher
+                self.started = True
+                threading.Thread(target=self.__run, daemon=True).start()
+            self.cond.notify_all()
+
+    def sync(self, room_name: str, timeout: float = SYNC_TIMEOUT_SEC):
+        """
+        Wait until every command of `room_name` enqueued so far is applied.
+        Raises `InternalException` after `timeout`, rather than let the caller
+        read stale rows.
+        """
+        with self.cond:
+            target = self.last_of_room.get(room_name)
+            if target is None:
+                return
+            if not self.cond.wait_for(lambda: self.applied >= target, timeout):
+                self.logger.error(
+                    f"write-behind sync of room={room_name} timed out, "
+                    f"applied={self.applied}, target={target}"
+                )
+                raise InternalException()
+
+    def __run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: len(self.pending) > 0)
+            time.sleep(self.linger_sec)
+
+            with self.cond:
+                batch = self.pending
+                self.pending = []
+
+            self.__flush(batch)
+
+            with self.cond:
+                self.applied += len(batch)
+                self.last_of_room = {
+                    room_name: last
+                    for room_name, last in self.last_of_room.items()
+                    if last > self.applied
+                }
+                self.cond.notify_all()
+
+    def __flush(self, batch: list[Command]):
+        db_commands = [c for c in batch if not c.is_external]
+        try:
+            close_old_connections()
+            with transaction.atomic():
+                for command_type, commands in itertools.groupby(db_commands, type):
+                    command_type.apply_batch(list(commands))
+        except Exception as e:
+            self.logger.error("write-behind batch failed, applying one by one")
+            self.logger.exception(e)
+            for command in db_commands:
+                try:
+                    with transaction.atomic():
+                        command.apply()
+                except Exception as e:
+                    self.logger.error(f"write-behind command {type(command)} failed")
+                    self.logger.exception(e)
+
+        for command in batch:
+            if not command.is_external:
+                continue
+            try:
+                command.apply()
+            except Exception as e:
+                self.logger.error(f"write-behind command {type(command)} failed")
+                self.logger.exception(e)
+
+
+write_behind = WriteBehindQueue()
@@ -0,0 +1,247 @@
+import threading
+from typing import NamedTuple
+
+import numpy as np
+
+# Velocities and `PADDLE_MOVE` are expressed as the distance travelled in one
+# base tick (`1 / TICK_RATE` second). Running at another tick rate advances
+# every step by `tick_scale(tick_rate)` base ticks.
+TICK_RATE = 60
+TICK_SEC = 1 / TICK_RATE
+
+GAME_BOUNDS = {"x": 5, "y": 7}
+PADDLE_WIDTH = 1
+PADDLE_HEIGHT = 0.2
+BALL_RADIUS = 0.2
+PADDLE_MOVE = 0.075
+INITIAL_SPEED = 0.05
+BALL_SIZE = {"x": 0.4, "y": 0.4, "z": 0.4}
+
+GAME_RIGHTEND = GAME_BOUNDS["x"] - PADDLE_WIDTH / 2
+
+WALL_X = GAME_BOUNDS["x"] - BALL_SIZE["x"] / 2
+GOAL_Y = GAME_BOUNDS["y"] - BALL_SIZE["y"] / 2
+PADDLE_Y = GAME_BOUNDS["y"] - PADDLE_HEIGHT - BALL_SIZE["y"] / 2
+PADDLE_REACH = PADDLE_WIDTH / 2 + BALL_SIZE["x"] / 2
+
+SPEED_UP = 1.05
+MAX_VY = 0.2
+
+INITIAL_CAPACITY = 64
+# Upper bound of wall bounces and paddle crossings resolved in one step
+MAX_EVENTS_PER_STEP = 16
+
+
+def tick_scale(tick_rate: int) -> float:
+    """
+    Number of base ticks in one tick at `tick_rate`.
+    """
+    return TICK_RATE / tick_rate
+
+
+class StepEvents(NamedTuple):
+    """
+    Result of `BatchPhysics.step()`. Every array is indexed by slot.
+    `scorer` is `-1` when nobody scored, otherwise the index of the scoring paddle.
+    """
+
+    wall: np.ndarray
+    paddle: np.ndarray
+    scorer: np.ndarray
+
+    def scored_slots(self) -> np.ndarray:
+        return np.flatnonzero(self.scorer >= 0)
+
+    def collided_slots(self) -> np.ndarray:
+        return np.flatnonzero(self.wall | self.paddle)
+
+
+class BatchPhysics:
+    """
+    Structure-of-arrays state of every live match, advanced in one vectorized step.
+
+    A match owns one slot, obtained by `allocate()` and returned by `release()`.
+    Only slots marked as active are advanced by `step()`.
+
+    Collisions are swept: the ball moves along its segment for the step and
+    stops at every wall or paddle line it crosses on the way, so a fast ball
+    cannot tunnel through a paddle, and the outcome does not depend on the
+    tick rate the step is called at.
+    """
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self.lock = threading.Lock()
+        self.free: list[int] = []
+        self.size = 0
+        self.__alloc_arrays(capacity)
+
+    def __alloc_arrays(self, capacity: int):
+        self.capacity = capacity
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.paddle = np.zeros((capacity, 2))
+        self.score = np.zeros((capacity, 2), dtype=np.int32)
+        self.active = np.zeros(capacity, dtype=bool)
+
+    def __grow(self):
+        old = (self.x, self.y, self.vx, self.vy, self.paddle, self.score, self.active)
+        size = self.capacity
+        self.__alloc_arrays(self.capacity * 2)
+        new = (self.x, self.y, self.vx, self.vy, self.paddle, self.score, self.active)
+        for o, n in zip(old, new):
+            n[:size] = o
+
+    def allocate(self, x: float, y: float, vx: float, vy: float) -> int:
+        with self.lock:
+            if self.free:
+                slot = self.free.pop()
+            else:
+                if self.size == self.capacity:
+                    self.__grow()
+                slot = self.size
+                self.size += 1
+
+            self.x[slot], self.y[slot] = x, y
+            self.vx[slot], self.vy[slot] = vx, vy
+            self.paddle[slot] = 0.0
+            self.score[slot] = 0
+            self.active[slot] = False
+            return slot
+
+    def release(self, slot: int):
+        with self.lock:
+            self.active[slot] = False
+            self.free.append(slot)
+
+    def set_active(self, slot: int, active: bool):
+        with self.lock:
+            self.active[slot] = active
+
+    def set_ball(self, slot: int, x: float, y: float, vx: float, vy: float):
+        with self.lock:
+            self.x[slot], self.y[slot] = x, y
+            self.vx[slot], self.vy[slot] = vx, vy
+
+    def set_velocity(self, slot: int, vx: float, vy: float):
+        with self.lock:
+            self.vx[slot], self.vy[slot] = vx, vy
+
+    def get_ball(self, slot: int) -> dict[str, float]:
+        with self.lock:
+            return {
+                "x": float(self.x[slot]),
+                "y": float(self.y[slot]),
+                "vx": float(self.vx[slot]),
+                "vy": float(self.vy[slot]),
+            }
+
+    def set_paddle(self, slot: int, idx: int, position: float):
+        with self.lock:
+            self.paddle[slot, idx] = position
+
+    def move_paddle(self, slot: int, idx: int, move: int, dt: float = 1.0) -> float:
+        """
+        Move the paddle `idx` by `dt` times `PADDLE_MOVE` in the direction of `move`.
+        Returns the new position.
+        """
+        with self.lock:
+            x = float(self.paddle[slot, idx])
+            x += PADDLE_MOVE * dt if move > 0 else -PADDLE_MOVE * dt
+            x = max(-GAME_RIGHTEND, min(GAME_RIGHTEND, x))
+            self.paddle[slot, idx] = x
+            return x
+
+    def move_paddles(self, moves: np.ndarray, dt: float = 1.0):
+        """
+        Vectorized `move_paddle()` for every active slot.
+        `moves` has the shape `(size, 2)` and holds `-1`, `0` or `1`.
+        """
+        with self.lock:
+            n = self.size
+            delta = np.sign(moves[:n]) * (PADDLE_MOVE * dt) * self.active[:n, None]
+            paddle = self.paddle[:n]
+            np.clip(paddle + delta, -GAME_RIGHTEND, GAME_RIGHTEND, out=paddle)
+
+    def get_paddle(self, slot: int, idx: int) -> float:
+        with self.lock:
+            return float(self.paddle[slot, idx])
+
+    def get_score(self, slot: int) -> list[int]:
+        with self.lock:
+            return [int(s) for s in self.score[slot]]
+
+    def step(self, dt: float = 1.0, slots: list[int] | None = None) -> StepEvents:
+        """
+        Advance every active slot by `dt` base ticks.
+        With `slots`, exactly those slots are advanced instead of the active ones.
+        """
+        with self.lock:
+            n = self.size
+            if slots is None:
+                active = self.active[:n]
+            else:
+                active = np.zeros(n, dtype=bool)
+                active[slots] = True
+            x, y = self.x[:n], self.y[:n]
+            vx, vy = self.vx[:n], self.vy[:n]
+            paddle = self.paddle[:n]
+            rows = np.arange(n)
+
+            wall = np.zeros(n, dtype=bool)
+            hit = np.zeros(n, dtype=bool)
+            remaining = np.where(active, dt, 0.0)
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                for _ in range(MAX_EVENTS_PER_STEP):
+                    moving = remaining > 0
+                    if not moving.any():
+                        break
+
+                    t_wall = np.where(
+                        vx > 0,
+                        (WALL_X - x) / vx,
+                        np.where(vx < 0, (-WALL_X - x) / vx, np.inf),
+                    )
+                    # A ball past a paddle line never comes back, it can only score
+                    t_line = np.where(
+                        (vy < 0) & (y > -PADDLE_Y),
+                        (-PADDLE_Y - y) / vy,
+                        np.where((vy > 0) & (y < PADDLE_Y), (PADDLE_Y - y) / vy, np.inf),
+                    )
+                    t = np.minimum(np.minimum(t_wall, t_line), remaining)
+                    t = np.where(moving, np.maximum(t, 0.0), 0.0)
+
+                    x += vx * t
+                    y += vy * t
+                    remaining -= t
+
+                    at_wall = moving & (t_wall <= t)
+                    vx[at_wall] *= -1
+                    x[at_wall] = np.where(x[at_wall] > 0, WALL_X, -WALL_X)
+                    wall |= at_wall
+
+                    at_line = moving & (t_line <= t)
+                    y[at_line] = np.where(y[at_line] > 0, PADDLE_Y, -PADDLE_Y)
+                    idx = (y > 0).astype(np.intp)
+                    hit_now = at_line & (np.abs(x - paddle[rows, idx]) <= PADDLE_REACH)
+                    vy[hit_now] *= -SPEED_UP
+                    vx[hit_now] *= SPEED_UP
+                    np.clip(vy, -MAX_VY, MAX_VY, out=vy, where=hit_now)
+                    hit |= hit_now
+
+            # Only reached with an absurd speed, finish the step without events
+            left = remaining > 0
+            if left.any():
+                x += vx * remaining
+                y += vy * remaining
+                np.clip(x, -WALL_X, WALL_X, out=x, where=left)
+
+            scorer = np.full(n, -1, dtype=np.int8)
+            scorer[active & (y <= -GOAL_Y)] = 1
+            scorer[active & (y >= GOAL_Y)] = 0
+            scored = np.flatnonzero(scorer >= 0)
+            self.score[scored, scorer[scored]] += 1
+
+            return StepEvents(wall=wall, paddle=hit, scorer=scorer)
@@ -0,0 +1,297 @@
+"""
+Sharding of the tournament rooms across the game workers.
+
+Every tournament room (and all of its matches, which hand their winners to
+each other) is owned by exactly one worker, chosen from the room name.
+A worker that receives a socket event or an HTTP request for a room it does
+not own forwards it to the owner as a command, over the message queue.
+
+- `LocalRegistry`: in-process bus. With one worker everything is local;
+  several registries sharing a bus can stand in for a cluster in tests.
+- `RedisRegistry`: Redis pub/sub, one channel per worker (`redis` package).
+  Every process claims a free worker id in `[0, GAME_WORKER_COUNT)` on start.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import zlib
+from typing import Any, Callable
+
+from exceptions.CustomException import CustomException, InternalException
+from gameapp.envs import GAME_MESSAGE_QUEUE, GAME_WORKER_COUNT
+from gameapp.runtime import run_in_background
+
+CHANNEL_PREFIX = "game:worker:"
+LEASE_PREFIX = "game:worker-lease:"
+LEASE_SEC = 15
+REQUEST_TIMEOUT_SEC = 10.0
+
+Command = Callable[..., Any]
+
+
+class RemoteCommandError(CustomException):
+    """
+    A command failed on the owner of its room, with the message `msg`.
+    """
+
+    def __init__(self, msg: str, status_code: int):
+        super().__init__(msg)
+        self.status_code = status_code
+
+    def get_status_code(self) -> int:
+        return self.status_code
+
+
+class MatchRegistry:
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, worker_id: int | None, worker_count: int):
+        if worker_id is not None and not 0 <= worker_id < worker_count:
+            raise ValueError(f"worker_id={worker_id}, worker_count={worker_count}")
+        self.worker_id = worker_id
+        self.worker_count = worker_count
+        self.commands: dict[str, Command] = {}
+        self.inline_commands: set[str] = set()
+
+        # request_id -> (set when the reply arrives, the reply)
+        self.pending: dict[str, tuple[threading.Event, dict[str, Any]]] = {}
+        self.pending_lock = threading.Lock()
+
+    def owner_of(self, room_name: str) -> int:
+        # crc32 instead of `hash()`, which is salted per process
+        return zlib.crc32(room_name.encode()) % self.worker_count
+
+    def is_local(self, room_name: str | None) -> bool:
+        return room_name is None or self.owner_of(room_name) == self.worker_id
+
+    def command(self, name: str, inline: bool = False):
+        """
+        Register the decorated function as the command `name`.
+        Its arguments and its result must be JSON serializable.
+
+        A forwarded command runs in the background (`run_in_background`),
+        unless `inline`: then it runs on the thread receiving the messages.
+        Only inputs should be inline, so they never wait behind a command
+        that reads the database or calls another service.
+        """
+
+        def register(func: Command) -> Command:
+            self.commands[name] = func
+            if inline:
+                self.inline_commands.add(name)
+            return func
+
+        return register
+
+    def dispatch(self, room_name: str | None, name: str, **kwargs: Any):
+        """
+        Run the command `name` on the owner of `room_name`.
+        Locally, it runs inline and its exceptions propagate to the caller.
+        Remotely, it is fire-and-forget: errors are logged by the owner.
+        """
+        if self.is_local(room_name):
+            return self.commands[name](**kwargs)
+
+        owner = self.owner_of(room_name)  # type: ignore
+        self.logger.debug(f"forwarding command={name} of room={room_name} to {owner}")
+        self.publish(owner, {"command": name, "kwargs": kwargs})
+
+    def request(
+        self,
+        room_name: str | None,
+        name: str,
+        timeout: float = REQUEST_TIMEOUT_SEC,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Run the command `name` on the owner of `room_name` and wait for its
+        result. A `CustomException` of the owner is raised again here as
+        `RemoteCommandError`, any other failure or the timeout as
+        `InternalException`.
+        """
+        if self.is_local(room_name):
+            return self.commands[name](**kwargs)
+
+        owner = self.owner_of(room_name)  # type: ignore
+        request_id = uuid.uuid4().hex
+        event = threading.Event()
+        reply: dict[str, Any] = {}
+        with self.pending_lock:
+            self.pending[request_id] = (event, reply)
+
+        try:
+            self.logger.debug(
+                f"requesting command={name} of room={room_name} to {owner}"
+            )
+            self.publish(
+                owner,
+                {
+                    "command": name,
+                    "kwargs": kwargs,
+                    "request_id": request_id,
+                    "reply_to": self.worker_id,
+                },
+            )
+            if not event.wait(timeout):
+                self.logger.error(
+                    f"command={name} of room={room_name} timed out on {owner}"
+                )
+                raise InternalException()
+        finally:
+            with self.pending_lock:
+                del self.pending[request_id]
+
+        if "error" in reply:
+            raise RemoteCommandError(reply["error"], reply["status_code"])
+        return reply["result"]
+
+    def handle(self, message: dict[str, Any]):
+        if "reply" in message:
+            self.__resolve(message)
+        elif message["command"] in self.inline_commands:
+            self.__run(message)
+        else:
+            run_in_background(self.__run, message)
+
+    def __run(self, message: dict[str, Any]):
+        name = message["command"]
+        reply: dict[str, Any]
+        try:
+            reply = {"result": self.commands[name](**message["kwargs"])}
+        except CustomException as e:
+            self.logger.error(f"forwarded command={name} failed, msg={e}")
+            reply = {"error": e.msg, "status_code": e.get_status_code()}
+        except Exception as e:
+            self.logger.error(f"forwarded command={name} failed")
+            self.logger.exception(e)
+            error = InternalException()
+            reply = {"error": error.msg, "status_code": error.get_status_code()}
+
+        if "reply_to" in message:
+            self.publish(message["reply_to"], {"reply": message["request_id"], **reply})
+
+    def __resolve(self, message: dict[str, Any]):
+        with self.pending_lock:
+            pending = self.pending.get(message.pop("reply"))
+        # Already timed out
+        if pending is None:
+            return
+        event, reply = pending
+        reply.update(message)
+        event.set()
+
+    def publish(self, worker_id: int, message: dict[str, Any]):
+        raise NotImplementedError()
+
+    def start(self):
+        pass
+
+
+class LocalRegistry(MatchRegistry):
+    def __init__(
+        self,
+        worker_id: int,
+        worker_count: int,
+        workers: "dict[int, LocalRegistry] | None" = None,
+    ):
+        super().__init__(worker_id, worker_count)
+        # The bus, shared by the registries of one test cluster
+        self.workers = workers if workers is not None else {}
+
+    def start(self):
+        self.workers[self.worker_id] = self  # type: ignore
+
+    def publish(self, worker_id: int, message: dict[str, Any]):
+        # Through JSON, like a real message queue
+        self.workers[worker_id].handle(json.loads(json.dumps(message)))
+
+
+class RedisRegistry(MatchRegistry):
+    def __init__(self, worker_count: int, url: str):
+        # The worker id is claimed on `start()`, once per forked process
+        super().__init__(None, worker_count)
+
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+        self.token = uuid.uuid4().hex
+
+    def publish(self, worker_id: int, message: dict[str, Any]):
+        self.redis.publish(f"{CHANNEL_PREFIX}{worker_id}", json.dumps(message))
+
+    def __claim_worker_id(self) -> int:
+        # The leases of a process that was just stopped expire within LEASE_SEC
+        deadline = time.monotonic() + 2 * LEASE_SEC
+        while True:
+            for worker_id in range(self.worker_count):
+                if self.redis.set(
+                    f"{LEASE_PREFIX}{worker_id}", self.token, nx=True, ex=LEASE_SEC
+                ):
+                    return worker_id
+            if time.monotonic() > deadline:
+                self.logger.error(
+                    f"every worker id of GAME_WORKER_COUNT={self.worker_count} is taken"
+                )
+                raise InternalException()
+            time.sleep(1)
+
+    def __renew_lease(self):
+        key = f"{LEASE_PREFIX}{self.worker_id}"
+        while True:
+            time.sleep(LEASE_SEC / 3)
+            try:
+                holder = self.redis.get(key)
+                if holder is not None and holder.decode() != self.token:
+                    # Another process listens to our channel: let the server
+                    # restart this one, which claims a free id
+                    self.logger.critical(f"worker id {self.worker_id} was taken over")
+                    os._exit(1)
+                self.redis.set(key, self.token, ex=LEASE_SEC)
+            except Exception as e:
+                self.logger.error(f"could not renew the lease of {self.worker_id}")
+                self.logger.exception(e)
+
+    def __release_lease(self):
+        key = f"{LEASE_PREFIX}{self.worker_id}"
+        if self.redis.get(key) == self.token.encode():
+            self.redis.delete(key)
+
+    def __listen(self):
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(f"{CHANNEL_PREFIX}{self.worker_id}")
+        # Inputs and replies are handled on this thread, the other commands
+        # are handed to the background
+        for message in pubsub.listen():
+            try:
+                self.handle(json.loads(message["data"]))
+            except Exception as e:
+                self.logger.error("could not handle a message of the queue")
+                self.logger.exception(e)
+
+    def start(self):
+        self.worker_id = self.__claim_worker_id()
+        atexit.register(self.__release_lease)
+        threading.Thread(target=self.__renew_lease, daemon=True).start()
+        threading.Thread(target=self.__listen, daemon=True).start()
+        self.logger.info(
+            f"worker {self.worker_id}/{self.worker_count} listens to the message queue"
+        )
+
+
+def make_registry() -> MatchRegistry:
+    if GAME_MESSAGE_QUEUE == "":
+        if GAME_WORKER_COUNT != 1:
+            logging.getLogger(__name__).error(
+                "GAME_WORKER_COUNT > 1 requires GAME_MESSAGE_QUEUE"
+            )
+            raise InternalException()
+        return LocalRegistry(0, 1)
+    return RedisRegistry(GAME_WORKER_COUNT, GAME_MESSAGE_QUEUE)
+
+
+match_registry = make_registry()
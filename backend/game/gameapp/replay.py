@@ -0,0 +1,146 @@
+"""
+Replay log of a match, and offline re-simulation of it.
+
+Re-simulate recorded matches at full speed (no Django required):
+
+    python -m gameapp.replay replays/*.json.gz
+"""
+
+import gzip
+import json
+import sys
+import time
+from typing import Any, NamedTuple
+
+from gameapp.physics import TICK_RATE, BatchPhysics
+from gameapp.simulation import MatchSimulation
+
+REPLAY_VERSION = 2
+
+
+class ReplayResult(NamedTuple):
+    score: list[int]
+    ticks: int
+
+
+class ReplayLog:
+    """
+    Seed and input stream of one match.
+
+    Inputs are stored run-length encoded as `[tick, paddle_idx, move, run]`:
+    `move` was applied to `paddle_idx` on every tick in `[tick, tick + run)`.
+    """
+
+    def __init__(
+        self,
+        seed: int,
+        is_with_ai: bool,
+        winning_score: int,
+        tick_rate: int = TICK_RATE,
+    ):
+        self.seed = seed
+        self.is_with_ai = is_with_ai
+        self.winning_score = winning_score
+        self.tick_rate = tick_rate
+
+        self.inputs: list[list[int]] = []
+        self.ticks = 0
+        self.score = [0, 0]
+
+        self.__last: list[list[int] | None] = [None, None]
+
+    def record_input(self, tick: int, idx: int, move: int):
+        last = self.__last[idx]
+        if last is not None and last[2] == move and last[0] + last[3] == tick:
+            last[3] += 1
+            return
+        entry = [tick, idx, move, 1]
+        self.inputs.append(entry)
+        self.__last[idx] = entry
+
+    def finish(self, ticks: int, score: list[int]):
+        self.ticks = ticks
+        self.score = score[:]
+
+    def inputs_by_tick(self) -> dict[int, list[tuple[int, int]]]:
+        ret: dict[int, list[tuple[int, int]]] = {}
+        for tick, idx, move, run in self.inputs:
+            for t in range(tick, tick + run):
+                ret.setdefault(t, []).append((idx, move))
+        return ret
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "version": REPLAY_VERSION,
+            "seed": self.seed,
+            "is_with_ai": self.is_with_ai,
+            "winning_score": self.winning_score,
+            "tick_rate": self.tick_rate,
+            "ticks": self.ticks,
+            "score": self.score,
+            "inputs": self.inputs,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "ReplayLog":
+        if data.get("version") != REPLAY_VERSION:
+            raise ValueError(f"unsupported replay version: {data.get('version')}")
+        log = cls(
+            data["seed"], data["is_with_ai"], data["winning_score"], data["tick_rate"]
+        )
+        log.inputs = data["inputs"]
+        log.ticks = data["ticks"]
+        log.score = data["score"]
+        return log
+
+    def save(self, path: str):
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "ReplayLog":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def resimulate(log: ReplayLog) -> ReplayResult:
+    """
+    Run the recorded match again, as fast as possible, from its seed and inputs.
+    """
+    physics = BatchPhysics(capacity=1)
+    sim = MatchSimulation(
+        physics, log.is_with_ai, log.seed, tick_rate=log.tick_rate
+    )
+    physics.set_active(sim.slot, True)
+
+    inputs = log.inputs_by_tick()
+    for tick in range(log.ticks):
+        for idx, move in inputs.get(tick, []):
+            sim.move_paddle(idx, move)
+        events = physics.step(sim.dt)
+        sim.after_step(int(events.scorer[sim.slot]))
+
+    return ReplayResult(score=sim.score, ticks=sim.tick)
+
+
+def main(paths: list[str]) -> int:
+    failed = 0
+    for path in paths:
+        log = ReplayLog.load(path)
+
+        start = time.perf_counter()
+        result = resimulate(log)
+        elapsed = time.perf_counter() - start
+
+        ok = result.score == log.score and result.ticks == log.ticks
+        failed += 0 if ok else 1
+        print(
+            f"{path}: {'OK' if ok else 'MISMATCH'} "
+            f"recorded={log.score}@{log.ticks} resimulated={result.score}@{result.ticks} "
+            f"({result.ticks / max(elapsed, 1e-9):.0f} ticks/s)"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,114 @@
+"""
+Where the background work of the game server runs.
+
+With `GAME_SERVER_MODE=wsgi` (gunicorn), background work runs on threads.
+With `GAME_SERVER_MODE=asgi` (uvicorn), timers and the tick engine run on the
+event loop of `socketio.AsyncServer`, and blocking work (database, HTTP)
+runs on the default executor of that loop.
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Coroutine
+
+from gameapp.envs import IS_ASGI
+
+logger = logging.getLogger(__name__)
+
+loop: asyncio.AbstractEventLoop | None = None
+
+
+def bind_loop():
+    """
+    Called on the ASGI startup, on the event loop.
+    """
+    global loop
+    loop = asyncio.get_running_loop()
+    logger.info("runtime is bound to the event loop")
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    if loop is None:
+        raise RuntimeError("event loop is not bound, was the ASGI startup run?")
+    return loop
+
+
+def _is_loop_thread() -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+def run_coroutine(coro: Coroutine[Any, Any, Any]):
+    """
+    Schedule `coro` on the event loop without waiting for it. Thread-safe.
+    """
+    if _is_loop_thread():
+        _get_loop().create_task(coro)
+    else:
+        asyncio.run_coroutine_threadsafe(coro, _get_loop())
+
+
+def run_coroutine_sync(coro: Coroutine[Any, Any, Any]) -> Any:
+    """
+    Run `coro` on the event loop and wait for its result.
+    Must not be called from the event loop itself.
+    """
+    if _is_loop_thread():
+        coro.close()
+        raise RuntimeError("run_coroutine_sync() called from the event loop")
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+def run_in_background(func: Callable[..., Any], *args: Any):
+    """
+    Run the blocking `func(*args)` off the caller's thread.
+    """
+    if not IS_ASGI:
+        threading.Thread(target=func, args=args).start()
+        return
+
+    def submit():
+        _get_loop().run_in_executor(None, func, *args)
+
+    _get_loop().call_soon_threadsafe(submit)
+
+
+class Timer:
+    """
+    Runs `func` in the background after `delay_sec`, unless cancelled before.
+    """
+
+    def __init__(self, delay_sec: float, func: Callable[[], Any]):
+        self.func = func
+        self.cancelled = False
+
+        if IS_ASGI:
+            # `call_later()` is not thread-safe, schedule it from the loop
+            self.thread = None
+            _get_loop().call_soon_threadsafe(
+                _get_loop().call_later, delay_sec, self.__fire
+            )
+        else:
+            self.thread = threading.Timer(delay_sec, self.__fire)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def __fire(self):
+        if self.cancelled:
+            return
+        if self.thread is None:
+            run_in_background(self.func)
+        else:
+            self.func()
+
+    def cancel(self):
+        self.cancelled = True
+        if self.thread is not None:
+            self.thread.cancel()
+
+
+def call_later(delay_sec: float, func: Callable[[], Any]) -> Timer:
+    return Timer(delay_sec, func)
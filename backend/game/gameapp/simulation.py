@@ -0,0 +1,109 @@
+import random
+from typing import TYPE_CHECKING
+
+from gameapp.physics import INITIAL_SPEED, TICK_RATE, BatchPhysics, tick_scale
+
+if TYPE_CHECKING:
+    from gameapp.replay import ReplayLog
+
+SERVE_DELAY_SEC = 3
+
+
+class MatchSimulation:
+    """
+    Rules of one match on top of a `BatchPhysics` slot, independent of the wall clock,
+    Django and Socket.IO.
+
+    Everything is driven by the tick counter and by the per-match `rng` seeded with `seed`,
+    so the same seed and input stream always produce the same match.
+    One tick is:
+    - `move_paddle()` for the inputs of this tick
+    - `physics.step(dt)`
+    - `after_step()` with the scorer of this slot
+
+    `tick_rate` is the rate the match is stepped at, and `dt` the matching number
+    of base ticks per step (see `gameapp.physics`).
+    """
+
+    def __init__(
+        self,
+        physics: BatchPhysics,
+        is_with_ai: bool,
+        seed: int,
+        replay: "ReplayLog | None" = None,
+        tick_rate: int = TICK_RATE,
+    ):
+        self.physics = physics
+        self.slot = physics.allocate(0.0, 0.0, 0.1, 0.1)
+        self.is_with_ai = is_with_ai
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.replay = replay
+        self.tick_rate = tick_rate
+        self.dt = tick_scale(tick_rate)
+
+        self.tick = 0
+        self.score = [0, 0]
+        self.serve_at: int | None = None
+        self.serve_scorer = 0
+
+    def move_paddle(self, idx: int, move: int) -> float:
+        """
+        Move the paddle `idx` by one tick of `PADDLE_MOVE` in the direction of `move`.
+        Returns the new position.
+        """
+        x = self.physics.move_paddle(self.slot, idx, move, self.dt)
+
+        if self.replay is not None:
+            self.replay.record_input(self.tick, idx, move)
+        return x
+
+    def __reset(self, scorer_idx: int):
+        self.physics.set_ball(self.slot, 0.0, 0.0, 0.0, 0.0)
+        self.physics.set_paddle(self.slot, 0, 0.0)
+        self.physics.set_paddle(self.slot, 1, 0.0)
+        self.serve_at = self.tick + SERVE_DELAY_SEC * self.tick_rate
+        self.serve_scorer = scorer_idx
+
+    def __serve(self):
+        self.serve_at = None
+        vx = INITIAL_SPEED * ((int(self.rng.random() * 10000) % 2) * 2 - 1)
+        if self.is_with_ai:
+            vy = INITIAL_SPEED if self.serve_scorer == 0 else -INITIAL_SPEED
+        else:
+            vy = -INITIAL_SPEED
+        self.physics.set_velocity(self.slot, vx, vy)
+
+    def after_step(self, scorer: int) -> tuple[bool, bool]:
+        """
+        Apply the result of the physics step to this match and advance the tick.
+        Returns `(scored, served)`: whether a point was scored in this step
+        (the ball and paddles are reset), and whether the ball was served.
+        """
+        scored = scorer >= 0
+        if scored:
+            self.score = self.physics.get_score(self.slot)
+            self.__reset(scorer)
+
+        self.tick += 1
+
+        served = self.serve_at is not None and self.tick >= self.serve_at
+        if served:
+            self.__serve()
+        return scored, served
+
+    def get_winner(self, winning_score: int) -> int:
+        """
+        Index of the player who reached `winning_score`, `-1` if none.
+        Matches with AI never end by score.
+        """
+        if self.is_with_ai:
+            return -1
+        if self.score[0] == winning_score:
+            return 0
+        if self.score[1] == winning_score:
+            return 1
+        return -1
+
+    def release(self):
+        self.physics.release(self.slot)
@@ -1,10 +1,14 @@
+import contextlib
 import json
 import logging
+import threading
 from typing import Any
 
 import socketio
 
-from gameapp.envs import FRONTEND_URL, GAME_URL
+from gameapp.envs import FRONTEND_URL, GAME_MESSAGE_QUEUE, GAME_URL, IS_ASGI
+from gameapp.runtime import run_coroutine, run_coroutine_sync
+from gameapp.wire import pack_ball, pack_paddle, pack_score
 
 NAMESPACE = "/game"
 
@@ -17,32 +21,126 @@ UPDATE_BALL_EVENT = "updateBall"
 RESET_POSITIONS_EVENT = "resetPositions"
 OPPONENT_EVENT = "opponent"
 
-sio = socketio.Server(
-    cors_allowed_origins=[
-        "https://localhost",
-        f"https://{FRONTEND_URL}",
-        GAME_URL,
-    ]
-)
+# Clients that sent `binary: true` in the `auth` payload receive the hot events
+# as packed bytes (see `gameapp.wire`). Every match room has one sub-room per protocol.
+JSON_ROOM_SUFFIX = "#json"
+BINARY_ROOM_SUFFIX = "#bin"
+
+BINARY_PACKERS = {
+    UPDATE_BALL_EVENT: pack_ball,
+    UPDATE_PADDLE_EVENT: pack_paddle,
+    UPDATE_SCORE_EVENT: pack_score,
+}
+
+CORS_ALLOWED_ORIGINS = [
+    "https://localhost",
+    f"https://{FRONTEND_URL}",
+    GAME_URL,
+]
+
+# The helpers below hide the server type: with `AsyncServer`, they are called
+# from executor threads or from the tick engine, and hand the work to the loop.
+# With a message queue, emits, room changes and disconnects reach the sockets
+# connected to the other workers.
+sio: socketio.Server | socketio.AsyncServer
+if IS_ASGI:
+    sio = socketio.AsyncServer(
+        async_mode="asgi",
+        cors_allowed_origins=CORS_ALLOWED_ORIGINS,
+        client_manager=(
+            socketio.AsyncRedisManager(GAME_MESSAGE_QUEUE)
+            if GAME_MESSAGE_QUEUE != ""
+            else None
+        ),
+    )
+else:
+    sio = socketio.Server(
+        cors_allowed_origins=CORS_ALLOWED_ORIGINS,
+        client_manager=(
+            socketio.RedisManager(GAME_MESSAGE_QUEUE)
+            if GAME_MESSAGE_QUEUE != ""
+            else None
+        ),
+    )
+
+# Sockets that asked for the binary protocol, registered on the worker owning
+# their room, which may not hold their session.
+binary_sids: set[str] = set()
+binary_sids_lock = threading.Lock()
 
 logger = logging.getLogger(__name__)
 
 
+def _emit(event: str, data: Any, to: str):
+    if IS_ASGI:
+        run_coroutine(sio.emit(event, data, to=to, namespace=NAMESPACE))
+    else:
+        sio.emit(event, data, to=to, namespace=NAMESPACE)
+
+
 def sio_emit(event: str, data: dict[str, Any], to: str):
     if event != UPDATE_BALL_EVENT:
         logger.debug(f"sio_emit: event={event}, data={json.dumps(data)}, to={to}")
-    sio.emit(event, data, to=to, namespace=NAMESPACE)
+    _emit(event, data, to)
+
+
+def sio_emit_packed(event: str, data: dict[str, Any], to: str, seq: int):
+    """
+    Emit one of `BINARY_PACKERS` events to the match room `to`:
+    JSON to the clients of the JSON sub-room and packed bytes to the binary sub-room.
+    """
+    if event != UPDATE_BALL_EVENT:
+        logger.debug(f"sio_emit_packed: event={event}, data={json.dumps(data)}, to={to}")
+    _emit(event, data, to + JSON_ROOM_SUFFIX)
+    _emit(event, BINARY_PACKERS[event](seq, data), to + BINARY_ROOM_SUFFIX)
+
+
+@contextlib.contextmanager
+def _async_session(sid: str):
+    sess = run_coroutine_sync(sio.get_session(sid, namespace=NAMESPACE))
+    yield sess
+    run_coroutine_sync(sio.save_session(sid, sess, namespace=NAMESPACE))
 
 
 def sio_session(sid: str):
+    if IS_ASGI:
+        return _async_session(sid)
     return sio.session(sid, namespace=NAMESPACE)
 
 
 def sio_disconnect(sid: str):
     logger.info(f"sid={sid} disconnect")
-    sio.disconnect(sid, namespace=NAMESPACE)
+    if IS_ASGI:
+        # Not awaited: the disconnect handler may need locks held by the caller
+        run_coroutine(sio.disconnect(sid, namespace=NAMESPACE))
+    else:
+        sio.disconnect(sid, namespace=NAMESPACE)
+
+
+def _enter_room(sid: str, room_name: str):
+    if IS_ASGI:
+        run_coroutine_sync(sio.enter_room(sid, room_name, namespace=NAMESPACE))
+    else:
+        sio.enter_room(sid, room_name, namespace=NAMESPACE)
 
 
 def sio_enter_room(sid: str, room_name: str):
     logger.debug(f"sid={sid} enters room to {room_name}")
-    sio.enter_room(sid, room_name, namespace=NAMESPACE)
+    _enter_room(sid, room_name)
+
+
+def sio_set_protocol(sid: str, is_binary: bool):
+    with binary_sids_lock:
+        if is_binary:
+            binary_sids.add(sid)
+        else:
+            binary_sids.discard(sid)
+
+
+def sio_enter_match_room(sid: str, room_name: str):
+    with binary_sids_lock:
+        is_binary = sid in binary_sids
+    suffix = BINARY_ROOM_SUFFIX if is_binary else JSON_ROOM_SUFFIX
+    logger.debug(f"sid={sid} enters match room {room_name}, is_binary={is_binary}")
+    _enter_room(sid, room_name)
+    _enter_room(sid, room_name + suffix)
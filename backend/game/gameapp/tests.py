@@ -1 +1,836 @@
-# Create your tests here.
+import itertools
+import os
+import random
+import tempfile
+import threading
+import time
+import zlib
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+import jwt
+import numpy as np
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TransactionTestCase
+
+from exceptions.CustomException import BadRequestException, InternalException
+
+from gameapp.headless import random_controller, run_matches, tracking_controller
+from gameapp.physics import (
+    GOAL_Y,
+    MAX_VY,
+    PADDLE_Y,
+    SPEED_UP,
+    WALL_X,
+    BatchPhysics,
+)
+from gameapp.match_objects.engine import TickEngine
+from gameapp.match_objects.process import START_DELAY_SEC, MatchProcess
+from gameapp.models import MatchResultOutbox
+from gameapp.outbox import (
+    BACKOFF_MAX_SEC,
+    MAX_ATTEMPTS,
+    OutboxDispatcher,
+    get_backoff,
+)
+from gameapp.persistence import Command, SaveMatchResult, WriteBehindQueue
+from gameapp.registry import LocalRegistry, RemoteCommandError
+from gameapp.replay import ReplayLog, resimulate
+from gameapp.utils import now
+from shared.jwt_verify import JwtCheckError, JwtVerifier
+
+
+class BatchPhysicsTest(SimpleTestCase):
+    def make(self, x, y, vx, vy, paddles=(0.0, 0.0)) -> tuple[BatchPhysics, int]:
+        physics = BatchPhysics()
+        slot = physics.allocate(x, y, vx, vy)
+        physics.set_paddle(slot, 0, paddles[0])
+        physics.set_paddle(slot, 1, paddles[1])
+        physics.set_active(slot, True)
+        return physics, slot
+
+    def test_wall_sweep_at_high_vx(self):
+        # Reaches the right wall after 0.48 tick, then travels back 5.2
+        physics, slot = self.make(0.0, 0.0, 10.0, 0.0)
+        events = physics.step()
+
+        ball = physics.get_ball(slot)
+        self.assertAlmostEqual(ball["x"], WALL_X - 10.0 * (1 - WALL_X / 10.0))
+        self.assertEqual(ball["vx"], -10.0)
+        self.assertTrue(events.wall[slot])
+
+    def test_wall_sweep_bounces_on_both_walls(self):
+        physics, slot = self.make(0.0, 0.0, 20.0, 0.0)
+        events = physics.step()
+
+        # 4.8 to the right wall, 9.6 back to the left one, then 5.6 to the right
+        ball = physics.get_ball(slot)
+        self.assertAlmostEqual(ball["x"], -WALL_X + (20.0 - 3 * WALL_X))
+        self.assertEqual(ball["vx"], 20.0)
+        self.assertTrue(events.wall[slot])
+        self.assertEqual(events.scorer[slot], -1)
+
+    def test_paddle_sweep_does_not_tunnel(self):
+        # Crosses the paddle line and the goal line in one tick
+        physics, slot = self.make(0.0, 0.0, 0.0, 8.0)
+        events = physics.step()
+
+        ball = physics.get_ball(slot)
+        self.assertTrue(events.paddle[slot])
+        self.assertEqual(events.scorer[slot], -1)
+        self.assertEqual(ball["vy"], -MAX_VY)
+        t_line = PADDLE_Y / 8.0
+        self.assertAlmostEqual(ball["y"], PADDLE_Y - MAX_VY * (1 - t_line))
+        self.assertEqual(physics.get_score(slot), [0, 0])
+
+    def test_paddle_hit_speeds_up(self):
+        physics, slot = self.make(0.0, PADDLE_Y - 0.05, 0.01, 0.1)
+        events = physics.step()
+
+        ball = physics.get_ball(slot)
+        self.assertTrue(events.paddle[slot])
+        self.assertAlmostEqual(ball["vx"], 0.01 * SPEED_UP)
+        self.assertAlmostEqual(ball["vy"], -0.1 * SPEED_UP)
+
+    def test_goal_sweep_past_missed_paddle(self):
+        physics, slot = self.make(4.0, 0.0, 0.0, -8.0, paddles=(-4.0, 0.0))
+        events = physics.step()
+
+        self.assertFalse(events.paddle[slot])
+        self.assertEqual(events.scorer[slot], 1)
+        self.assertLessEqual(physics.get_ball(slot)["y"], -GOAL_Y)
+        self.assertEqual(physics.get_score(slot), [0, 1])
+
+    def test_inactive_slot_does_not_move(self):
+        physics, slot = self.make(0.0, 0.0, 10.0, 10.0)
+        physics.set_active(slot, False)
+        events = physics.step()
+
+        self.assertEqual(physics.get_ball(slot), {"x": 0, "y": 0, "vx": 10, "vy": 10})
+        self.assertEqual(events.scorer[slot], -1)
+
+    def test_batched_matches_single(self):
+        rng = np.random.default_rng(42)
+        states = [
+            (
+                rng.uniform(-WALL_X, WALL_X),
+                rng.uniform(-PADDLE_Y, PADDLE_Y),
+                rng.uniform(-12, 12),
+                rng.uniform(-MAX_VY, MAX_VY) * rng.choice([1, 40]),
+                tuple(rng.uniform(-4.5, 4.5, 2)),
+            )
+            for _ in range(200)
+        ]
+
+        batch = BatchPhysics(capacity=4)
+        slots = []
+        for x, y, vx, vy, paddles in states:
+            slot = batch.allocate(x, y, vx, vy)
+            batch.set_paddle(slot, 0, paddles[0])
+            batch.set_paddle(slot, 1, paddles[1])
+            batch.set_active(slot, True)
+            slots.append(slot)
+        batch_events = batch.step(dt=2.0)
+
+        for slot, (x, y, vx, vy, paddles) in zip(slots, states):
+            single, single_slot = self.make(x, y, vx, vy, paddles)
+            events = single.step(dt=2.0)
+
+            self.assertEqual(batch.get_ball(slot), single.get_ball(single_slot))
+            self.assertEqual(batch.get_score(slot), single.get_score(single_slot))
+            self.assertEqual(batch_events.wall[slot], events.wall[single_slot])
+            self.assertEqual(batch_events.paddle[slot], events.paddle[single_slot])
+            self.assertEqual(batch_events.scorer[slot], events.scorer[single_slot])
+
+    def test_step_does_not_depend_on_tick_length(self):
+        # Bounces on a wall and a paddle, without scoring
+        whole, slot = self.make(4.0, 5.0, 0.9, 0.15, paddles=(0.0, -4.0))
+        split, _ = self.make(4.0, 5.0, 0.9, 0.15, paddles=(0.0, -4.0))
+        whole.step(dt=24.0)
+        for _ in range(4):
+            split.step(dt=6.0)
+
+        self.assertEqual(whole.get_score(slot), [0, 0])
+        self.assertLess(whole.get_ball(slot)["vy"], 0)
+        for key, value in whole.get_ball(slot).items():
+            self.assertAlmostEqual(value, split.get_ball(slot)[key])
+
+
+class ReplayDeterminismTest(SimpleTestCase):
+    def play(self, tick_rate: int, controller=random_controller):
+        return run_matches(
+            4,
+            controller=controller,
+            seed=7,
+            winning_score=2,
+            max_ticks=60 * tick_rate,
+            tick_rate=tick_rate,
+            record=True,
+        )
+
+    def assertResimulated(self, result):
+        self.assertEqual(len(result.replays), result.matches)
+        for score, log in zip(result.scores, result.replays):
+            log = ReplayLog.from_dict(log.to_dict())
+            replayed = resimulate(log)
+            self.assertEqual(replayed.score, score)
+            self.assertEqual(replayed.score, log.score)
+            self.assertEqual(replayed.ticks, log.ticks)
+
+    def test_resimulate_at_60_hz(self):
+        result = self.play(60)
+        self.assertEqual(result.finished, result.matches)
+        self.assertResimulated(result)
+
+    def test_resimulate_at_30_hz(self):
+        result = self.play(30)
+        self.assertEqual(result.finished, result.matches)
+        self.assertResimulated(result)
+
+    def test_resimulate_unfinished_rallies(self):
+        # Long rallies with many inputs, cut by max_ticks
+        self.assertResimulated(self.play(30, tracking_controller))
+
+    def test_same_seed_same_matches(self):
+        for tick_rate in (30, 60):
+            first, second = self.play(tick_rate), self.play(tick_rate)
+            self.assertEqual(first.scores, second.scores)
+            self.assertEqual(first.ticks, second.ticks)
+            self.assertEqual(
+                [log.inputs for log in first.replays],
+                [log.inputs for log in second.replays],
+            )
+
+    def test_tick_rate_is_recorded(self):
+        for tick_rate in (30, 60):
+            for log in self.play(tick_rate).replays:
+                self.assertEqual(log.tick_rate, tick_rate)
+
+
+class RecordedProcessTest(SimpleTestCase):
+    """
+    Matches recorded live, through `TickEngine` and `MatchProcess`.
+    """
+
+    def setUp(self):
+        self.engine = TickEngine(tick_rate=30)
+        # Stepped by the test, not by a thread
+        self.engine.started = True
+        self.replay_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.replay_dir.cleanup)
+
+        process = "gameapp.match_objects.process"
+        for target, new in [
+            (f"{process}.tick_engine", self.engine),
+            (f"{process}.REPLAY_DIR", self.replay_dir.name),
+            (f"{process}.WINNING_SCORE", 2),
+            (f"{process}.write_behind", MagicMock()),
+            (f"{process}.sio_emit", MagicMock()),
+            (f"{process}.sio_emit_packed", MagicMock()),
+            (f"{process}.run_in_background", lambda func, *args: func(*args)),
+        ]:
+            patcher = patch(target, new)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def make_process(self, match_id: int) -> MatchProcess:
+        match = MagicMock(id=match_id)
+        match.match_room.room_name = "room"
+        users = [{"id": 2 * match_id}, {"id": 2 * match_id + 1}]
+        return MatchProcess(match, False, MagicMock(), users)  # type: ignore
+
+    def test_live_matches_resimulate(self):
+        rng = random.Random(7)
+        processes: list[MatchProcess] = []
+        start_ticks = [0, 1, 17, 40]
+
+        for tick in range(30 * 60 * 10):
+            if tick in start_ticks:
+                # Added to the engine by a scheduled function, as in production
+                process = self.make_process(len(processes))
+                process.start()
+                processes.append(process)
+            for process in processes:
+                for user in process.users:
+                    if rng.random() < 0.5:
+                        process.queue_paddle(user["id"], rng.choice([-1, 1]))
+            self.engine._TickEngine__step()  # type: ignore
+            if len(processes) == len(start_ticks) and all(
+                process.released for process in processes
+            ):
+                break
+
+        self.assertTrue(all(process.released for process in processes))
+        for process in processes:
+            path = os.path.join(self.replay_dir.name, f"{process.room_name}.json.gz")
+            log = ReplayLog.load(path)
+            self.assertEqual(log.score, process.score)
+            self.assertGreater(len(log.inputs), 0)
+
+            replayed = resimulate(log)
+            self.assertEqual(replayed.score, log.score)
+            self.assertEqual(replayed.ticks, log.ticks)
+
+    def test_start_delay_is_in_ticks(self):
+        process = self.make_process(0)
+        process.start()
+        for _ in range(round(START_DELAY_SEC * self.engine.tick_rate) - 1):
+            self.engine._TickEngine__step()  # type: ignore
+        self.assertNotIn(process.slot, self.engine.processes)
+        self.engine._TickEngine__step()  # type: ignore
+        self.assertIs(self.engine.processes[process.slot], process)
+        # The first step of a match is taken with its first tick
+        self.assertEqual(process.sim.tick, 1)
+
+
+class Record(Command):
+    def __init__(self, log: list, value: int):
+        self.log = log
+        self.value = value
+
+    def apply(self):
+        self.log.append(("apply", self.value))
+
+    @classmethod
+    def apply_batch(cls, commands):
+        commands[0].log.append((cls.__name__, [c.value for c in commands]))
+
+
+class OtherRecord(Record):
+    pass
+
+
+class Fail(Command):
+    def apply(self):
+        raise ValueError()
+
+    @classmethod
+    def apply_batch(cls, commands):
+        raise ValueError()
+
+
+class Block(Command):
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def apply(self):
+        self.event.wait()
+
+
+class WriteBehindQueueTest(TransactionTestCase):
+    def setUp(self):
+        self.log = []
+        self.queue = WriteBehindQueue(linger_sec=0.01)
+
+    def test_adjacent_commands_of_a_type_are_batched(self):
+        log = self.log
+        self.queue.enqueue(
+            "room",
+            Record(log, 1),
+            Record(log, 2),
+            OtherRecord(log, 3),
+            Record(log, 4),
+        )
+        self.queue.sync("room")
+
+        self.assertEqual(
+            log, [("Record", [1, 2]), ("OtherRecord", [3]), ("Record", [4])]
+        )
+        self.assertEqual(self.queue.last_of_room, {})
+
+    def test_failed_batch_falls_back_to_each_command(self):
+        log = self.log
+        self.queue.enqueue("room", Record(log, 1), Fail(), Record(log, 2))
+        self.queue.sync("room")
+
+        # The batch is rolled back, then every command but the failed one applies
+        self.assertEqual(log, [("Record", [1]), ("apply", 1), ("apply", 2)])
+
+    def test_commands_are_applied_in_order(self):
+        for value in range(30):
+            self.queue.enqueue("room", Record(self.log, value))
+            if value % 7 == 0:
+                time.sleep(0.02)
+        self.queue.sync("room")
+
+        values = [value for _, values in self.log for value in values]
+        self.assertEqual(values, list(range(30)))
+
+    def test_sync_waits_for_its_room_only(self):
+        event = threading.Event()
+        self.queue.enqueue("slow", Block(event))
+
+        start = time.monotonic()
+        self.queue.sync("other", timeout=1.0)
+        self.assertLess(time.monotonic() - start, 0.5)
+
+        event.set()
+        self.queue.sync("slow")
+
+    def test_flusher_survives_connection_errors(self):
+        with patch(
+            "gameapp.persistence.close_old_connections", side_effect=Exception()
+        ):
+            self.queue.enqueue("room", Record(self.log, 1))
+            self.queue.sync("room", timeout=1.0)
+
+        self.queue.enqueue("room", Record(self.log, 2))
+        self.queue.sync("room", timeout=1.0)
+        self.assertEqual(self.log, [("apply", 1), ("Record", [2])])
+
+    def test_sync_raises_on_timeout(self):
+        event = threading.Event()
+        self.queue.enqueue("slow", Block(event))
+
+        with self.assertRaises(InternalException):
+            self.queue.sync("slow", timeout=0.1)
+        event.set()
+
+
+class MatchRegistryTest(SimpleTestCase):
+    def make_cluster(self, worker_count: int) -> list[LocalRegistry]:
+        workers: dict[int, LocalRegistry] = {}
+        registries = [
+            LocalRegistry(i, worker_count, workers) for i in range(worker_count)
+        ]
+        for registry in registries:
+            registry.start()
+        return registries
+
+    def room_of(self, registry: LocalRegistry, owner: int) -> str:
+        return next(
+            name
+            for name in (f"room{i}" for i in itertools.count())
+            if registry.owner_of(name) == owner
+        )
+
+    def test_owner_is_crc32_of_room_name(self):
+        registry = LocalRegistry(0, 4)
+        for name in ("a", "room", "aB3xY9"):
+            self.assertEqual(registry.owner_of(name), zlib.crc32(name.encode()) % 4)
+        owners = {registry.owner_of(f"room{i}") for i in range(100)}
+        self.assertEqual(owners, {0, 1, 2, 3})
+
+    def test_is_local(self):
+        first, second = self.make_cluster(2)
+        room_name = self.room_of(first, 1)
+
+        self.assertFalse(first.is_local(room_name))
+        self.assertTrue(second.is_local(room_name))
+        self.assertTrue(first.is_local(None))
+        self.assertTrue(second.is_local(None))
+
+    def test_local_dispatch_runs_inline(self):
+        registry = LocalRegistry(0, 1)
+        calls = []
+
+        @registry.command("double")
+        def double(value: int):
+            calls.append(threading.get_ident())
+            return value * 2
+
+        @registry.command("fail")
+        def fail():
+            raise ValueError()
+
+        self.assertEqual(registry.dispatch("room", "double", value=1), 2)
+        self.assertEqual(registry.request("room", "double", value=3), 6)
+        self.assertEqual(calls, [threading.get_ident()] * 2)
+        with self.assertRaises(ValueError):
+            registry.request("room", "fail")
+
+    def test_remote_dispatch_runs_on_owner(self):
+        cluster = self.make_cluster(2)
+        done = threading.Event()
+        calls = []
+        for registry in cluster:
+
+            @registry.command("record")
+            def record(value: int, worker_id=registry.worker_id):
+                calls.append((worker_id, value))
+                done.set()
+
+        cluster[0].dispatch(self.room_of(cluster[0], 1), "record", value=5)
+
+        self.assertTrue(done.wait(1.0))
+        self.assertEqual(calls, [(1, 5)])
+
+    def test_inline_commands_run_on_receiving_thread(self):
+        first, second = self.make_cluster(2)
+        room_name = self.room_of(first, 1)
+        threads = {}
+        done = threading.Event()
+
+        @second.command("input", inline=True)
+        def on_input():
+            threads["input"] = threading.get_ident()
+
+        @second.command("slow")
+        def slow():
+            threads["slow"] = threading.get_ident()
+            done.set()
+
+        first.dispatch(room_name, "input")
+        first.dispatch(room_name, "slow")
+
+        self.assertTrue(done.wait(1.0))
+        self.assertEqual(threads["input"], threading.get_ident())
+        self.assertNotEqual(threads["slow"], threading.get_ident())
+
+    def test_remote_request(self):
+        first, second = self.make_cluster(2)
+        room_name = self.room_of(first, 1)
+        release = threading.Event()
+
+        @second.command("double")
+        def double(value: int):
+            return value * 2
+
+        @second.command("refuse")
+        def refuse():
+            raise BadRequestException()
+
+        @second.command("crash")
+        def crash():
+            raise ValueError()
+
+        @second.command("block")
+        def block():
+            release.wait()
+
+        self.assertEqual(first.request(room_name, "double", value=4), 8)
+
+        with self.assertRaises(RemoteCommandError) as refused:
+            first.request(room_name, "refuse")
+        self.assertEqual(refused.exception.msg, "bad_request")
+        self.assertEqual(refused.exception.get_status_code(), 400)
+
+        with self.assertRaises(RemoteCommandError) as crashed:
+            first.request(room_name, "crash")
+        self.assertEqual(crashed.exception.msg, InternalException().msg)
+        self.assertEqual(crashed.exception.get_status_code(), 500)
+
+        with self.assertRaises(InternalException):
+            first.request(room_name, "block", timeout=0.1)
+        release.set()
+        self.assertEqual(first.pending, {})
+
+
+class OutboxTest(TransactionTestCase):
+    def setUp(self):
+        self.dispatcher = OutboxDispatcher()
+        for match_id in (1, 2):
+            MatchResultOutbox.objects.create(
+                match_id=match_id, payload={"match_id": match_id}
+            )
+
+    def respond(self, rejected: list[int]) -> MagicMock:
+        return MagicMock(ok=True, **{"json.return_value": {"rejected": rejected}})
+
+    def fail(self, status_code: int) -> MagicMock:
+        return MagicMock(ok=False, status_code=status_code, text="error")
+
+    def make_due(self, attempts: int):
+        MatchResultOutbox.objects.update(attempts=attempts, next_attempt_at=now())
+
+    def sent_match_ids(self, post: MagicMock) -> list[list[int]]:
+        return [
+            [match["match_id"] for match in call.kwargs["json"]["matches"]]
+            for call in post.call_args_list
+        ]
+
+    def test_backoff_doubles_up_to_max(self):
+        self.assertEqual(get_backoff(1), timedelta(seconds=1))
+        self.assertEqual(get_backoff(2), timedelta(seconds=2))
+        self.assertEqual(get_backoff(4), timedelta(seconds=8))
+        self.assertEqual(get_backoff(30), timedelta(seconds=BACKOFF_MAX_SEC))
+
+    def test_result_is_saved_once_per_match(self):
+        with transaction.atomic():
+            SaveMatchResult.apply_batch(
+                [SaveMatchResult(2, {"again": True}), SaveMatchResult(3, {})]
+            )
+        with transaction.atomic():
+            SaveMatchResult.apply_batch([SaveMatchResult(3, {"again": True})])
+
+        payloads = dict(MatchResultOutbox.objects.values_list("match_id", "payload"))
+        self.assertEqual(payloads, {1: {"match_id": 1}, 2: {"match_id": 2}, 3: {}})
+
+    def test_rejected_rows_are_deleted(self):
+        with patch("gameapp.outbox.post", return_value=self.respond([2])) as post:
+            self.assertEqual(self.dispatcher.dispatch_due(), 2)
+
+        post.assert_called_once()
+        self.assertEqual(
+            post.call_args.kwargs["json"],
+            {"matches": [{"match_id": 1}, {"match_id": 2}]},
+        )
+        self.assertFalse(MatchResultOutbox.objects.exists())
+
+    def test_failed_rows_are_rescheduled(self):
+        before = now()
+        with patch("gameapp.outbox.post", side_effect=InternalException()):
+            self.assertEqual(self.dispatcher.dispatch_due(), 2)
+
+        for row in MatchResultOutbox.objects.all():
+            self.assertEqual(row.attempts, 1)
+            self.assertGreaterEqual(row.next_attempt_at, before + get_backoff(1))
+        with patch("gameapp.outbox.post") as post:
+            self.assertEqual(self.dispatcher.dispatch_due(), 0)
+        post.assert_not_called()
+
+    def test_failed_rows_are_retried_alone(self):
+        with patch("gameapp.outbox.post", return_value=self.fail(503)):
+            self.assertEqual(self.dispatcher.dispatch_due(), 2)
+        self.make_due(1)
+
+        with patch("gameapp.outbox.post", return_value=self.respond([])) as post:
+            self.assertEqual(self.dispatcher.dispatch_due(), 1)
+            self.assertEqual(self.dispatcher.dispatch_due(), 1)
+            self.assertEqual(self.dispatcher.dispatch_due(), 0)
+        self.assertEqual(sorted(self.sent_match_ids(post)), [[1], [2]])
+        self.assertFalse(MatchResultOutbox.objects.exists())
+
+    def test_refused_batch_is_retried_alone(self):
+        with patch("gameapp.outbox.post", return_value=self.fail(400)):
+            self.assertEqual(self.dispatcher.dispatch_due(), 2)
+        self.assertEqual(
+            list(MatchResultOutbox.objects.values_list("attempts", flat=True)), [1, 1]
+        )
+
+    def test_refused_row_is_dropped(self):
+        self.make_due(1)
+        with patch("gameapp.outbox.post", return_value=self.fail(400)):
+            self.assertEqual(self.dispatcher.dispatch_due(), 1)
+        # The other row is still due
+        self.assertEqual(MatchResultOutbox.objects.filter(attempts=1).count(), 1)
+
+    def test_temporary_4xx_is_retried(self):
+        self.make_due(1)
+        with patch("gameapp.outbox.post", return_value=self.fail(429)):
+            self.assertEqual(self.dispatcher.dispatch_due(), 1)
+        self.assertEqual(MatchResultOutbox.objects.count(), 2)
+        self.assertEqual(MatchResultOutbox.objects.filter(attempts=2).count(), 1)
+
+    def test_attempts_are_capped(self):
+        self.make_due(MAX_ATTEMPTS - 1)
+        with patch("gameapp.outbox.post", side_effect=InternalException()):
+            self.assertEqual(self.dispatcher.dispatch_due(), 1)
+        self.assertEqual(MatchResultOutbox.objects.count(), 1)
+
+    def test_claimed_rows_are_sent_outside_a_transaction(self):
+        def send(url, json):
+            self.assertFalse(connection.in_atomic_block)
+            # Another dispatcher does not pick up the claimed rows
+            self.assertEqual(OutboxDispatcher().dispatch_due(), 0)
+            return self.respond([])
+
+        with patch("gameapp.outbox.post", side_effect=send) as post:
+            self.assertEqual(self.dispatcher.dispatch_due(), 2)
+        post.assert_called_once()
+        self.assertFalse(MatchResultOutbox.objects.exists())
+
+
+JWT_TEST_SECRET = "test-secret-of-the-jwt-service-32"
+
+
+def respond(status_code: int, body) -> MagicMock:
+    return MagicMock(
+        ok=status_code < 300,
+        status_code=status_code,
+        text=body if isinstance(body, str) else "",
+        **{"json.return_value": body},
+    )
+
+
+class FakeJwtService:
+    """
+    `POST /jwt/check` and `POST /jwt/changes` of the JWT service.
+    """
+
+    def __init__(self, lookback: int = 2):
+        self.secrets: dict[int, str] = {}
+        self.twofa_passed: set[int] = set()
+        # (id, user_id), in the order they were committed
+        self.changes: list[tuple[int, int]] = []
+        self.change_ids = itertools.count(1)
+        # Number of the last committed changes sent on every poll
+        self.lookback = lookback
+        self.checks = 0
+        self.reachable = True
+        self.answered_user_id: int | None = None
+
+    def login(self, user_id: int, user_secret: str, change_id: int | None = None):
+        """
+        `change_id` is an id taken earlier, for a change committed late.
+        """
+        self.secrets[user_id] = user_secret
+        self.twofa_passed.discard(user_id)
+        if change_id is None:
+            change_id = next(self.change_ids)
+        self.changes.append((change_id, user_id))
+        return make_token(user_id, user_secret)
+
+    def __call__(self, url: str, json: dict):
+        if not self.reachable:
+            raise ConnectionError()
+        if url.endswith("/jwt/changes"):
+            since = json["since"]
+            cursor = max([since or 0] + [change_id for change_id, _ in self.changes])
+            recent = self.changes[-self.lookback :]
+            changes = [
+                change
+                for change in self.changes
+                if (since is not None and change[0] > since) or change in recent
+            ]
+            return respond(
+                200, {"cursor": cursor, "changes": changes, "reset": since is None}
+            )
+
+        self.checks += 1
+        payload = jwt.decode(json["jwt"], JWT_TEST_SECRET, algorithms=["HS256"])
+        user_id = payload["user_id"]
+        if self.secrets.get(user_id) != payload["user_secret"]:
+            return respond(401, "jwt.invalid")
+        if not json["skip_2fa"] and user_id not in self.twofa_passed:
+            return respond(401, "jwt.required")
+        return respond(200, {"user_id": self.answered_user_id or user_id})
+
+
+def make_token(
+    user_id: int, user_secret: str, exp_seconds: int = 60, key=JWT_TEST_SECRET
+) -> str:
+    return jwt.encode(
+        {
+            "user_id": user_id,
+            "user_secret": user_secret,
+            "exp": int(time.time()) + exp_seconds,
+        },
+        key=key,
+        algorithm="HS256",
+    )
+
+
+class JwtVerifierTest(SimpleTestCase):
+    def setUp(self):
+        self.service = FakeJwtService()
+        self.verifier = self.make_verifier(3600)
+
+    def make_verifier(self, refresh_seconds: float, **kwargs) -> JwtVerifier:
+        return JwtVerifier(
+            JWT_TEST_SECRET,
+            "HS256",
+            "http://jwt",
+            self.service,
+            refresh_seconds,
+            **kwargs,
+        )
+
+    def assertRefused(self, token: str, content: str, skip_2fa: bool = True):
+        with self.assertRaises(JwtCheckError) as refused:
+            self.verifier.verify(token, skip_2fa)
+        self.assertEqual(refused.exception.content, content)
+        self.assertEqual(refused.exception.status_code, 401)
+
+    def test_bad_signature_is_refused_locally(self):
+        self.service.login(1, "a")
+        forged = make_token(1, "a", key="other-secret-of-the-jwt-service-32")
+        self.assertRefused(forged, "jwt.invalid")
+        self.assertRefused("not a token", "jwt.invalid")
+        self.assertEqual(self.service.checks, 0)
+
+    def test_expired_token_is_refused_locally(self):
+        self.service.login(1, "a")
+        self.assertRefused(make_token(1, "a", exp_seconds=-10), "jwt.expired")
+        self.assertEqual(self.service.checks, 0)
+
+    def test_user_id_mismatch_is_refused(self):
+        token = self.service.login(1, "a")
+        self.service.answered_user_id = 2
+        self.assertRefused(token, "jwt.invalid")
+
+    def test_known_secret_is_accepted_locally(self):
+        token = self.service.login(1, "a")
+        self.assertEqual(self.verifier.verify(token, True), 1)
+        # Another token of the same login, much later
+        self.assertEqual(self.verifier.verify(make_token(1, "a", 3600), True), 1)
+        self.assertEqual(self.service.checks, 1)
+
+    def test_2fa_is_checked_until_passed(self):
+        token = self.service.login(1, "a")
+        self.verifier.verify(token, True)
+        self.assertRefused(token, "jwt.required", skip_2fa=False)
+
+        self.service.twofa_passed.add(1)
+        self.assertEqual(self.verifier.verify(token, False), 1)
+        self.assertEqual(self.verifier.verify(token, True), 1)
+        self.assertEqual(self.verifier.verify(token, False), 1)
+        self.assertEqual(self.service.checks, 3)
+
+    def test_change_invalidates_the_user(self):
+        old_token = self.service.login(1, "a")
+        other_token = self.service.login(2, "b")
+        self.verifier.verify(old_token, True)
+        self.verifier.verify(other_token, True)
+
+        # Logged in again: the old token is revoked
+        new_token = self.service.login(1, "c")
+        self.verifier.refresh()
+
+        self.assertRefused(old_token, "jwt.invalid")
+        self.assertEqual(self.verifier.verify(new_token, True), 1)
+        checks = self.service.checks
+        self.assertEqual(self.verifier.verify(other_token, True), 2)
+        self.assertEqual(self.verifier.verify(new_token, True), 1)
+        self.assertEqual(self.service.checks, checks)
+
+    def test_stale_view_is_not_trusted(self):
+        self.verifier = self.make_verifier(0.01)
+        token = self.service.login(1, "a")
+        self.verifier.verify(token, True)
+
+        self.service.reachable = False
+        time.sleep(0.1)
+        self.service.reachable = True
+        self.service.secrets[1] = "revoked"
+        self.assertRefused(token, "jwt.invalid")
+
+    def test_late_change_is_applied(self):
+        token = self.service.login(1, "a")
+        self.verifier.verify(token, True)
+
+        # Its id is taken before the change of user 2, but it commits after
+        late_id = next(self.service.change_ids)
+        self.service.login(2, "b")
+        self.verifier.refresh()
+        self.assertEqual(self.verifier.verify(token, True), 1)
+        self.service.login(1, "c", change_id=late_id)
+        self.verifier.refresh()
+
+        self.assertRefused(token, "jwt.invalid")
+
+    def test_change_sent_again_is_applied_once(self):
+        token = self.service.login(1, "a")
+        self.verifier.verify(token, True)
+        self.verifier.refresh()
+
+        # Still within the lookback of the JWT service
+        self.service.login(1, "b")
+        self.verifier.refresh()
+        token = make_token(1, "b")
+        self.verifier.verify(token, True)
+        checks = self.service.checks
+        self.verifier.refresh()
+        self.assertEqual(self.verifier.verify(token, True), 1)
+        self.assertEqual(self.service.checks, checks)
+
+    def test_old_entry_is_checked_again(self):
+        self.verifier = self.make_verifier(3600, max_age=0.05)
+        token = self.service.login(1, "a")
+        self.verifier.verify(token, True)
+        self.verifier.verify(token, True)
+        self.assertEqual(self.service.checks, 1)
+
+        time.sleep(0.1)
+        self.service.secrets[1] = "revoked"
+        self.assertRefused(token, "jwt.invalid")
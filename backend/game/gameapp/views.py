@@ -49,7 +49,7 @@ def make_game(req: Request, data: Dict[str, Any]):
 def delete_game(req: Request):
     room_name = get_str(req.query_params, "room_name")
     clear_room(room_name)
-    clear_match_dict()
+    clear_match_dict(room_name)
     return JsonResponse({})
 
 
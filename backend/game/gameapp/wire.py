@@ -0,0 +1,20 @@
+import struct
+from typing import Any
+
+# Little-endian, no padding. Every message starts with the per-match sequence number.
+BALL_STRUCT = struct.Struct("<I4f")  # seq, x, y, vx, vy
+PADDLE_STRUCT = struct.Struct("<IBf")  # seq, paddle index (0: paddle1, 1: paddle2), position
+SCORE_STRUCT = struct.Struct("<IHH")  # seq, paddle1, paddle2
+
+
+def pack_ball(seq: int, data: dict[str, Any]) -> bytes:
+    return BALL_STRUCT.pack(seq, data["x"], data["y"], data["vx"], data["vy"])
+
+
+def pack_paddle(seq: int, data: dict[str, Any]) -> bytes:
+    idx = 0 if data["paddleId"] == "paddle1" else 1
+    return PADDLE_STRUCT.pack(seq, idx, data["position"])
+
+
+def pack_score(seq: int, data: dict[str, Any]) -> bytes:
+    return SCORE_STRUCT.pack(seq, data["paddle1"], data["paddle2"])
@@ -1,13 +1,15 @@
 import logging
+from http.client import FORBIDDEN
 from typing import List, Tuple, Any
 
 from django.db import transaction
 from django.db.models import Min
 from socketio.exceptions import ConnectionRefusedError
 
-from exceptions.CustomException import InternalException
+from exceptions.CustomException import CustomException, InternalException
 from gameapp.connect_utils import join_match
 from gameapp.db_utils import get_room_user_or_none
+from gameapp.decorators import jwt_verifier
 from gameapp.envs import GAMEAI_URL, JWT_URL
 from gameapp.match_objects import Match, match_dict
 from gameapp.match_objects.matchuser import AI_ID, RealUser, get_dto
@@ -17,8 +19,10 @@ from gameapp.models import (
     TempMatchRoomUser,
     TempMatchUser,
 )
+from gameapp.persistence import write_behind
+from gameapp.registry import match_registry
 from gameapp.requests import post
-from gameapp.sio import sio_enter_room, sio_session
+from gameapp.sio import sio_enter_room, sio_session, sio_set_protocol
 from gameapp.utils import (
     fetch_username,
     get_int,
@@ -28,71 +32,119 @@ from gameapp.utils import (
     generate_secret,
 )
 from gameapp.match_objects.waiting import Waiting, WaitingUsersJoin, waiting_dict
+from shared.jwt_verify import JwtCheckError
 
 logger = logging.getLogger(__name__)
 
 
-def make_rooms(room_name: str, user_id: List[int]):
-    with transaction.atomic():
-        temp_match_room = TempMatchRoom.objects.create(room_name=room_name)
+class JoinRefusedException(CustomException):
+    """
+    The owner of the room refused a connect.
+    """
 
-        temp_match_room_users: list[TempMatchRoomUser] = []
-        for id in user_id:
-            temp_match_user = TempMatchRoomUser.objects.create(
-                user_id=id, temp_match_room_id=temp_match_room.id
-            )
-            temp_match_room_users.append(temp_match_user)
+    def get_status_code(self) -> int:
+        return FORBIDDEN
 
-        user_len = len(user_id)
 
-        prev_match = [
-            TempMatch.objects.create(
-                match_room_id=temp_match_room.id, round=2, winner_match=None
-            )
-        ]
+def _build_bracket(
+    temp_match_room: TempMatchRoom, user_len: int
+) -> list[list[TempMatch]]:
+    """
+    Unsaved matches of the bracket, one list per round from the final
+    (`round=2`) to the first round. `winner_match` is linked in memory only.
+    """
+    levels = [[TempMatch(match_room=temp_match_room, round=2, winner_match=None)]]
 
-        match_tuples: list[Tuple[TempMatch, TempMatch]] = []
+    for round in [4, 8, 16]:
+        if round > user_len:
+            break
 
-        for round in [4, 8, 16]:
-            if round > user_len:
-                break
+        prev_match = levels[-1]
+        levels.append(
+            [
+                TempMatch(
+                    match_room=temp_match_room,
+                    round=round,
+                    winner_match=prev_match[m // 2],
+                )
+                for m in range(round // 2)
+            ]
+        )
+    return levels
 
-            match_len = round // 2
-            cur_match = []
 
-            for m in range(match_len):
-                cur_match.append(
-                    TempMatch.objects.create(
-                        match_room_id=temp_match_room.id,
-                        round=round,
-                        winner_match_id=prev_match[m // 2].id,
-                    )
-                )
-                if len(cur_match) % 2 == 0:
-                    match_tuples.append((cur_match[-1], cur_match[-2]))
+def sync_previous_rooms(user_ids: List[int]):
+    """
+    The users may still be deleted from their previous room behind,
+    by the worker that owns it: wait for it there.
+    """
+    room_names = (
+        TempMatchRoomUser.objects.filter(user_id__in=user_ids)
+        .values_list("temp_match_room__room_name", flat=True)
+        .distinct()
+    )
+    for room_name in room_names:
+        match_registry.request(room_name, "sync_room", room_name=room_name)
+
+
+@match_registry.command("sync_room")
+def sync_room(room_name: str):
+    write_behind.sync(room_name)
+
+
+def make_rooms(room_name: str, user_id: List[int]):
+    """
+    Create the whole bracket with a constant number of queries:
+    the room, its users, every match, the `winner_match` links and the users
+    of the first round.
+    """
+    sync_previous_rooms(user_id)
+    with transaction.atomic():
+        temp_match_room = TempMatchRoom.objects.create(room_name=room_name)
+
+        TempMatchRoomUser.objects.bulk_create(
+            [
+                TempMatchRoomUser(user_id=id, temp_match_room=temp_match_room)
+                for id in user_id
+            ]
+        )
+
+        levels = _build_bracket(temp_match_room, len(user_id))
+        all_matches = [m for level in levels for m in level]
 
-            prev_match = cur_match
+        # `winner_match` has no id before the insert, so it is linked afterwards
+        winner_matches = [m.winner_match for m in all_matches]
+        for m in all_matches:
+            m.winner_match = None
+        TempMatch.objects.bulk_create(all_matches)
+
+        for m, winner_match in zip(all_matches, winner_matches):
+            m.winner_match = winner_match
+        linked = [m for m in all_matches if m.winner_match is not None]
+        if linked:
+            TempMatch.objects.bulk_update(linked, ["winner_match"])
+
+        match_tuples: list[Tuple[TempMatch, TempMatch]] = []
+        for level in levels[1:]:
+            for m in range(1, len(level), 2):
+                match_tuples.append((level[m], level[m - 1]))
 
         temp_match_users: list[TempMatchUser] = []
-        for idx, match in enumerate(prev_match):
+        for idx, match in enumerate(levels[-1]):
             temp_match_users.append(
-                TempMatchUser.objects.create(
-                    user_id=user_id[idx * 2],
-                    temp_match_id=match.id,
-                )
+                TempMatchUser(user_id=user_id[idx * 2], temp_match=match)
             )
             temp_match_users.append(
-                TempMatchUser.objects.create(
-                    user_id=user_id[idx * 2 + 1],
-                    temp_match_id=match.id,
-                )
+                TempMatchUser(user_id=user_id[idx * 2 + 1], temp_match=match)
             )
+        TempMatchUser.objects.bulk_create(temp_match_users)
 
-        init_matches(room_name, temp_match_users, match_tuples)
+        _init_or_forward(room_name, temp_match_users, match_tuples)
 
 
 def make_airoom(user_id: int):
     room_name = generate_secret()
+    sync_previous_rooms([user_id])
     with transaction.atomic():
         temp_match_room = TempMatchRoom.objects.create(room_name=room_name)
         TempMatchRoomUser.objects.create(
@@ -110,19 +162,78 @@ def make_airoom(user_id: int):
             user_id=user_id, temp_match_id=temp_match.id
         )
 
-        init_matches(room_name, [temp_match_user], [], is_with_ai=True)
+        _init_or_forward(room_name, [temp_match_user], [], is_with_ai=True)
+
+
+def _init_or_forward(
+    room_name: str,
+    users: List[TempMatchUser],
+    matches: List[Tuple[TempMatch, TempMatch]],
+    is_with_ai: bool = False,
+):
+    if match_registry.is_local(room_name):
+        init_matches(room_name, users, matches, is_with_ai)
+        return
+
+    # The owner loads the bracket from the database, so wait for the commit.
+    # Wait for the owner too, so the users never connect before the room exists.
+    transaction.on_commit(
+        lambda: match_registry.request(
+            room_name, "init_room", room_name=room_name, is_with_ai=is_with_ai
+        )
+    )
+
+
+def load_bracket(
+    room_name: str,
+) -> Tuple[List[TempMatchUser], List[Tuple[TempMatch, TempMatch]]]:
+    """
+    The users of the first round, and the pairs of matches whose winners meet.
+    """
+    matches = list(
+        TempMatch.objects.filter(match_room__room_name=room_name).select_related(
+            "match_room"
+        )
+    )
+    first_round = max(m.round for m in matches)
+    users = list(
+        TempMatchUser.objects.filter(
+            temp_match__in=[m for m in matches if m.round == first_round]
+        )
+        .select_related("temp_match__match_room")
+        .order_by("id")
+    )
+
+    siblings: dict[int, list[TempMatch]] = {}
+    for m in matches:
+        if m.winner_match_id is not None:  # type: ignore
+            siblings.setdefault(m.winner_match_id, []).append(m)  # type: ignore
+    match_tuples = [(m[0], m[1]) for m in siblings.values() if len(m) == 2]
+    return users, match_tuples
+
 
+@match_registry.command("init_room")
+def init_room(room_name: str, is_with_ai: bool):
+    users, match_tuples = load_bracket(room_name)
+    init_matches(room_name, users, match_tuples, is_with_ai)
 
-def _get_from_sess(sid: str) -> Tuple[bool, int, str]:
+
+def _get_from_sess(sid: str) -> Tuple[bool, int, str, str | None]:
     with sio_session(sid) as sess:
         is_ai: bool = sess["is_ai"]
         user_id: int = sess["user_id"]
         user_name: str = sess["user_name"]
+        room_name: str | None = sess.get("room_name")
+
+    return is_ai, user_id, user_name, room_name
 
-    return is_ai, user_id, user_name
 
+def clear_match_dict(room_name: str):
+    match_registry.dispatch(room_name, "clear_match_dict")
 
-def clear_match_dict():
+
+@match_registry.command("clear_match_dict")
+def _clear_match_dict():
     match_dict.clear()
 
 
@@ -141,64 +252,106 @@ def _get_match_id_from_jwt(jwt) -> int:
 
 def _get_user_id_from_jwt(jwt) -> int:
     try:
-        res = post(f"{JWT_URL}/jwt/check", json={"jwt": jwt, "skip_2fa": False})
+        return jwt_verifier.verify(jwt, False)
     except InternalException as e:
         raise ConnectionRefusedError(e.msg)
+    except JwtCheckError as e:
+        raise ConnectionRefusedError(e.content)
 
-    if not res.ok:
-        raise ConnectionRefusedError(res.content)
 
-    json = res.json()
-    return json["user_id"]
+def _get_room_name_of_match(match_id: int) -> str:
+    return TempMatch.objects.select_related("match_room").get(id=match_id).match_room.room_name
 
 
 def on_connect(sid, auth):
+    """
+    Runs on the worker holding the socket, which may not own its room:
+    the session is stored here, and the match logic runs on the owner.
+    A failure on the owner refuses the connect.
+    """
     logger.info(f"connected sid={sid}")
 
     if "ai" in auth:
         jwt = get_str(auth, "jwt")
         match_id = _get_match_id_from_jwt(jwt)
+        room_name = _get_room_name_of_match(match_id)
 
         logger.info(f"AI joined with match_id={match_id}")
-        join_match_ai(sid, match_id)
+        try:
+            match_registry.request(
+                room_name, "join_match_ai", sid=sid, match_id=match_id
+            )
+        except CustomException as e:
+            raise ConnectionRefusedError(e.msg)
 
         with sio_session(sid) as sess:
             sess["is_ai"] = True
             sess["user_id"] = AI_ID
             sess["user_name"] = None
+            sess["room_name"] = room_name
         return
 
     jwt = get_str(auth, "jwt")
     user_id = _get_user_id_from_jwt(jwt)
     user_name = fetch_username(user_id)
     user_dto: RealUser = get_dto(False, sid, user_id, user_name)  # type: ignore
+    is_binary = auth.get("binary") is True
     with sio_session(sid) as sess:
         sess["is_ai"] = False
         sess["user_id"] = user_id
         sess["user_name"] = user_name
 
+    # Only finds the owner of the room, which checks the user again once the
+    # pending writes of the room are applied
     room_user = get_room_user_or_none(user_id)
-    if room_user is None or room_user.is_online:
+    if room_user is None:
         raise ConnectionRefusedError("temp match room user none or online")
 
-    logger.info(f"room_user, is_online is now True, {room_user}")
-
     room_name = room_user.temp_match_room.room_name
     sio_enter_room(sid, room_name)
+    with sio_session(sid) as sess:
+        sess["room_name"] = room_name
+
+    try:
+        match_registry.request(
+            room_name,
+            "user_join",
+            room_name=room_name,
+            user_dto=user_dto,
+            is_binary=is_binary,
+        )
+    except CustomException as e:
+        raise ConnectionRefusedError(e.msg)
+
+
+@match_registry.command("user_join")
+def user_join(room_name: str, user_dto: RealUser, is_binary: bool):
+    write_behind.sync(room_name)
+    user_id = user_dto["id"]
+
+    room_user = get_room_user_or_none(user_id)
+    if (
+        room_user is None
+        or room_user.is_online
+        or room_user.temp_match_room.room_name != room_name
+    ):
+        raise JoinRefusedException("temp match room user none or online")
 
     match_user = get_match_user_or_none(user_id)
     if match_user is None:
         logger.error(f"user_id={user_id} has room_user but has no match_user")
-        raise ConnectionRefusedError("temp match user none")
+        raise JoinRefusedException("temp match user none")
     logger.info(f"match_user={match_user}")
 
     waiting_room = waiting_dict.get(room_name)
     if waiting_room is None:
         logger.error("cannot find waiting room! this is internal error")
         raise InternalException()
+    sio_set_protocol(user_dto["sid"], is_binary)
     waiting_room.user_join(user_dto)
     # join_match(sid, match_user, username=user_name)
 
+    logger.info(f"room_user, is_online is now True, {room_user}")
     room_user.is_online = True
     room_user.save()
 
@@ -206,10 +359,30 @@ def on_connect(sid, auth):
 def on_disconnect(sid, reason):
     # TODO: If reason is CLIENT_DISCONNECT, wait to be reconnected
 
-    is_ai, user_id, user_name = _get_from_sess(sid)
+    is_ai, user_id, user_name, room_name = _get_from_sess(sid)
+    match_registry.dispatch(
+        room_name,
+        "user_disconnect",
+        sid=sid,
+        is_ai=is_ai,
+        user_id=user_id,
+        user_name=user_name,
+        room_name=room_name,
+    )
+
+
+@match_registry.command("user_disconnect")
+def user_disconnect(
+    sid: str, is_ai: bool, user_id: int, user_name: str, room_name: str | None
+):
+    match_dict.unindex_user(sid, user_id)
+    sio_set_protocol(sid, False)
     if is_ai:
         return
 
+    if room_name is not None:
+        write_behind.sync(room_name)
+
     user_dto = RealUser(is_ai=False, id=user_id, name=user_name, sid=sid)
 
     match_room_user = get_match_room_user_or_none(user_id)
@@ -239,6 +412,7 @@ def on_disconnect(sid, reason):
         logger.info("disconnecting... but match_user not found")
 
 
+@match_registry.command("join_match_ai")
 def join_match_ai(sid: str, match_id: int):
     match_dict[match_id].ai_connected(sid)
 
@@ -246,37 +420,74 @@ def join_match_ai(sid: str, match_id: int):
 def on_paddle_move(sid: str, data: dict[str, Any]):
     logger.debug(f"paddle_move event received! sid={sid}, data={data}")
 
-    with sio_session(sid) as sess:
-        is_ai: bool = sess["is_ai"]
-        user_id: int = sess["user_id"]
-        user_name: str | None = sess["user_name"]
+    is_ai, user_id, user_name, room_name = _get_from_sess(sid)
     logger.debug(f"sid={sid}, user_id={user_id}, user_name={user_name}, is_ai={is_ai}")
 
+    paddle_direction = get_int(data, "paddleDirection")
+    logger.debug(f"sid={sid}, paddle_direction={paddle_direction}")
+
+    match_registry.dispatch(
+        room_name,
+        "paddle_move",
+        sid=sid,
+        is_ai=is_ai,
+        user_id=user_id,
+        user_name=user_name,
+        paddle_direction=paddle_direction,
+    )
+
+
+@match_registry.command("paddle_move", inline=True)
+def paddle_move(
+    sid: str,
+    is_ai: bool,
+    user_id: int,
+    user_name: str | None,
+    paddle_direction: int,
+):
     user_dto = get_dto(is_ai, sid, user_id, user_name)
     room = match_dict.get_room_by_user_dto(user_dto)
     if room is None:
         logger.debug(f"sid={sid}, user_id={user_id} room not found")
         raise InternalException()
 
-    paddle_direction = get_int(data, "paddleDirection")
-    logger.debug(f"sid={sid}, paddle_direction={paddle_direction}")
-
     if room.match_process is not None:
-        room.match_process.set_paddle(user_id, paddle_direction)
+        room.match_process.queue_paddle(user_id, paddle_direction)
 
 
 def on_next_game(sid: str):
-    _, user_id, username = _get_from_sess(sid)
+    _, user_id, username, room_name = _get_from_sess(sid)
     logger.info(f"next_game event: sid={sid}, user_id={user_id}")
 
+    match_registry.dispatch(
+        room_name,
+        "next_game",
+        sid=sid,
+        user_id=user_id,
+        username=username,
+        room_name=room_name,
+    )
+
+
+def get_next_match_user(user_id: int) -> TempMatchUser:
+    """
+    The user in the latest round (the smallest) the user was added to.
+    """
     user_min_match = TempMatch.objects.filter(tempmatchuser__user_id=user_id).aggregate(
         round=Min("round")
     )["round"]
 
-    match_user = TempMatchUser.objects.filter(
+    return TempMatchUser.objects.filter(
         user_id=user_id, temp_match__round=user_min_match
     ).get()
 
+
+@match_registry.command("next_game")
+def next_game(sid: str, user_id: int, username: str, room_name: str):
+    # The user is added to the next match behind
+    write_behind.sync(room_name)
+    match_user = get_next_match_user(user_id)
+
     logger.info(match_user)
     logger.info(f"next match id = {match_user.temp_match.id}")
 
@@ -295,7 +506,7 @@ def init_matches(
         if match_id not in match_dict.get_dict():
             match_dict[match_id] = Match(u.temp_match, is_with_ai=is_with_ai)
 
-        user = RealUser(is_ai=False, id=u.user.id, name="", sid="")
+        user = RealUser(is_ai=False, id=u.user_id, name="", sid="")  # type: ignore
         real_users.append(user)
 
         logger.info(user)
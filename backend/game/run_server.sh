@@ -1,7 +1,17 @@
 #!/bin/ash
 
+# Every worker process claims one id of the rooms, see "Sharding" in README.md
+if [ "${GAME_WORKER_COUNT:-1}" -gt 1 ] && [ "${WEBSOCKET_WORKER}" != "${GAME_WORKER_COUNT}" ]; then
+    echo "WEBSOCKET_WORKER=${WEBSOCKET_WORKER} must be GAME_WORKER_COUNT=${GAME_WORKER_COUNT}" >&2
+    exit 1
+fi
+
 python manage.py makemigrations gameapp
 python manage.py migrate gameapp
 python manage.py migrate --fake
-python manage.py flush --no-input
-gunicorn -w ${WEBSOCKET_WORKER} --threads ${WEBSOCKET_THREAD} -b 0.0.0.0:${GAME_PORT} game.wsgi
\ No newline at end of file
+python manage.py clear_temp_matches
+if [ "${GAME_SERVER_MODE}" = "asgi" ]; then
+    uvicorn --workers ${WEBSOCKET_WORKER} --host 0.0.0.0 --port ${GAME_PORT} game.asgi:application
+else
+    gunicorn -w ${WEBSOCKET_WORKER} --threads ${WEBSOCKET_THREAD} -b 0.0.0.0:${GAME_PORT} game.wsgi
+fi
\ No newline at end of file
@@ -14,6 +14,17 @@ def get_os_int(key: str) -> int:
     return int(get_os_str(key))
 
 
+def get_os_str_or(key: str, default: str) -> str:
+    val: str | None = os.getenv(key)
+    if val is None or val == "":
+        return default
+    return val
+
+
+def get_os_int_or(key: str, default: int) -> int:
+    return int(get_os_str_or(key, str(default)))
+
+
 TWOFA_URL = get_os_str("TWOFA_URL")
 AI_USERID = get_os_str("AI_USERID")
 
@@ -24,3 +35,9 @@ JWT_SECRET = get_os_str("JWT_SECRET")
 JWT_ALGORITHM = get_os_str("JWT_ALGORITHM")
 
 FRONTEND_URL = get_os_str("FRONTEND_URL")
+
+# Inter-service HTTP client, see requests.py
+HTTP_CONNECT_TIMEOUT_SECONDS = get_os_int_or("HTTP_CONNECT_TIMEOUT_SECONDS", 3)
+HTTP_READ_TIMEOUT_SECONDS = get_os_int_or("HTTP_READ_TIMEOUT_SECONDS", 10)
+HTTP_RETRIES = get_os_int_or("HTTP_RETRIES", 2)
+HTTP_POOL_SIZE = get_os_int_or("HTTP_POOL_SIZE", 20)
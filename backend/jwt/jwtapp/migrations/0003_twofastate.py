@@ -0,0 +1,31 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("jwtapp", "0002_rename_user_id_userstatus_user"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TwoFAState",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        serialize=False,
+                        to="jwtapp.user",
+                    ),
+                ),
+                ("twofa_passed", models.BooleanField()),
+                ("twofa_stored", models.BooleanField()),
+            ],
+            options={
+                "db_table": "userinfo",
+                "managed": False,
+            },
+        ),
+    ]
@@ -20,3 +20,33 @@ class UserStatus(models.Model):
 
     class Meta:
         db_table = "user_status"
+
+
+class TwoFAState(models.Model):
+    """
+    2FA state written by the twofa service, read here without a request.
+    The twofa service owns the table and stays its only writer.
+    """
+
+    user = models.OneToOneField(User, on_delete=models.DO_NOTHING, primary_key=True)
+    twofa_passed = models.BooleanField()
+    twofa_stored = models.BooleanField()
+
+    class Meta:
+        db_table = "userinfo"
+        managed = False
+
+
+class UserStatusChange(models.Model):
+    """
+    Users whose token secret or 2FA state changed, in order. The verifiers of
+    the other services poll it (`POST /jwt/changes`) to drop them from their
+    view. Rows are kept for `CHANGE_RETENTION`, the newest one always.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    user_id = models.BigIntegerField()
+    changed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = "user_status_change"
@@ -0,0 +1,86 @@
+"""
+Results of `check_jwt`, so that checking the same access token again touches
+neither the database nor the twofa service.
+
+An entry is kept until the expiry of its token, and dropped as soon as the
+secret or the 2FA state of its user changes (`invalidate`). Only successful
+checks are stored: a refused token is checked again, so passing 2FA or logging
+in again is seen at once.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Set, Tuple
+
+MAXSIZE = 10000
+
+
+class TokenCache:
+    def __init__(self, maxsize: int = MAXSIZE):
+        self.maxsize = maxsize
+
+        # token -> (exp, user_id, twofa_passed)
+        self.entries: OrderedDict[str, Tuple[float, int, bool]] = OrderedDict()
+        self.tokens_of_user: Dict[int, Set[str]] = {}
+        # Bumped by every invalidation. A check started before an invalidation
+        # may have read the old secret, so its result is not stored.
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get_generation(self) -> int:
+        with self.lock:
+            return self.generation
+
+    def get(self, token: str, skip_2fa: bool) -> int | None:
+        """
+        Returns the user id of a token that passed the check, or None.
+        """
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is None:
+                return None
+            exp, user_id, twofa_passed = entry
+            if exp <= time.time():
+                self.__remove(token)
+                return None
+            if not skip_2fa and not twofa_passed:
+                return None
+            self.entries.move_to_end(token)
+            return user_id
+
+    def set(
+        self,
+        token: str,
+        exp: float,
+        user_id: int,
+        twofa_passed: bool,
+        generation: int,
+    ):
+        with self.lock:
+            if generation != self.generation:
+                return
+            old = self.entries.get(token)
+            if old is not None and old[2]:
+                twofa_passed = True
+            self.entries[token] = (exp, user_id, twofa_passed)
+            self.entries.move_to_end(token)
+            self.tokens_of_user.setdefault(user_id, set()).add(token)
+            while len(self.entries) > self.maxsize:
+                self.__remove(next(iter(self.entries)))
+
+    def invalidate(self, user_id: int):
+        with self.lock:
+            self.generation += 1
+            for token in self.tokens_of_user.pop(user_id, set()):
+                del self.entries[token]
+
+    def __remove(self, token: str):
+        _, user_id, _ = self.entries.pop(token)
+        tokens = self.tokens_of_user[user_id]
+        tokens.discard(token)
+        if not tokens:
+            del self.tokens_of_user[user_id]
+
+
+token_cache = TokenCache()
@@ -4,9 +4,12 @@ from . import views
 
 urlpatterns = [
     path("check", views.check_jwt_request),
+    path("check/batch", views.check_jwt_batch_request),
+    path("changes", views.post_changes),
     path("refresh", views.refresh_jwt),
     path("token", views.handle_token),
-    path("online", views.get_online),
+    path("token/batch", views.post_token_batch),
+    path("online", views.handle_online),
     path("token/ai", views.post_token_ai),
     path("check/ai", views.post_check_ai),
 ]
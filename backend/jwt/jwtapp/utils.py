@@ -2,9 +2,10 @@ import datetime
 import logging
 import random
 import string
-from typing import Any, Dict, Tuple, TypedDict
+from typing import Any, Dict, List, Tuple, TypedDict
 
 import jwt
+from django.db.models import Min, Q
 from django.http import QueryDict
 
 from exceptions.CustomException import (
@@ -13,6 +14,7 @@ from exceptions.CustomException import (
     JwtExpiredException,
     JwtInvalidException,
     TwoFARegisterException,
+    TwoFARequiredException,
 )
 from jwtapp.envs import (
     AI_USERID,
@@ -23,11 +25,18 @@ from jwtapp.envs import (
     JWT_SECRET,
     TWOFA_URL,
 )
-from jwtapp.models import UserStatus
-from jwtapp.requests import delete, get
+from jwtapp.models import TwoFAState, UserStatus, UserStatusChange
+from jwtapp.requests import post
+from jwtapp.token_cache import token_cache
 
 logger = logging.getLogger(__name__)
 
+# Longer than any gap between two polls of a verifier
+CHANGE_RETENTION = datetime.timedelta(hours=1)
+# Changes sent again on every poll, so a change committed after a change with
+# a higher id is not skipped. Longer than a transaction and a poll interval.
+CHANGE_LOOKBACK = datetime.timedelta(seconds=30)
+
 
 class JwtPayload(TypedDict):
     user_id: int
@@ -67,6 +76,29 @@ def get_int(dict: Dict[str, Any] | QueryDict, key: str) -> int:
     return ret
 
 
+def get_int_list(dict: Dict[str, Any] | QueryDict, key: str) -> List[int]:
+    val = _get_any(dict, key)
+
+    if type(val) != list:
+        raise BadRequestFieldException(key)
+
+    try:
+        ret = [int(v) for v in val]
+    except:
+        raise BadRequestFieldException(key)
+
+    return ret
+
+
+def get_str_list(dict: Dict[str, Any] | QueryDict, key: str) -> List[str]:
+    val = _get_any(dict, key)
+
+    if type(val) != list or any(type(v) != str for v in val):
+        raise BadRequestFieldException(key)
+
+    return val
+
+
 def get_bool(dict: Dict[str, Any] | QueryDict, key: str) -> bool:
     val = _get_any(dict, key)
 
@@ -177,11 +209,40 @@ def set_user_secret(
     if created:
         return created
 
-    res = delete(f"{TWOFA_URL}/twofa/check", params={"user_id": user_id})
-    if not res.ok and res.text == TwoFARegisterException().__str__():
-        created = True
+    return _reset_twofa(user_id)
+
+
+def _reset_twofa(user_id: int) -> bool:
+    """
+    Makes the user pass 2FA again. Returns True if 2FA is not registered yet.
+    """
+    return user_id in _reset_twofa_batch([user_id])
 
-    return created
+
+def _reset_twofa_batch(user_ids: List[int]) -> set[int]:
+    """
+    `_reset_twofa` of many users, with one `TwoFAState` query and at most one
+    request to the twofa service. Returns the users without 2FA registered.
+    """
+    twofa_states = TwoFAState.objects.in_bulk(user_ids)
+    unregistered: set[int] = set()
+    passed: List[int] = []
+    for user_id in user_ids:
+        twofa_error = _get_twofa_error(twofa_states.get(user_id))
+        if isinstance(twofa_error, TwoFARegisterException):
+            unregistered.add(user_id)
+        elif twofa_error is None:
+            passed.append(user_id)
+        # Otherwise not passed already, nothing to reset
+
+    if not passed:
+        return unregistered
+
+    res = post(f"{TWOFA_URL}/twofa/check/reset", json={"user_ids": passed})
+    if not res.ok:
+        logger.error(f"could not reset 2FA of {passed}, resp = {res.text}")
+        return unregistered
+    return unregistered | set(res.json()["unregistered"])
 
 
 def _get_user_status_or_none(user_id: int) -> UserStatus | None:
@@ -204,13 +265,79 @@ def make_token_pair(user_id: int, twofa_delete: bool) -> Tuple[str, str, bool]:
     else:
         _, isnew = set_user_secret_only(user_id, jwt_secret, refresh_secret, access_exp)
 
+    # The old access token is revoked, and its 2FA may have been reset
+    _revoke([user_id])
+
     access_token = _make_jwt(user_id, jwt_secret, access_exp)
     refresh_token = _make_jwt(user_id, refresh_secret, refresh_exp)
 
     return access_token, refresh_token, isnew
 
 
-def check_jwt(encoded_jwt: str, skip_2fa: bool) -> JwtPayload:
+def make_token_pairs(
+    user_ids: List[int], twofa_delete: bool
+) -> Dict[int, Tuple[str, str, bool]]:
+    """
+    `make_token_pair` of many users, with one query and one upsert, and one
+    2FA reset (`_reset_twofa_batch`) if `twofa_delete`.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    now_datetime = _now()
+    access_exp = now_datetime + datetime.timedelta(seconds=JWT_EXPIRE_SECONDS)
+    refresh_exp = now_datetime + datetime.timedelta(seconds=JWT_REFRESH_EXPIRE_SECONDS)
+
+    existing = set(
+        UserStatus.objects.filter(user_id__in=user_ids).values_list(
+            "user_id", flat=True
+        )
+    )
+    secrets = {
+        user_id: (generate_secret(), generate_secret()) for user_id in user_ids
+    }
+    UserStatus.objects.bulk_create(
+        [
+            UserStatus(
+                user_id=user_id,
+                jwt_secret=jwt_secret,
+                refresh_secret=refresh_secret,
+                expired_at=access_exp,
+            )
+            for user_id, (jwt_secret, refresh_secret) in secrets.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=["jwt_secret", "refresh_secret", "expired_at"],
+    )
+
+    unregistered = (
+        _reset_twofa_batch([user_id for user_id in user_ids if user_id in existing])
+        if twofa_delete
+        else set()
+    )
+
+    ret: Dict[int, Tuple[str, str, bool]] = {}
+    for user_id, (jwt_secret, refresh_secret) in secrets.items():
+        isnew = user_id not in existing or user_id in unregistered
+
+        ret[user_id] = (
+            _make_jwt(user_id, jwt_secret, access_exp),
+            _make_jwt(user_id, refresh_secret, refresh_exp),
+            isnew,
+        )
+    _revoke(list(secrets))
+    return ret
+
+
+def check_jwt(encoded_jwt: str, skip_2fa: bool) -> int:
+    """
+    Returns the user id of the access token. Successful checks are cached
+    until the token expires, see `jwtapp.token_cache`.
+    """
+    user_id = token_cache.get(encoded_jwt, skip_2fa)
+    if user_id is not None:
+        return user_id
+
+    generation = token_cache.get_generation()
     payload_dict = _decode_payload(encoded_jwt)
     payload = _dict_to_payload(payload_dict)
 
@@ -223,15 +350,91 @@ def check_jwt(encoded_jwt: str, skip_2fa: bool) -> JwtPayload:
 
     if skip_2fa:
         logger.info("skip_2fa is True, returning payload")
-        return payload
+        token_cache.set(
+            encoded_jwt, payload_dict["exp"], payload["user_id"], False, generation
+        )
+        return payload["user_id"]
 
     logger.info("skip 2fa is False, twofa check")
-    # Safety: JWT signature has verified, so we know this is safe to GET
-    resp = get(f"{TWOFA_URL}/twofa/check", params={"user_id": payload["user_id"]})
-    if not resp.ok:
-        raise CustomException(resp.text, resp.status_code)
+    twofa_error = _get_twofa_error(_get_twofa_state_or_none(payload["user_id"]))
+    if twofa_error is not None:
+        raise twofa_error
 
-    return payload
+    token_cache.set(
+        encoded_jwt, payload_dict["exp"], payload["user_id"], True, generation
+    )
+    return payload["user_id"]
+
+
+def _get_twofa_state_or_none(user_id: int) -> TwoFAState | None:
+    try:
+        twofa_state = TwoFAState.objects.get(user_id=user_id)
+    except TwoFAState.DoesNotExist:
+        twofa_state = None
+    return twofa_state
+
+
+def _get_twofa_error(twofa_state: TwoFAState | None) -> CustomException | None:
+    """
+    The error GET /twofa/check gives for this state, or None if 2FA passed.
+    """
+    if twofa_state is None or not twofa_state.twofa_stored:
+        return TwoFARegisterException()
+    if not twofa_state.twofa_passed:
+        return TwoFARequiredException()
+    return None
+
+
+def check_jwt_batch(
+    encoded_jwts: List[str], skip_2fa: bool
+) -> List[int | CustomException]:
+    """
+    `check_jwt` of many tokens, with one `UserStatus` query and one
+    `TwoFAState` query. Each token gets
+    its user id or the exception `check_jwt` would raise, in the same order.
+    """
+    results: List[int | CustomException | None] = [
+        token_cache.get(encoded_jwt, skip_2fa) for encoded_jwt in encoded_jwts
+    ]
+
+    generation = token_cache.get_generation()
+    payloads: Dict[int, Tuple[JwtPayload, Any]] = {}
+    for i, encoded_jwt in enumerate(encoded_jwts):
+        if results[i] is not None:
+            continue
+        try:
+            payload_dict = _decode_payload(encoded_jwt)
+            payloads[i] = (_dict_to_payload(payload_dict), payload_dict["exp"])
+        except CustomException as e:
+            results[i] = e
+
+    user_statuses = UserStatus.objects.in_bulk(
+        [payload["user_id"] for payload, _ in payloads.values()]
+    )
+    twofa_states = (
+        {}
+        if skip_2fa
+        else TwoFAState.objects.in_bulk(
+            [payload["user_id"] for payload, _ in payloads.values()]
+        )
+    )
+    for i, (payload, exp) in payloads.items():
+        user_id = payload["user_id"]
+        user_status = user_statuses.get(user_id)
+        if user_status is None or user_status.jwt_secret != payload["user_secret"]:
+            results[i] = JwtInvalidException()
+            continue
+
+        if not skip_2fa:
+            twofa_error = _get_twofa_error(twofa_states.get(user_id))
+            if twofa_error is not None:
+                results[i] = twofa_error
+                continue
+
+        token_cache.set(encoded_jwts[i], exp, user_id, not skip_2fa, generation)
+        results[i] = user_id
+
+    return results  # type: ignore
 
 
 def check_refresh_token(encoded_jwt: str) -> JwtPayload:
@@ -256,6 +459,15 @@ def is_user_online(user_id: int) -> bool:
     return _now() < user_status.expired_at
 
 
+def get_online_users(user_ids: List[int]) -> Dict[int, bool]:
+    online = set(
+        UserStatus.objects.filter(
+            user_id__in=user_ids, expired_at__gt=_now()
+        ).values_list("user_id", flat=True)
+    )
+    return {user_id: user_id in online for user_id in user_ids}
+
+
 def delete_token_secret(user_id: int):
     user_status = _get_user_status_or_none(user_id)
     if user_status is None:
@@ -264,6 +476,57 @@ def delete_token_secret(user_id: int):
     user_status.refresh_secret = ""
     user_status.expired_at = _now() - datetime.timedelta(seconds=1)
     user_status.save()
+    _revoke([user_id])
+
+
+def _revoke(user_ids: List[int]):
+    """
+    The secret or the 2FA state of the users changed: drop their checks from
+    `token_cache`, and log the change for the verifiers of the other services.
+    """
+    if not user_ids:
+        return
+    changes = UserStatusChange.objects.bulk_create(
+        [UserStatusChange(user_id=user_id) for user_id in user_ids]
+    )
+    UserStatusChange.objects.filter(
+        changed_at__lt=_now() - CHANGE_RETENTION,
+        id__lt=min(change.id for change in changes),
+    ).delete()
+    for user_id in user_ids:
+        token_cache.invalidate(user_id)
+
+
+def get_changes(since: int | None) -> Tuple[int, List[Tuple[int, int]], bool]:
+    """
+    The changes `(id, user_id)` after the change `since`, and the id of the
+    last one. The changes of the last `CHANGE_LOOKBACK` are always included:
+    ids are taken on insert but rows appear on commit, so one of them may show
+    up after the caller moved past its id. The caller skips those it applied.
+    `reset` is True when the caller may have missed changes (first call, or
+    `since` is older than `CHANGE_RETENTION`) and must drop its whole view.
+    """
+    recent = Q(changed_at__gte=_now() - CHANGE_LOOKBACK)
+    if since is None:
+        last = UserStatusChange.objects.order_by("-id").values_list("id", flat=True)
+        # Listed so that the caller does not apply them again on the next poll
+        changes = list(
+            UserStatusChange.objects.filter(recent)
+            .order_by("id")
+            .values_list("id", "user_id")
+        )
+        return last.first() or 0, changes, True
+
+    changes = list(
+        UserStatusChange.objects.filter(Q(id__gt=since) | recent)
+        .order_by("id")
+        .values_list("id", "user_id")
+    )
+    oldest = UserStatusChange.objects.aggregate(oldest=Min("id"))["oldest"]
+    reset = oldest is not None and oldest > since + 1
+
+    cursor = max([since] + [change_id for change_id, _ in changes])
+    return cursor, changes, reset
 
 
 def get_ai_token(match_id: int) -> str:
@@ -3,18 +3,25 @@ from typing import Any, Dict
 from django.http import HttpRequest, HttpResponseNotAllowed, JsonResponse
 from rest_framework.request import Request
 
+from exceptions.CustomException import CustomException
 from jwtapp.decorators import api_delete, api_get, api_post
 from jwtapp.utils import (
     check_ai_token,
     check_jwt,
+    check_jwt_batch,
     check_refresh_token,
     delete_token_secret,
     get_ai_token,
     get_bool,
+    get_changes,
     get_int,
+    get_int_list,
+    get_online_users,
     get_str,
+    get_str_list,
     is_user_online,
     make_token_pair,
+    make_token_pairs,
 )
 
 
@@ -26,8 +33,30 @@ def check_jwt_request(req: Request, data: Dict[str, Any]):
     jwt: str = get_str(data, "jwt")
     skip_2fa: bool = get_bool(data, "skip_2fa")
 
-    payload = check_jwt(jwt, skip_2fa)
-    return JsonResponse({"user_id": payload["user_id"]})
+    user_id = check_jwt(jwt, skip_2fa)
+    return JsonResponse({"user_id": user_id})
+
+
+@api_post
+def check_jwt_batch_request(req: Request, data: Dict[str, Any]):
+    jwts = get_str_list(data, "jwts")
+    skip_2fa: bool = get_bool(data, "skip_2fa")
+
+    results = []
+    for result in check_jwt_batch(jwts, skip_2fa):
+        if isinstance(result, CustomException):
+            results.append({"error": str(result), "status": result.status_code})
+        else:
+            results.append({"user_id": result})
+    return JsonResponse({"results": results})
+
+
+@api_post
+def post_changes(req: Request, data: Dict[str, Any]):
+    since = get_int(data, "since") if data.get("since") is not None else None
+
+    cursor, changes, reset = get_changes(since)
+    return JsonResponse({"cursor": cursor, "changes": changes, "reset": reset})
 
 
 @api_post
@@ -63,6 +92,26 @@ def delete_token(req: Request):
     return JsonResponse({})
 
 
+@api_post
+def post_token_batch(req: Request, data: Dict[str, Any]):
+    user_ids = get_int_list(data, "user_ids")
+    twofa_delete = get_bool(data, "twofa_delete")
+
+    tokens = make_token_pairs(user_ids, twofa_delete=twofa_delete)
+    return JsonResponse(
+        {
+            "tokens": {
+                str(user_id): {
+                    "access_token": access_token,
+                    "refresh_token": refresh_token,
+                    "isnew": isnew,
+                }
+                for user_id, (access_token, refresh_token, isnew) in tokens.items()
+            }
+        }
+    )
+
+
 def handle_token(req: HttpRequest):
     if req.method == "POST":
         return post_token(req)
@@ -79,6 +128,23 @@ def get_online(req: Request):
     return JsonResponse({"isonline": is_user_online(user_id)})
 
 
+@api_post
+def post_online(req: Request, data: Dict[str, Any]):
+    user_ids = get_int_list(data, "user_ids")
+
+    online = get_online_users(user_ids)
+    return JsonResponse({"isonline": {str(k): v for k, v in online.items()}})
+
+
+def handle_online(req: HttpRequest):
+    if req.method == "GET":
+        return get_online(req)
+    elif req.method == "POST":
+        return post_online(req)
+    else:
+        return HttpResponseNotAllowed(["GET", "POST"])
+
+
 @api_post
 def post_token_ai(req: Request, data: dict[str, Any]):
     match_id = get_int(data, "match_id")
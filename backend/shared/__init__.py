@@ -0,0 +1,5 @@
+"""
+Modules shared by several services. The directory is mounted read-only into
+each of them at `/opt/shared`, with `PYTHONPATH=/opt` (see
+`docker-compose.yml`), and imported as `shared.<module>`.
+"""
@@ -0,0 +1,215 @@
+"""
+Verification of the access tokens of the JWT service, in process.
+
+The signature and the expiry are checked locally with `JWT_SECRET`, so a
+forged or expired token never leaves the service. Whether a valid token was
+revoked (logout, newer login) and its 2FA state are only known by the JWT
+service. The verifier keeps a view of the current secret of the users it has
+seen, learned from `POST /jwt/check`: a token whose `user_secret` matches the
+view is accepted without any request, however long ago the user was checked.
+
+The view is kept current by polling `POST /jwt/changes` every
+`refresh_seconds` in the background. It lists the users whose secret or 2FA
+state changed, and they are dropped from the view, so a revoked token is
+refused at most `refresh_seconds` later. The recent changes are listed again
+on every poll, in case one was committed late, and the ids already applied
+are skipped. When the JWT service cannot be polled, the view is not trusted
+after `STALE_REFRESHES` missed polls, and an entry is never trusted for more
+than `max_age` seconds, whatever the polls said.
+
+This package is mounted into every service that authenticates users (see
+`docker-compose.yml`), so there is a single copy of it.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Tuple
+
+import jwt
+
+JWT_INVALID = "jwt.invalid"
+JWT_EXPIRED = "jwt.expired"
+UNAUTHORIZED = 401
+
+STALE_REFRESHES = 3
+MAX_AGE_SECONDS = 60.0
+
+
+class JwtCheckError(Exception):
+    """
+    The token was refused. `content` and `status_code` are the response
+    the JWT service gives (or would give) for it.
+    """
+
+    def __init__(self, content: str, status_code: int):
+        super().__init__(content)
+        self.content = content
+        self.status_code = status_code
+
+
+class JwtVerifier:
+    logger = logging.getLogger(__name__)
+
+    def __init__(
+        self,
+        secret: str,
+        algorithm: str,
+        jwt_url: str,
+        post: Callable[..., Any],
+        refresh_seconds: float,
+        maxsize: int = 10000,
+        max_age: float = MAX_AGE_SECONDS,
+    ):
+        self.secret = secret
+        self.algorithm = algorithm
+        self.check_url = f"{jwt_url}/jwt/check"
+        self.changes_url = f"{jwt_url}/jwt/changes"
+        self.post = post
+        self.refresh_seconds = refresh_seconds
+        self.maxsize = maxsize
+        self.max_age = max_age
+
+        # user_id -> (current user_secret, passed 2FA, time it was checked)
+        self.users: OrderedDict[int, Tuple[str, bool, float]] = OrderedDict()
+        # Highest id of the changes applied, None before the first poll
+        self.cursor: int | None = None
+        # Ids of the changes of the last poll, which may be listed again
+        self.applied: set[int] = set()
+        self.refreshed_at = 0.0
+        # Bumped by every applied change. A check started before a change may
+        # have been answered with the old state, so its result is not stored.
+        self.generation = 0
+        self.started = False
+        self.lock = threading.Lock()
+
+    def decode(self, token: str) -> dict[str, Any]:
+        try:
+            payload = jwt.decode(
+                token,
+                key=self.secret,
+                algorithms=[self.algorithm],
+                options={"require": ["exp"], "verify_exp": True},
+            )
+        except jwt.exceptions.ExpiredSignatureError:
+            raise JwtCheckError(JWT_EXPIRED, UNAUTHORIZED)
+        except jwt.exceptions.PyJWTError:
+            raise JwtCheckError(JWT_INVALID, UNAUTHORIZED)
+
+        if "user_id" not in payload or "user_secret" not in payload:
+            raise JwtCheckError(JWT_INVALID, UNAUTHORIZED)
+        return payload
+
+    def __is_known(self, payload: dict[str, Any], skip_2fa: bool) -> bool:
+        with self.lock:
+            stale_after = STALE_REFRESHES * self.refresh_seconds
+            if self.cursor is None:
+                return False
+            if time.monotonic() - self.refreshed_at > stale_after:
+                return False
+
+            entry = self.users.get(payload["user_id"])
+            if entry is None:
+                return False
+            user_secret, twofa_passed, checked_at = entry
+            if user_secret != payload["user_secret"]:
+                return False
+            if time.monotonic() - checked_at > self.max_age:
+                return False
+            if not skip_2fa and not twofa_passed:
+                return False
+            self.users.move_to_end(payload["user_id"])
+            return True
+
+    def __remember(
+        self, user_id: int, user_secret: str, twofa_passed: bool, generation: int
+    ):
+        with self.lock:
+            if generation != self.generation:
+                return
+            # A check without 2FA does not forget that the same secret passed it
+            entry = self.users.get(user_id)
+            if entry is not None and entry[:2] == (user_secret, True):
+                twofa_passed = True
+            self.users[user_id] = (user_secret, twofa_passed, time.monotonic())
+            self.users.move_to_end(user_id)
+            while len(self.users) > self.maxsize:
+                self.users.popitem(last=False)
+
+    def invalidate(self, user_id: int | None = None):
+        with self.lock:
+            self.generation += 1
+            if user_id is None:
+                self.users.clear()
+            else:
+                self.users.pop(user_id, None)
+
+    def refresh(self):
+        """
+        Drop the users changed in the JWT service since the last refresh.
+        """
+        try:
+            res = self.post(self.changes_url, json={"since": self.cursor})
+        except Exception as e:
+            self.logger.error(f"could not poll the changes of the JWT service, e={e}")
+            return
+        if not res.ok:
+            self.logger.error(f"could not poll the changes, resp = {res.text}")
+            return
+
+        body = res.json()
+        with self.lock:
+            changed = body["reset"]
+            if body["reset"]:
+                self.users.clear()
+            for change_id, user_id in body["changes"]:
+                if change_id in self.applied:
+                    continue
+                self.users.pop(user_id, None)
+                changed = True
+            if changed:
+                self.generation += 1
+            self.applied = {change_id for change_id, _ in body["changes"]}
+            self.cursor = body["cursor"]
+            self.refreshed_at = time.monotonic()
+
+    def __refresh_forever(self):
+        while True:
+            time.sleep(self.refresh_seconds)
+            self.refresh()
+
+    def start(self):
+        """
+        Called by the first `verify`, so every forked worker polls on its own.
+        The first poll runs inline, so the view is usable at once.
+        """
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        self.refresh()
+        threading.Thread(target=self.__refresh_forever, daemon=True).start()
+
+    def verify(self, token: str, skip_2fa: bool) -> int:
+        """
+        Returns the user id of the access token, or raises `JwtCheckError`.
+        """
+        payload = self.decode(token)
+        self.start()
+        if self.__is_known(payload, skip_2fa):
+            return payload["user_id"]
+
+        with self.lock:
+            generation = self.generation
+        res = self.post(self.check_url, json={"jwt": token, "skip_2fa": skip_2fa})
+        if not res.ok:
+            raise JwtCheckError(res.text, res.status_code)
+
+        user_id = int(res.json()["user_id"])
+        if user_id != payload["user_id"]:
+            self.logger.error(f"user_id mismatch, {user_id} != {payload['user_id']}")
+            raise JwtCheckError(JWT_INVALID, UNAUTHORIZED)
+
+        self.__remember(user_id, payload["user_secret"], not skip_2fa, generation)
+        return user_id
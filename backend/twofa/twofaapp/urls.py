@@ -6,4 +6,5 @@ urlpatterns = [
     path("info", views.handle_info),
     path("code", views.post_code),
     path("check", views.handle_check),
+    path("check/reset", views.post_check_reset),
 ]
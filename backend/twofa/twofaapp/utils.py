@@ -1,4 +1,4 @@
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 from django.db import IntegrityError
 from django.http import QueryDict
@@ -35,6 +35,20 @@ def get_int(dict: Dict[str, Any] | QueryDict, key: str):
     return ret
 
 
+def get_int_list(dict: Dict[str, Any] | QueryDict, key: str) -> List[int]:
+    val = _get_any(dict, key)
+
+    if type(val) != list:
+        raise BadRequestFieldException(key)
+
+    try:
+        ret = [int(v) for v in val]
+    except:
+        raise BadRequestFieldException(key)
+
+    return ret
+
+
 def set_totp_secret(user_id: int, totp_secret: str, totp_name: str):
     try:
         user_obj, created = UserInfo.objects.update_or_create(
@@ -12,7 +12,14 @@ from exceptions.CustomException import (
 )
 from twofaapp.decorators import api_delete, api_get, api_post
 from twofaapp.envs import OTP_ISSUER
-from twofaapp.utils import get_int, get_str, get_userinfo_or_none, set_totp_secret
+from twofaapp.models import UserInfo
+from twofaapp.utils import (
+    get_int,
+    get_int_list,
+    get_str,
+    get_userinfo_or_none,
+    set_totp_secret,
+)
 
 # Create your views here.
 
@@ -114,3 +121,19 @@ def handle_check(req: HttpRequest):
         return delete_check(req)
     else:
         return HttpResponseNotAllowed(["GET", "DELETE"])
+
+
+@api_post
+def post_check_reset(req: Request, data: Dict[str, Any]):
+    user_ids = get_int_list(data, "user_ids")
+
+    registered = list(
+        UserInfo.objects.filter(user_id__in=user_ids, twofa_stored=True).values_list(
+            "user_id", flat=True
+        )
+    )
+    UserInfo.objects.filter(user_id__in=registered).update(twofa_passed=False)
+    logger.info(f"user_ids={registered} twofa_passed set to false")
+
+    unregistered = set(user_ids) - set(registered)
+    return JsonResponse({"unregistered": sorted(unregistered)})
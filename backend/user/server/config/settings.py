@@ -85,6 +85,15 @@ DATABASES = {
     }
 }
 
+# 대시보드 공유 캐시 (DASHBOARD_CACHE=shared), 없으면 Django 기본값 (프로세스 메모리)
+if os.environ.get("DASHBOARD_CACHE_URL"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ["DASHBOARD_CACHE_URL"],
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -23,5 +23,6 @@ urlpatterns = [
     path('user/', include('user.urls')),
     path('_internal/user', views.InternalUserView.as_view()),
     path('_internal/dashboard', views.InternalDashboardView.as_view()),
+    path('_internal/dashboard/batch', views.InternalDashboardBatchView.as_view()),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
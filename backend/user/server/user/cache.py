@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+from user.envs import DASHBOARD_CACHE, DASHBOARD_CACHE_TTL
+
+
+class LocalCache:
+    """
+    프로세스 내부 LRU 캐시 (TTL 포함)
+    get_or_compute 는 같은 key 를 동시에 계산하지 않음: 먼저 온 요청이 계산하고
+    나머지는 그 결과를 기다림
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float = 5.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expire_at, value)
+        self.lock = threading.Lock()
+        self.key_locks = {}
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expire_at, value = entry
+            if expire_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def get_or_compute(self, key: str, compute):
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # 기다리는 동안 다른 요청이 계산했을 수 있음
+            value = self.get(key)
+            if value is None:
+                value = compute()
+                self.set(key, value)
+        return value
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SharedCache(LocalCache):
+    """
+    Django cache (settings.CACHES, 예: Redis) 를 사용하는 캐시
+    여러 프로세스가 같은 결과를 공유하고, 무효화도 모든 프로세스에 적용됨
+    """
+
+    # 무효화는 key 에 붙는 세대 번호를 올려서 처리
+    GENERATION_KEY = "dashboard:generation"
+
+    def __init__(self, ttl: float = 5.0, alias: str = "default"):
+        super().__init__(ttl=ttl)
+        self.cache = caches[alias]
+
+    def __versioned(self, key: str) -> str:
+        generation = self.cache.get_or_set(self.GENERATION_KEY, 0, timeout=None)
+        return f"{key}:{generation}"
+
+    def get(self, key: str):
+        return self.cache.get(self.__versioned(key))
+
+    def set(self, key: str, value):
+        self.cache.set(self.__versioned(key), value, timeout=self.ttl)
+
+    def invalidate(self):
+        try:
+            self.cache.incr(self.GENERATION_KEY)
+        except ValueError:
+            self.cache.set(self.GENERATION_KEY, 1, timeout=None)
+
+
+def make_dashboard_cache():
+    if DASHBOARD_CACHE == "shared":
+        return SharedCache(ttl=DASHBOARD_CACHE_TTL)
+    return LocalCache(ttl=DASHBOARD_CACHE_TTL)
+
+
+# 대시보드의 전체 유저 공통 부분 (리더보드, 최근 경기, 평균 시간)
+dashboard_cache = make_dashboard_cache()
@@ -7,4 +7,23 @@ def get_os_str(key):
         raise KeyError(f"Environment variable '{key}' is missing")
     return value
 
-JWT_URL = get_os_str("JWT_URL")
\ No newline at end of file
+def get_os_str_or(key, default):
+    value = os.getenv(key)
+    if value is None or value == "":
+        return default
+    return value
+
+JWT_URL = get_os_str("JWT_URL")
+JWT_SECRET = get_os_str("JWT_SECRET")
+JWT_ALGORITHM = get_os_str("JWT_ALGORITHM")
+# JWT 서버의 변경 사항 (로그아웃, 재로그인, 2FA 초기화) 을 가져오는 주기 (초), shared/jwt_verify.py 참고
+JWT_CHANGES_POLL_SECONDS = float(get_os_str_or("JWT_CHANGES_POLL_SECONDS", "5"))
+
+# local: 프로세스별 LRU, shared: settings.CACHES (DASHBOARD_CACHE_URL 의 Redis)
+DASHBOARD_CACHE = get_os_str_or("DASHBOARD_CACHE", "local")
+DASHBOARD_CACHE_TTL = float(get_os_str_or("DASHBOARD_CACHE_TTL", "5"))
+# 다른 서비스로의 HTTP 요청 설정, user/requests.py 참고
+HTTP_CONNECT_TIMEOUT_SECONDS = float(get_os_str_or("HTTP_CONNECT_TIMEOUT_SECONDS", "3"))
+HTTP_READ_TIMEOUT_SECONDS = float(get_os_str_or("HTTP_READ_TIMEOUT_SECONDS", "10"))
+HTTP_RETRIES = int(get_os_str_or("HTTP_RETRIES", "2"))
+HTTP_POOL_SIZE = int(get_os_str_or("HTTP_POOL_SIZE", "20"))
@@ -0,0 +1,163 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.utils.dateparse import parse_datetime
+
+from user.cache import dashboard_cache
+from user.models import Profile, MatchHistory, UserStats, WinRateTrend, GlobalStats
+
+
+MATCH_FIELDS = ["player1_id", "player2_id", "player1_score", "player2_score", "winner_id", "match_date", "play_time"]
+
+
+def parse_match(data: dict) -> dict:
+    """
+    게임 서버가 보낸 경기 결과를 검증하고 변환
+    잘못된 값이면 ValueError
+    """
+    if any(data.get(field) is None for field in MATCH_FIELDS):
+        raise ValueError("All fields are required.")
+
+    match = {
+        "match_id": int(data["match_id"]) if data.get("match_id") is not None else None,
+        "player1_id": int(data["player1_id"]),
+        "player2_id": int(data["player2_id"]),
+        "player1_score": int(data["player1_score"]),
+        "player2_score": int(data["player2_score"]),
+        "winner_id": int(data["winner_id"]),
+        "match_date": parse_datetime(data["match_date"]),
+        "play_time": int(data["play_time"]),
+    }
+    if match["match_date"] is None:
+        raise ValueError("match_date is not a valid datetime.")
+    if match["winner_id"] not in (match["player1_id"], match["player2_id"]):
+        raise ValueError("winner_id must be one of the players.")
+    return match
+
+
+def _increment(model, key: str, deltas: dict, fields: tuple):
+    """
+    같은 증가량을 가진 유저들을 묶어서 F() 로 한 번에 증가
+    deltas: user_id -> 증가량 tuple, fields: tuple 순서대로의 컬럼 이름
+    """
+    users_by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        users_by_delta[delta].append(user_id)
+
+    for delta, user_ids in users_by_delta.items():
+        model.objects.filter(**{f"{key}__in": user_ids}).update(**{
+            field: F(field) + value for field, value in zip(fields, delta) if value
+        })
+
+
+def record_matches(matches: list) -> dict:
+    """
+    경기 결과들을 한 트랜잭션에서 저장하고, 대시보드 집계를 갱신
+    (Profile/UserStats 카운트, WinRateTrend, GlobalStats)
+
+    - match_id 가 이미 저장된 경기는 건너뜀 (게임 서버의 재전송)
+    - 존재하지 않는 유저가 있는 경기는 저장하지 않음
+    """
+    result = {"recorded": [], "duplicated": [], "rejected": []}
+
+    with transaction.atomic():
+        match_ids = [m["match_id"] for m in matches if m["match_id"] is not None]
+        seen = set(
+            MatchHistory.objects.filter(match_id__in=match_ids).values_list("match_id", flat=True)
+        )
+        user_ids = {m[key] for m in matches for key in ("player1_id", "player2_id")}
+        existing_users = set(
+            Profile.objects.filter(user_id__in=user_ids).values_list("user_id", flat=True)
+        )
+
+        accepted = []
+        for match in matches:
+            if match["match_id"] is not None and match["match_id"] in seen:
+                result["duplicated"].append(match["match_id"])
+                continue
+            if match["player1_id"] not in existing_users or match["player2_id"] not in existing_users:
+                result["rejected"].append(match["match_id"])
+                continue
+            if match["match_id"] is not None:
+                seen.add(match["match_id"])
+            accepted.append(match)
+            result["recorded"].append(match["match_id"])
+
+        if not accepted:
+            return result
+
+        # 승률 추세는 경기 순서대로 누적
+        accepted.sort(key=lambda m: m["match_date"])
+        players = {m[key] for m in accepted for key in ("player1_id", "player2_id")}
+
+        # 동시에 들어온 다른 배치와 game_number 가 겹치지 않도록 잠금
+        UserStats.objects.bulk_create(
+            [UserStats(user_id=user_id) for user_id in players], ignore_conflicts=True
+        )
+        # user_id -> [games, wins] (이 배치 이전의 값)
+        totals = {
+            user_id: [games, wins]
+            for user_id, games, wins in UserStats.objects.select_for_update()
+            .filter(user_id__in=players)
+            .order_by("user_id")
+            .values_list("user_id", "total_games", "win_cnt")
+        }
+
+        histories = []
+        trends = []
+        # user_id -> [games, wins, losses, play_time]
+        deltas = defaultdict(lambda: [0, 0, 0, 0])
+        for match in accepted:
+            histories.append(MatchHistory(
+                match_id=match["match_id"],
+                player1_id_id=match["player1_id"],
+                player2_id_id=match["player2_id"],
+                player1_score=match["player1_score"],
+                player2_score=match["player2_score"],
+                winner_id_id=match["winner_id"],
+                match_date=match["match_date"],
+                play_time=match["play_time"],
+            ))
+
+            for user_id in (match["player1_id"], match["player2_id"]):
+                won = user_id == match["winner_id"]
+                delta = deltas[user_id]
+                delta[0] += 1
+                if won:
+                    delta[1] += 1
+                else:
+                    delta[2] += 1
+                delta[3] += match["play_time"]
+
+                total = totals[user_id]
+                total[0] += 1
+                total[1] += int(won)
+                trends.append(WinRateTrend(
+                    user_id=user_id,
+                    game_number=total[0],
+                    win_rate=round(total[1] / total[0], 2),
+                ))
+
+        MatchHistory.objects.bulk_create(histories)
+        WinRateTrend.objects.bulk_create(trends, ignore_conflicts=True)
+
+        _increment(
+            Profile, "user_id",
+            {user_id: tuple(delta[:3]) for user_id, delta in deltas.items()},
+            ("total_cnt", "win_cnt", "lose_cnt"),
+        )
+        _increment(
+            UserStats, "user_id",
+            {user_id: tuple(delta) for user_id, delta in deltas.items()},
+            ("total_games", "win_cnt", "lose_cnt", "total_play_time"),
+        )
+
+        GlobalStats.objects.bulk_create([GlobalStats(id=GlobalStats.SINGLETON_ID)], ignore_conflicts=True)
+        GlobalStats.objects.filter(id=GlobalStats.SINGLETON_ID).update(
+            total_games=F("total_games") + len(histories),
+            total_play_time=F("total_play_time") + sum(h.play_time for h in histories),
+        )
+        transaction.on_commit(dashboard_cache.invalidate)
+
+    return result
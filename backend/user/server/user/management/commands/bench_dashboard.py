@@ -0,0 +1,123 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.test.utils import CaptureQueriesContext
+
+from user.cache import dashboard_cache
+from user.models import Profile
+from user.views import DashboardView
+
+
+class Command(BaseCommand):
+    help = (
+        "대시보드 쿼리를 가짜 경기 기록 (기본 100만 경기) 위에서 EXPLAIN ANALYZE 로 측정. "
+        "모든 데이터는 롤백되므로 운영 DB 에서도 사용 가능"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--matches", type=int, default=1_000_000)
+        parser.add_argument("--users", type=int, default=1_000)
+        parser.add_argument("--runs", type=int, default=20)
+
+    def handle(self, *args, **options):
+        matches: int = options["matches"]
+        users: int = options["users"]
+        runs: int = options["runs"]
+
+        with transaction.atomic():
+            base = (Profile.objects.aggregate(max_id=Max("user_id"))["max_id"] or 0) + 1
+
+            start = time.perf_counter()
+            self.populate(base, users, matches)
+            self.stdout.write(
+                f"{matches} matches of {users} users generated in {time.perf_counter() - start:.1f}s"
+            )
+
+            view = DashboardView()
+            elapsed = []
+            for _ in range(runs):
+                dashboard_cache.invalidate()
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    view._get_dashboard(base)
+                    elapsed.append((time.perf_counter() - start) * 1000)
+
+            self.stdout.write(f"{'exec ms':>8}  {'seq scan':<24} query")
+            for query in ctx.captured_queries:
+                self.explain(query["sql"])
+
+            elapsed.sort()
+            self.stdout.write(
+                f"dashboard: {len(ctx.captured_queries)} queries, "
+                f"mean {statistics.mean(elapsed):.2f} ms, p50 {elapsed[len(elapsed) // 2]:.2f} ms"
+            )
+            transaction.set_rollback(True)
+
+    def populate(self, base: int, users: int, matches: int):
+        params = {"base": base, "users": users, "matches": matches}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO profile (user_id, user_name, memo, win_cnt, lose_cnt, total_cnt, image_url)
+                SELECT %(base)s + u, 'bench_' || (%(base)s + u), '', 0, 0, 0, 'default.png'
+                FROM generate_series(0, %(users)s - 1) u
+                """,
+                params,
+            )
+            # 두 선수는 항상 다른 유저
+            cursor.execute(
+                """
+                INSERT INTO match_history (
+                    player1_id_id, player2_id_id, winner_id_id,
+                    player1_score, player2_score, match_date, play_time
+                )
+                SELECT %(base)s + p1, %(base)s + p2,
+                    %(base)s + CASE WHEN g %% 2 = 0 THEN p1 ELSE p2 END,
+                    5, 3, now() - g * interval '1 second', 60 + g %% 120
+                FROM (
+                    SELECT g, g %% %(users)s AS p1,
+                        (g %% %(users)s + 1 + (g / %(users)s) %% (%(users)s - 1)) %% %(users)s AS p2
+                    FROM generate_series(1, %(matches)s) g
+                ) t
+                """,
+                params,
+            )
+            cursor.execute(
+                """
+                INSERT INTO user_stats (user_id, total_games, win_cnt, lose_cnt, total_play_time)
+                SELECT %(base)s + u, games, u %% (games + 1), games - u %% (games + 1), 0
+                FROM generate_series(0, %(users)s - 1) u, (SELECT 2 * %(matches)s / %(users)s AS games) t
+                ON CONFLICT (user_id) DO NOTHING
+                """,
+                params,
+            )
+            cursor.execute(
+                """
+                INSERT INTO win_rate_trend (user_id, game_number, win_rate)
+                SELECT %(base)s + g %% %(users)s, g / %(users)s + 1, 0.5
+                FROM generate_series(0, 2 * %(matches)s - 1) g
+                """,
+                params,
+            )
+            for table in ("profile", "match_history", "user_stats", "win_rate_trend"):
+                cursor.execute(f"ANALYZE {table}")
+
+    def explain(self, sql: str):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")
+            plan = cursor.fetchone()[0][0]
+
+        seq_scans = []
+        nodes = [plan["Plan"]]
+        while nodes:
+            node = nodes.pop()
+            if node["Node Type"] == "Seq Scan":
+                seq_scans.append(node["Relation Name"])
+            nodes.extend(node.get("Plans", []))
+
+        self.stdout.write(
+            f"{plan['Execution Time']:>8.3f}  {','.join(seq_scans) or '-':<24} {sql[:100]}"
+        )
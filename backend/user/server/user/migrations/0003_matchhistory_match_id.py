@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0002_profile_lose_cnt_profile_total_cnt_profile_win_cnt_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchhistory',
+            name='match_id',
+            field=models.BigIntegerField(null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,65 @@
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def backfill_aggregates(apps, schema_editor):
+    """
+    이미 저장된 경기들로 WinRateTrend, GlobalStats 를 채움
+    """
+    MatchHistory = apps.get_model('user', 'MatchHistory')
+    WinRateTrend = apps.get_model('user', 'WinRateTrend')
+    GlobalStats = apps.get_model('user', 'GlobalStats')
+
+    WinRateTrend.objects.all().delete()
+
+    totals = defaultdict(lambda: [0, 0])
+    trends = []
+    total_games = 0
+    total_play_time = 0
+    matches = MatchHistory.objects.order_by('match_date', 'id').values_list(
+        'player1_id_id', 'player2_id_id', 'winner_id_id', 'play_time'
+    )
+    for player1_id, player2_id, winner_id, play_time in matches.iterator():
+        total_games += 1
+        total_play_time += play_time
+        for user_id in (player1_id, player2_id):
+            total = totals[user_id]
+            total[0] += 1
+            total[1] += int(user_id == winner_id)
+            trends.append(WinRateTrend(
+                user_id=user_id,
+                game_number=total[0],
+                win_rate=round(total[1] / total[0], 2),
+            ))
+
+    WinRateTrend.objects.bulk_create(trends, batch_size=1000)
+    GlobalStats.objects.update_or_create(
+        id=1, defaults={'total_games': total_games, 'total_play_time': total_play_time}
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0003_matchhistory_match_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GlobalStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_games', models.PositiveIntegerField(default=0)),
+                ('total_play_time', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'global_stats',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='userstats',
+            index=models.Index(fields=['-win_cnt'], name='user_stats_win_cnt_idx'),
+        ),
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+    ]
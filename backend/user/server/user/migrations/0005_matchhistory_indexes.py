@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0004_globalstats_userstats_win_cnt_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='matchhistory',
+            index=models.Index(fields=['player1_id', '-match_date'], name='match_history_p1_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchhistory',
+            index=models.Index(fields=['player2_id', '-match_date'], name='match_history_p2_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchhistory',
+            index=models.Index(fields=['-match_date'], name='match_history_date_idx'),
+        ),
+    ]
@@ -34,9 +34,15 @@ class UserStats(models.Model):
 
     class Meta:
         db_table = "user_stats"
+        indexes = [
+            # 대시보드 리더보드
+            models.Index(fields=["-win_cnt"], name="user_stats_win_cnt_idx"),
+        ]
 
 
 class MatchHistory(models.Model):
+    # 게임 서버의 경기 id, 재전송된 결과를 거르는 데 사용
+    match_id = models.BigIntegerField(null=True, unique=True)
     player1_id = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name="player1_matches")
     player2_id = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name="player2_matches")
     player1_score = models.PositiveIntegerField()
@@ -48,6 +54,12 @@ class MatchHistory(models.Model):
     class Meta:
         db_table = "match_history"
         ordering = ["-match_date"]
+        indexes = [
+            # 유저별 최근 경기 (player1/player2 각각), 전체 최근 경기
+            models.Index(fields=["player1_id", "-match_date"], name="match_history_p1_date_idx"),
+            models.Index(fields=["player2_id", "-match_date"], name="match_history_p2_date_idx"),
+            models.Index(fields=["-match_date"], name="match_history_date_idx"),
+        ]
 
 
 class WinRateTrend(models.Model):
@@ -58,3 +70,16 @@ class WinRateTrend(models.Model):
     class Meta:
         db_table = "win_rate_trend"
         unique_together = ("user", "game_number")
+
+
+class GlobalStats(models.Model):
+    """
+    전체 경기 집계, 경기 결과가 저장될 때 갱신되는 한 줄짜리 테이블
+    """
+    SINGLETON_ID = 1
+
+    total_games = models.PositiveIntegerField(default=0)
+    total_play_time = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        db_table = "global_stats"
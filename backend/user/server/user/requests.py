@@ -0,0 +1,50 @@
+import logging
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from user.envs import HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS, HTTP_RETRIES, HTTP_POOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+def _make_session() -> requests.Session:
+    """
+    프로세스 전체가 하나의 세션을 사용해서, 호스트별 연결을 매번 새로 열지 않고 풀에서 재사용
+    """
+    # 연결 실패는 요청이 전송되지 않았으므로 모든 메서드를 재시도, 응답 읽기 실패는 POST 를 제외하고 재시도
+    retry = Retry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=HTTP_RETRIES,
+        status=0,
+        backoff_factor=0.1,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+session = _make_session()
+
+
+def post(url: str, json=None, timeout=None) -> requests.Response:
+    """
+    실패하면 requests.RequestException 을 그대로 올림
+    본문에는 토큰이 있을 수 있으므로 url 만 로그로 남김
+    """
+    start = time.perf_counter()
+    try:
+        res = session.post(
+            url, json=json, timeout=timeout or (HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS)
+        )
+    except requests.RequestException as e:
+        logger.error(f"POST {url} failed, {type(e).__name__}")
+        raise
+    logger.debug(f"POST {url} -> {res.status_code} in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return res
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from user.models import Profile, Friend
 import requests
+from user.requests import post
 import re
 from user.envs import JWT_URL
 
@@ -44,14 +45,22 @@ class FriendSerializer(serializers.ModelSerializer):
         fields = ['user_name', 'online_status'] 
 
     def get_online_status(self, value: Friend) -> bool:
-        user_id = value.friend.user_id
-        try:
-            response = requests.get(f"{JWT_URL}/jwt/online", params={"user_id": user_id} ,timeout=2)
-            if response.ok:
-                res = response.json()
-                return res["isonline"]
-        except requests.RequestException:
-            return False
-        return False
+        # FriendView 가 한 번에 조회해서 context 로 넘겨줌
+        return self.context.get("online", {}).get(value.friend_id, False)
 
 
+def get_online_statuses(user_ids: list) -> dict:
+    """
+    여러 유저의 온라인 여부를 JWT 서버에 한 번에 요청
+    실패하면 모두 offline
+    """
+    if not user_ids:
+        return {}
+    try:
+        response = post(f"{JWT_URL}/jwt/online", json={"user_ids": user_ids}, timeout=2)
+        if response.ok:
+            res = response.json()
+            return {int(user_id): isonline for user_id, isonline in res["isonline"].items()}
+    except requests.RequestException:
+        return {}
+    return {}
@@ -1,3 +1,268 @@
-from django.test import TestCase
+import threading
+import time
+from itertools import count
+from unittest.mock import MagicMock, patch
 
-# Create your tests here.
+from django.db import connection
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from user.cache import LocalCache, dashboard_cache
+from user.ingest import parse_match, record_matches
+from user.models import Profile, Friend
+from user.views import DashboardView, JWTAuthenticationMixin
+
+
+USER_ID = 1
+
+
+class QueryCountTestCase(APITestCase):
+    """
+    뷰의 쿼리 수가 데이터 양과 상관없이 일정한지 (N+1 이 없는지) 확인하는 테스트 기반 클래스
+    JWT 확인은 USER_ID 로 통과시키고, 다른 서비스로의 요청은 실패로 처리
+    """
+
+    def setUp(self):
+        self.ids = count(USER_ID + 1)
+        self.user = Profile.objects.create(user_id=USER_ID, user_name="user")
+
+        jwt_patch = patch.object(JWTAuthenticationMixin, "check_jwt", return_value=USER_ID)
+        jwt_patch.start()
+        self.addCleanup(jwt_patch.stop)
+
+        http_patch = patch("user.serializers.post", return_value=MagicMock(ok=False))
+        self.http_post = http_patch.start()
+        self.addCleanup(http_patch.stop)
+
+        dashboard_cache.invalidate()
+
+    def make_user(self) -> Profile:
+        user_id = next(self.ids)
+        return Profile.objects.create(user_id=user_id, user_name=f"user{user_id}")
+
+    def make_match(self, player1_id: int, player2_id: int, match_id=None) -> dict:
+        return {
+            "match_id": match_id,
+            "player1_id": player1_id,
+            "player2_id": player2_id,
+            "player1_score": 5,
+            "player2_score": 3,
+            "winner_id": player1_id,
+            "match_date": timezone.now().isoformat(),
+            "play_time": 60,
+        }
+
+    def record_match(self, player1_id: int = USER_ID) -> Profile:
+        opponent = self.make_user()
+        record_matches([parse_match(self.make_match(player1_id, opponent.user_id))])
+        return opponent
+
+    def count_queries(self, request) -> int:
+        dashboard_cache.invalidate()
+        with CaptureQueriesContext(connection) as ctx:
+            response = request()
+        self.assertLess(response.status_code, 300, response.content)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, request, grow, times: int = 5):
+        """
+        grow() 로 데이터를 늘린 뒤에도 request() 의 쿼리 수가 같은지 확인
+        """
+        before = self.count_queries(request)
+        for _ in range(times):
+            grow()
+        after = self.count_queries(request)
+        self.assertEqual(before, after, f"{before} queries became {after}")
+
+
+class ProfileQueryCountTest(QueryCountTestCase):
+    def test_get(self):
+        self.assertConstantQueries(lambda: self.client.get("/user/"), self.record_match)
+
+    def test_get_by_user_name(self):
+        other = self.make_user()
+        self.assertConstantQueries(
+            lambda: self.client.get("/user/", {"user_name": other.user_name}),
+            lambda: self.record_match(other.user_id),
+        )
+
+    def test_put(self):
+        self.assertConstantQueries(
+            lambda: self.client.put("/user/", {"memo": "memo"}, format="json"),
+            self.record_match,
+        )
+
+
+class FriendQueryCountTest(QueryCountTestCase):
+    def add_friend(self):
+        Friend.objects.create(_user=self.user, friend=self.make_user())
+
+    def test_get(self):
+        self.add_friend()
+        self.assertConstantQueries(lambda: self.client.get("/user/friend"), self.add_friend)
+
+    def test_get_online_in_one_request(self):
+        for _ in range(5):
+            self.add_friend()
+        self.client.get("/user/friend")
+        self.assertEqual(self.http_post.call_count, 1)
+
+    def test_post(self):
+        def request():
+            friend = self.make_user()
+            return self.client.post("/user/friend", {"user_name": friend.user_name}, format="json")
+
+        self.assertConstantQueries(request, self.add_friend)
+
+
+class DashboardQueryCountTest(QueryCountTestCase):
+    def test_get(self):
+        self.record_match()
+        self.assertConstantQueries(
+            lambda: self.client.get("/user/dashboard"),
+            lambda: (self.record_match(), self.record_match(self.make_user().user_id)),
+        )
+
+    def test_get_without_matches(self):
+        self.assertConstantQueries(lambda: self.client.get("/user/dashboard"), self.make_user)
+
+
+class InternalUserQueryCountTest(QueryCountTestCase):
+    def test_get(self):
+        self.assertConstantQueries(
+            lambda: self.client.get("/_internal/user", {"user_id": USER_ID}),
+            self.record_match,
+        )
+
+    def test_post(self):
+        def request():
+            user_id = next(self.ids)
+            return self.client.post(
+                "/_internal/user", {"user_id": user_id, "user_name": f"user{user_id}"}, format="json"
+            )
+
+        self.assertConstantQueries(request, self.record_match)
+
+
+class InternalDashboardQueryCountTest(QueryCountTestCase):
+    def test_post(self):
+        match_ids = count(1)
+
+        def request():
+            match = self.make_match(USER_ID, self.make_user().user_id, next(match_ids))
+            return self.client.post("/_internal/dashboard", match, format="json")
+
+        self.assertConstantQueries(request, self.record_match)
+
+    def test_post_batch(self):
+        """
+        배치 크기와 상관없이 쿼리 수가 같아야 함
+        """
+        match_ids = count(1)
+
+        def prepare(size: int):
+            self.batch = [
+                self.make_match(self.make_user().user_id, self.make_user().user_id, next(match_ids))
+                for _ in range(size)
+            ]
+
+        prepare(2)
+        self.assertConstantQueries(
+            lambda: self.client.post("/_internal/dashboard/batch", {"matches": self.batch}, format="json"),
+            lambda: prepare(10),
+            times=1,
+        )
+
+    def test_post_batch_duplicated(self):
+        matches = [self.make_match(USER_ID, self.make_user().user_id, match_id) for match_id in (1, 2)]
+        self.client.post("/_internal/dashboard/batch", {"matches": matches}, format="json")
+
+        response = self.client.post("/_internal/dashboard/batch", {"matches": matches}, format="json")
+        self.assertEqual(response.json()["duplicated"], [1, 2])
+        self.assertEqual(Profile.objects.get(user_id=USER_ID).total_cnt, 2)
+
+    def test_post_batch_malformed(self):
+        """
+        형식이 잘못된 경기만 거절되고 나머지는 저장되어야 함
+        """
+        malformed = self.make_match(USER_ID, self.make_user().user_id, 2)
+        del malformed["winner_id"]
+        matches = [self.make_match(USER_ID, self.make_user().user_id, 1), malformed, "match"]
+
+        response = self.client.post("/_internal/dashboard/batch", {"matches": matches}, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()["recorded"], [1])
+        self.assertEqual(response.json()["rejected"], [2, None])
+        self.assertEqual(Profile.objects.get(user_id=USER_ID).total_cnt, 1)
+
+
+class DashboardCacheTest(QueryCountTestCase):
+    def get_recent_matches(self) -> list:
+        response = self.client.get("/user/dashboard")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["game_session"]["recent_matches"]
+
+    def test_cached_between_matches(self):
+        with patch.object(
+            DashboardView, "_get_global_session", autospec=True, side_effect=DashboardView._get_global_session
+        ) as compute:
+            self.get_recent_matches()
+            self.get_recent_matches()
+        self.assertEqual(compute.call_count, 1)
+
+    def test_read_after_ingest_is_fresh(self):
+        # 경기가 없으면 기본 경기 하나가 캐시됨
+        self.assertEqual(self.get_recent_matches()[0]["winner_name"], "Nan")
+
+        # 커밋 후에 캐시가 무효화됨
+        with self.captureOnCommitCallbacks(execute=True):
+            opponent = self.record_match()
+
+        recent = self.get_recent_matches()
+        self.assertEqual(len(recent), 1)
+        self.assertEqual(recent[0]["winner_name"], self.user.user_name)
+        self.assertEqual(recent[0]["loser_name"], opponent.user_name)
+        self.assertEqual(recent[0]["winner_score"], 5)
+        self.assertEqual(recent[0]["loser_score"], 3)
+
+        # 이미 경기가 있을 때도 새 경기가 맨 앞에 보임
+        with self.captureOnCommitCallbacks(execute=True):
+            opponent = self.record_match()
+
+        recent = self.get_recent_matches()
+        self.assertEqual(len(recent), 2)
+        self.assertEqual(recent[0]["loser_name"], opponent.user_name)
+
+
+class LocalCacheTest(SimpleTestCase):
+    def test_concurrent_get_or_compute_computes_once(self):
+        cache = LocalCache(ttl=60)
+        calls = []
+        results = []
+        barrier = threading.Barrier(8)
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return {"value": 1}
+
+        def get():
+            barrier.wait()
+            results.append(cache.get_or_compute("key", compute))
+
+        threads = [threading.Thread(target=get) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"value": 1}] * 8)
+
+    def test_invalidate(self):
+        cache = LocalCache(ttl=60)
+        cache.get_or_compute("key", lambda: 1)
+        cache.invalidate()
+        self.assertEqual(cache.get_or_compute("key", lambda: 2), 2)
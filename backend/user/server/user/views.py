@@ -3,19 +3,24 @@ from rest_framework.response import Response
 from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.request import Request
 from rest_framework import status
-import requests
 
 from django.core.files.uploadedfile import UploadedFile
-from django.utils.dateparse import parse_datetime
-from django.db.models import Avg, Q
-from user.models import Profile, Friend, MatchHistory, UserStats 
-from user.serializers import ProfileSerializer, FriendSerializer 
-from user.envs import JWT_URL
+from user.models import Profile, Friend, MatchHistory, UserStats, WinRateTrend, GlobalStats
+from user.serializers import ProfileSerializer, FriendSerializer, get_online_statuses
+from user.ingest import parse_match, record_matches
+from user.cache import dashboard_cache
+from user.envs import JWT_URL, JWT_SECRET, JWT_ALGORITHM, JWT_CHANGES_POLL_SECONDS
+from shared.jwt_verify import JwtVerifier, JwtCheckError
+from user.requests import post
 
 from PIL import Image
 import os
 
 
+# 서명과 만료는 직접 확인하고, 유저별 현재 secret 은 JWT 서비스의 변경 사항을 JWT_CHANGES_POLL_SECONDS 마다 가져와 갱신
+jwt_verifier = JwtVerifier(JWT_SECRET, JWT_ALGORITHM, JWT_URL, post, JWT_CHANGES_POLL_SECONDS)
+
+
 class JWTAuthenticationMixin:
     def check_jwt(self, req: Request):
         if "Authorization" not in req._request.headers:
@@ -26,14 +31,11 @@ class JWTAuthenticationMixin:
             raise PermissionError("error: Invalid Authorization header.")
 
         jwt = authorization_header[7:] 
-        res = requests.post(
-            f"{JWT_URL}/jwt/check", json={"jwt": jwt, "skip_2fa": True}
-        )
-        if not res.ok:
-            error_message = f"JWT_Error: {res.content.decode()} (Status Code: {res.status_code})"
+        try:
+            return jwt_verifier.verify(jwt, True)
+        except JwtCheckError as e:
+            error_message = f"JWT_Error: {e.content} (Status Code: {e.status_code})"
             raise PermissionError(error_message)
-        res = res.json()
-        return int(res["user_id"]) 
     
 
 
@@ -120,8 +122,9 @@ class FriendView(APIView, JWTAuthenticationMixin):
             user_profile = Profile.objects.filter(user_id=user_id).first()
             if not user_profile:
                 return Response({'error': 'user_profile is not found.'}, status=status.HTTP_404_NOT_FOUND)
-            friends = Friend.objects.filter(_user=user_profile)
-            serializer = FriendSerializer(friends, many=True)
+            friends = list(Friend.objects.filter(_user=user_profile).select_related('friend'))
+            online = get_online_statuses([f.friend_id for f in friends if f.friend_id is not None])
+            serializer = FriendSerializer(friends, many=True, context={"online": online})
             return Response(serializer.data, status=status.HTTP_200_OK)
         except PermissionError as e:
             return Response({'error': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
@@ -166,49 +169,7 @@ class DashboardView(APIView, JWTAuthenticationMixin):
     def get(self, req: Request):
         try:
             user_id = self.check_jwt(req)
-            user_profile = self._get_user_profile(user_id)
-            user_stats = self._get_user_stats(user_profile)
-            
-            current_user_win_rate_trend = self._compute_win_rate_trend(user_profile)
-            top_user_stats = self._get_top_user_stats()
-            if top_user_stats:
-                top_user_win_rate_trend = self._compute_win_rate_trend(top_user_stats.user)
-            else:
-                top_user_win_rate_trend = [0, 0, 0, 0, 0]
-            
-            user_total_time = user_stats.total_play_time
-            overall_avg_time = self._calculate_game_time()
-            recent_user_matches = self._get_recent_user_matches(user_profile)
-            top_5_winners = self._get_top_5_winners()
-            top_5_game_time = self._get_top_5_game_time()
-            recent_matches = self._get_recent_matches()
-            
-            response_data = {
-                "user_session": {
-                    "user_stats": {
-                        "user_name": user_profile.user_name,
-                        "total_games": user_stats.total_games
-                    },
-                    "user_win_rate": {
-                        "wins": user_stats.win_cnt,
-                        "losses": user_stats.lose_cnt
-                    },
-                    "win_rate_trend": {
-                        "current_user": current_user_win_rate_trend,
-                        "top_user": top_user_win_rate_trend
-                    },
-                    "total_game_time": {
-                        "user_total_time": user_total_time,
-                        "avg_total_time": round(overall_avg_time, 1)
-                    },
-                    "recent_user_matches": recent_user_matches
-                },
-                "game_session": {
-                    "top_5_winners": top_5_winners,
-                    "top_5_game_time": top_5_game_time,
-                    "recent_matches": recent_matches
-                }
-            }
+            response_data = self._get_dashboard(user_id)
             
             return Response(response_data, status=status.HTTP_200_OK)
         except PermissionError as e:
@@ -216,88 +177,151 @@ class DashboardView(APIView, JWTAuthenticationMixin):
         except Exception as e:
             return Response({'error': f'Internal Server Error : {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def _get_dashboard(self, user_id: int) -> dict:
+        user_profile = self._get_user_profile(user_id)
+        user_stats = self._get_user_stats(user_profile)
+
+        current_user_win_rate_trend = self._compute_win_rate_trend(user_profile.user_id)
+        user_total_time = user_stats.total_play_time
+        recent_user_matches = self._get_recent_user_matches(user_profile)
+
+        # 모든 유저에게 같은 부분은 캐시에서 (경기 결과가 저장되면 무효화)
+        global_session = dashboard_cache.get_or_compute("dashboard:global", self._get_global_session)
+        top_user_win_rate_trend = global_session["top_user_win_rate_trend"]
+        overall_avg_time = global_session["overall_avg_time"]
+        top_5_winners = global_session["top_5_winners"]
+        top_5_game_time = global_session["top_5_game_time"]
+        recent_matches = global_session["recent_matches"]
+
+        return {
+            "user_session": {
+                "user_stats": {
+                    "user_name": user_profile.user_name,
+                    "total_games": user_stats.total_games
+                },
+                "user_win_rate": {
+                    "wins": user_stats.win_cnt,
+                    "losses": user_stats.lose_cnt
+                },
+                "win_rate_trend": {
+                    "current_user": current_user_win_rate_trend,
+                    "top_user": top_user_win_rate_trend
+                },
+                "total_game_time": {
+                    "user_total_time": user_total_time,
+                    "avg_total_time": round(overall_avg_time, 1)
+                },
+                "recent_user_matches": recent_user_matches
+            },
+            "game_session": {
+                "top_5_winners": top_5_winners,
+                "top_5_game_time": top_5_game_time,
+                "recent_matches": recent_matches
+            }
+        }
+
     def _get_user_profile(self, user_id: int) -> Profile:
-        user_profile = Profile.objects.filter(user_id=user_id).first()
+        # UserStats 도 같은 쿼리로 가져옴
+        user_profile = Profile.objects.select_related('stats').filter(user_id=user_id).first()
         if not user_profile:
             raise Exception("User profile not found.")
         return user_profile
 
     def _get_user_stats(self, user_profile: Profile) -> UserStats:
-        user_stats = UserStats.objects.filter(user=user_profile).first()
-        if not user_stats:
-            user_stats = UserStats(
+        try:
+            return user_profile.stats
+        except UserStats.DoesNotExist:
+            return UserStats(
                 user=user_profile,
                 total_games=0,
                 win_cnt=0,
                 lose_cnt=0,
                 total_play_time=0
 			)
-        return user_stats
 
-    def _compute_win_rate_trend(self, user: Profile) -> list:
+    def _compute_win_rate_trend(self, user_id: int) -> list:
         """
-        유저가 참여한 경기들의 누적 승률을 계산하고, 
-        마지막 5경기의 승률 추세를 반환
+        유저의 마지막 5경기 누적 승률 추세를 반환
+        (WinRateTrend 는 경기 결과가 저장될 때 갱신됨)
         """
-        matches = MatchHistory.objects.filter(
-            Q(player1_id=user) | Q(player2_id=user)
-        ).order_by('match_date')
-
-        cumulative_wins = 0 #누적된 이긴 횟수
-        trend = []
-        for idx, match in enumerate(matches, start=1):
-            if match.winner_id == user:
-                cumulative_wins += 1
-            win_rate = cumulative_wins / idx
-            trend.append(round(win_rate, 2))
-        
+        trend = list(
+            WinRateTrend.objects.filter(user_id=user_id)
+            .order_by('-game_number')
+            .values_list('win_rate', flat=True)[:5]
+        )
+        trend.reverse()
+
         while len(trend) < 5:
             trend.insert(0, 0)
-        if len(trend) > 5:
-            trend = trend[-5:]
         return trend
 
-    def _get_top_user_stats(self) -> UserStats:
+    def _get_global_session(self) -> dict:
+        """
+        유저와 상관없는 대시보드 정보 (리더보드, 전체 평균 시간, 최근 경기)
+        """
+        top_user_id = self._get_top_user_id()
+        if top_user_id is not None:
+            top_user_win_rate_trend = self._compute_win_rate_trend(top_user_id)
+        else:
+            top_user_win_rate_trend = [0, 0, 0, 0, 0]
+
+        top_5_stats = self._get_top_5_stats()
+        return {
+            "top_user_win_rate_trend": top_user_win_rate_trend,
+            "overall_avg_time": self._calculate_game_time(),
+            "top_5_winners": self._get_top_5_winners(top_5_stats),
+            "top_5_game_time": self._get_top_5_game_time(top_5_stats),
+            "recent_matches": self._get_recent_matches(),
+        }
+
+    def _get_top_user_id(self):
         """
-        승리 횟수 기준 1등 유저의 UserStats를 반환
+        승리 횟수 기준 1등 유저의 user_id를 반환
         """
-        return UserStats.objects.order_by('-win_cnt').first()
+        return UserStats.objects.order_by('-win_cnt').values_list('user_id', flat=True).first()
 
     def _calculate_game_time(self) -> float:
         """
         유저의 전체 평균 게임 시간을 계산 (초 단위)
         """
-        overall_avg_play_time = (
-            MatchHistory.objects.aggregate(avg_time=Avg('play_time'))['avg_time'] or 0.0
-        )
-        return overall_avg_play_time
+        global_stats = GlobalStats.objects.filter(id=GlobalStats.SINGLETON_ID).first()
+        if not global_stats or global_stats.total_games == 0:
+            return 0.0
+        return global_stats.total_play_time / global_stats.total_games
 
     def _get_recent_user_matches(self, user: Profile) -> list:
         """
         유저가 참여한 최근 10경기의 정보를 반환
         """
-        qs = MatchHistory.objects.filter(
-            Q(player1_id=user) | Q(player2_id=user)
-        ).order_by('-match_date')[:10]
-        
+        # player1/player2 각각의 (player, match_date) 인덱스로 10개씩 읽고 합침
+        # (OR 조건 하나로는 유저의 모든 경기를 정렬하게 됨)
+        fields = (
+            'player1_id', 'player2_id', 'winner_id', 'match_date',
+            'player1_score', 'player2_score', 'play_time',
+            'player1_id__user_name', 'player2_id__user_name',
+        )
+        as_player1 = MatchHistory.objects.filter(player1_id=user).order_by('-match_date').values(*fields)[:10]
+        as_player2 = MatchHistory.objects.filter(player2_id=user).order_by('-match_date').values(*fields)[:10]
+        qs = as_player1.union(as_player2, all=True).order_by('-match_date')[:10]
+
         matches = []
         for match in qs:
-            if match.player1_id == user:
-                opponent = match.player2_id
-                user_score = match.player1_score
-                opponent_score = match.player2_score
+            if match['player1_id'] == user.user_id:
+                opponent_name = match['player2_id__user_name']
+                user_score = match['player1_score']
+                opponent_score = match['player2_score']
             else:
-                opponent = match.player1_id
-                user_score = match.player2_score
-                opponent_score = match.player1_score
+                opponent_name = match['player1_id__user_name']
+                user_score = match['player2_score']
+                opponent_score = match['player1_score']
 
             matches.append({
                 "user_name": user.user_name,
-                "opponent_name": opponent.user_name,
-                "win": (match.winner_id == user),
+                "opponent_name": opponent_name,
+                "win": (match['winner_id'] == user.user_id),
                 "user_score": user_score,
                 "opponent_score": opponent_score,
-                "game_time": match.play_time,
+                "game_time": match['play_time'],
             })
         if not matches:
             default_match = {
@@ -311,30 +335,38 @@ class DashboardView(APIView, JWTAuthenticationMixin):
             return [default_match]
         return matches
 
-    def _get_top_5_winners(self) -> list:
+    def _get_top_5_stats(self) -> list:
+        """
+        승리 횟수 기준 상위 5명의 리더보드 정보, 한 번의 쿼리
+        """
+        return list(
+            UserStats.objects.filter(total_games__gt=0)
+            .order_by('-win_cnt')
+            .values('user__user_name', 'win_cnt', 'total_play_time')[:5]
+        )
+
+    def _get_top_5_winners(self, top_5_stats: list) -> list:
         """
         상위 5명의 유저네임과 승리 횟수 반환
         """
-        qs = UserStats.objects.filter(total_games__gt=0).order_by('-win_cnt')[:5]
         top_winners = [{
-            "user_name": stat.user.user_name,
-            "win_count": stat.win_cnt
-        } for stat in qs]
+            "user_name": stat['user__user_name'],
+            "win_count": stat['win_cnt']
+        } for stat in top_5_stats]
 
         while len(top_winners) < 5:
             top_winners.append({"user_name": "Nan", "win_count": 0})
 
         return top_winners
 
-    def _get_top_5_game_time(self) -> list:
+    def _get_top_5_game_time(self, top_5_stats: list) -> list:
         """
         상위 5명의 유저네임과 총 게임 이용 시간 반환 
         """
-        qs = UserStats.objects.filter(total_games__gt=0).order_by('-win_cnt')[:5]
         top_game_time = [{
-            "user_name": stat.user.user_name,
-            "game_time": stat.total_play_time
-        } for stat in qs]
+            "user_name": stat['user__user_name'],
+            "game_time": stat['total_play_time']
+        } for stat in top_5_stats]
 
         while len(top_game_time) < 5:
             top_game_time.append({"user_name": "Nan", "game_time": 0})
@@ -345,25 +377,32 @@ class DashboardView(APIView, JWTAuthenticationMixin):
         """
         전체 경기 중 최근 10경기의 정보를 반환
         """
-        qs = MatchHistory.objects.all().order_by('-match_date')[:10]
-        
+        qs = MatchHistory.objects.order_by('-match_date').values(
+            'player1_id', 'winner_id',
+            'player1_score', 'player2_score', 'play_time',
+            'player1_id__user_name', 'player2_id__user_name',
+        )[:10]
+
         matches = []
         for match in qs:
-            if match.winner_id == match.player1_id:
-                winner_score = match.player1_score
-                loser_score = match.player2_score
-                loser_name = match.player2_id.user_name
+            # 승자는 항상 두 선수 중 한 명
+            if match['winner_id'] == match['player1_id']:
+                winner_name = match['player1_id__user_name']
+                winner_score = match['player1_score']
+                loser_score = match['player2_score']
+                loser_name = match['player2_id__user_name']
             else:
-                winner_score = match.player2_score
-                loser_score = match.player1_score
-                loser_name = match.player1_id.user_name
+                winner_name = match['player2_id__user_name']
+                winner_score = match['player2_score']
+                loser_score = match['player1_score']
+                loser_name = match['player1_id__user_name']
 
             matches.append({
-                "winner_name": match.winner_id.user_name,
+                "winner_name": winner_name,
                 "loser_name": loser_name,
                 "winner_score": winner_score,
                 "loser_score": loser_score,
-                "match_playtime": match.play_time,
+                "match_playtime": match['play_time'],
             })
         if not matches:
             default_match = {
@@ -420,58 +459,45 @@ class InternalDashboardView(APIView):
 
     def post(self, req :Request):
         try:
-            data = req.data
-            player1_id = int(data.get("player1_id"))
-            player2_id = int(data.get("player2_id"))
-            player1_score = int(data.get("player1_score"))
-            player2_score = int(data.get("player2_score"))
-            winner_id = int(data.get("winner_id"))
-            match_date = parse_datetime(data.get("match_date"))
-            play_time = int(data.get("play_time"))
-
-            if any(field is None for field in [player1_id, player2_id, player1_score, player2_score, winner_id, match_date, play_time]):
-                return Response({"error": "All fields are required."}, status=status.HTTP_400_BAD_REQUEST)
-
-            player1 = Profile.objects.get(pk=player1_id)
-            player2 = Profile.objects.get(pk=player2_id)
-            winner = Profile.objects.get(pk=winner_id)
-            
-            match = MatchHistory.objects.create(
-                player1_id=player1,
-                player2_id=player2,
-                player1_score=player1_score,
-                player2_score=player2_score,
-                winner_id=winner,
-                match_date=match_date,
-                play_time=play_time
-            )
-            match.save()
-            self.update_user_info(player1_id, winner_id, play_time)
-            self.update_user_info(player2_id, winner_id, play_time)
+            try:
+                match = parse_match(req.data)
+            except (ValueError, TypeError) as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            result = record_matches([match])
+            if result["rejected"]:
+                return Response({"error": "player is not found."}, status=status.HTTP_404_NOT_FOUND)
             return Response({"message": "Match recorded successfully."}, status=status.HTTP_201_CREATED)
 
         except Exception as e:
             return Response({'error': f'Internal Server Error -> {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def update_user_info(self, user_id, winner_id, play_time):
-        # user profile
-        user_profile = Profile.objects.filter(user_id=user_id).first()
-        if not user_profile:
-            return
 
-        user_profile.total_cnt += 1
-        if user_id == winner_id:
-            user_profile.win_cnt += 1
-        else:
-            user_profile.lose_cnt += 1
-        user_profile.save()
-
-        # user stat
-        user_stats, created = UserStats.objects.get_or_create(user=user_profile)
-        user_stats.total_games += 1
-        if user_id == winner_id:
-            user_stats.win_cnt += 1
-        else:
-            user_stats.lose_cnt += 1
-        user_stats.total_play_time += play_time
-        user_stats.save()
\ No newline at end of file
+#/_internal/dashboard/batch
+class InternalDashboardBatchView(APIView):
+    parser_classes = [JSONParser]
+
+    def post(self, req :Request):
+        """
+        여러 경기 결과를 한 트랜잭션에서 저장
+        형식이 잘못된 경기는 저장하지 않고 rejected 에 match_id 를 담음 (나머지 경기는 저장)
+        """
+        try:
+            data = req.data.get("matches")
+            if not isinstance(data, list):
+                return Response({"error": "matches must be a list."}, status=status.HTTP_400_BAD_REQUEST)
+
+            matches = []
+            malformed = []
+            for item in data:
+                try:
+                    matches.append(parse_match(item))
+                except (ValueError, TypeError, AttributeError):
+                    malformed.append(item.get("match_id") if isinstance(item, dict) else None)
+
+            result = record_matches(matches)
+            result["rejected"] = malformed + result["rejected"]
+            return Response(result, status=status.HTTP_201_CREATED)
+
+        except Exception as e:
+            return Response({'error': f'Internal Server Error -> {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
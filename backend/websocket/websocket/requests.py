@@ -1,43 +1,85 @@
-import json as j
 import logging
+import time
 from typing import Any
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 from exceptions.CustomException import InternalException
+from websocket.envs import (
+    HTTP_CONNECT_TIMEOUT_SECONDS,
+    HTTP_POOL_SIZE,
+    HTTP_READ_TIMEOUT_SECONDS,
+    HTTP_RETRIES,
+)
 
 logger = logging.getLogger(__name__)
 
 
-def post(
-    url: str, json: dict[str, Any] | None = None, data: dict[str, Any] | None = None
-):
+def _make_session() -> requests.Session:
+    """
+    One session for every request of the process, so connections to each host
+    are pooled and kept alive instead of opened for every request.
+    """
+    # Failed connects are retried for every method, as nothing was sent.
+    # Failed reads are only retried for idempotent methods (not POST).
+    retry = Retry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=HTTP_RETRIES,
+        status=0,
+        backoff_factor=0.1,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_SIZE,
+        pool_maxsize=HTTP_POOL_SIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+session = _make_session()
+
+
+def _request(method: str, url: str, **kwargs) -> requests.Response:
+    # Bodies and params may hold tokens, so only the url is logged
+    start = time.perf_counter()
     try:
-        logger.info(f"post to url={url}, json={j.dumps(json)}, data={j.dumps(data)}")
-        return requests.post(url, json=json, data=data)
+        res = session.request(
+            method,
+            url,
+            timeout=(HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS),
+            **kwargs,
+        )
     except Exception as e:
-        logger.error(e)
+        logger.error(f"{method} {url} failed, {type(e).__name__}")
         raise InternalException()
 
+    logger.debug(
+        f"{method} {url} -> {res.status_code} "
+        f"in {(time.perf_counter() - start) * 1000:.1f} ms"
+    )
+    return res
+
+
+def post(
+    url: str, json: dict[str, Any] | None = None, data: dict[str, Any] | None = None
+):
+    return _request("POST", url, json=json, data=data)
+
 
 def get(
     url: str,
     params: dict[str, Any] | None = None,
     headers: dict[str, Any] | None = None,
 ):
-    try:
-        logger.info(
-            f"get to url={url}, params={j.dumps(params)}, headers={j.dumps(headers)}"
-        )
-        return requests.get(url, params=params, headers=headers)
-    except Exception as e:
-        logger.error(e)
-        raise InternalException()
+    return _request("GET", url, params=params, headers=headers)
 
 
 def delete(url: str, params: dict[str, Any] | None = None):
-    try:
-        logger.info(f"delete to url={url}, params={j.dumps(params)}")
-        return requests.delete(url, params=params)
-    except Exception as e:
-        logger.error(e)
-        raise InternalException()
+    return _request("DELETE", url, params=params)
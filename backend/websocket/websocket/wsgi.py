@@ -27,7 +27,13 @@ from exceptions.CustomException import (
     WebSocketRoomNotJoinedException,
 )
 from websocket.decorators import event_on
-from websocket.envs import JWT_URL, GAME_URL
+from websocket.envs import (
+    GAME_URL,
+    JWT_ALGORITHM,
+    JWT_CHANGES_POLL_SECONDS,
+    JWT_SECRET,
+    JWT_URL,
+)
 from websocket.requests import post
 from websocket.room import Room
 from websocket.roomuser import RoomUser, RoomUserJson
@@ -47,6 +53,7 @@ from websocket.utils import (
     get_joined_room,
     get_str,
 )
+from shared.jwt_verify import JwtCheckError, JwtVerifier
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "websocket.settings")
 
@@ -123,6 +130,14 @@ ROOM_MANAGER = RoomManager()
 
 user_dict = UserDict()
 
+jwt_verifier = JwtVerifier(
+    JWT_SECRET,
+    JWT_ALGORITHM,
+    JWT_URL,
+    post,
+    JWT_CHANGES_POLL_SECONDS,
+)
+
 
 def get_session_info(sid) -> int:
     with sio.session(sid) as sess:
@@ -135,13 +150,11 @@ def get_session_info(sid) -> int:
 
 
 def _get_user_id_from_jwt(jwt: str) -> int:
-    res = post(f"{JWT_URL}/jwt/check", json={"jwt": jwt, "skip_2fa": False})
-    if not res.ok:
-        logger.error(f"post failed, content={res.text}")
-        raise ConnectionRefusedError(res.text)
-
-    json = res.json()
-    return json["user_id"]
+    try:
+        return jwt_verifier.verify(jwt, False)
+    except JwtCheckError as e:
+        logger.error(f"jwt check failed, content={e.content}")
+        raise ConnectionRefusedError(e.content)
 
 
 def _connect(sid: str, environ, auth: dict[str, Any]):
@@ -293,17 +306,22 @@ def sio_start_game(sid: str, data: dict[str, Any]):
 
     user_emit_datas: list[tuple[str, TokenDto]] = []
 
+    resp = post(
+        f"{JWT_URL}/jwt/token/batch",
+        {"user_ids": room.user_list, "twofa_delete": False},
+    )
+    if not resp.ok:
+        raise CustomException(resp.text, resp.status_code)
+    tokens = resp.json()["tokens"]
+
     for user_id in room.user_list:
-        resp = post(f"{JWT_URL}/jwt/token", {"user_id": user_id, "twofa_delete": False})
-        if not resp.ok:
-            raise CustomException(resp.text, resp.status_code)
-        resp_json = resp.json()
+        token = tokens[str(user_id)]
         user_emit_datas.append(
             (
                 user_dict.get(user_id).sid,
                 TokenDto(
-                    access_token=resp_json["access_token"],
-                    refresh_token=resp_json["refresh_token"],
+                    access_token=token["access_token"],
+                    refresh_token=token["refresh_token"],
                 ),
             )
         )
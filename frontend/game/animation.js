@@ -4,6 +4,11 @@ let shouldAnimate = true; // 애니메이션 실행 여부 플래그
 let keyState = {};
 let paddleDirection = 0;
 
+// 서버의 공 속도(vx, vy)는 틱(1/60초)당 이동 거리
+const SERVER_TICK_RATE = 60;
+const BALL_LIMIT_X = 4.8;
+const BALL_LIMIT_Y = 6.8;
+
 export function handleKeyDown(event, paddleId) {
   if (event.key === "ArrowLeft")
     paddleDirection = paddleId === "paddle2" ? 1 : -1;
@@ -74,6 +79,7 @@ export function animate(scene, camera, composer, socket, paddleId) {
       ball.rotation.y += 5 * deltaTime;
       ball.vel += 0.1 * deltaTime;
       ball.vel = Math.min(ball.vel, 3);
+      extrapolateBall(ball, deltaTime);
     }
 
     const paddle = scene.getObjectByName(paddleId);
@@ -100,6 +106,28 @@ export function animate(scene, camera, composer, socket, paddleId) {
   update();
 }
 
+// 서버는 충돌, 리셋 시점과 주기적인 keyframe에만 updateBall을 보낼 수 있으므로
+// 그 사이에는 마지막으로 받은 속도로 공의 위치를 예측
+function extrapolateBall(ball, deltaTime) {
+  let vx = ball.userData.vx || 0;
+  const vy = ball.userData.vy || 0;
+  const ticks = deltaTime * SERVER_TICK_RATE;
+
+  // 서버처럼 벽에서 튕김: 벽을 넘어간 만큼 위치를 반사하고 vx 부호를 바꿈
+  let x = ball.position.x + vx * ticks;
+  while (x > BALL_LIMIT_X || x < -BALL_LIMIT_X) {
+    x = x > 0 ? 2 * BALL_LIMIT_X - x : -2 * BALL_LIMIT_X - x;
+    vx = -vx;
+  }
+  ball.position.x = x;
+  ball.userData.vx = vx;
+
+  ball.position.y = Math.max(
+    -BALL_LIMIT_Y,
+    Math.min(BALL_LIMIT_Y, ball.position.y + vy * ticks)
+  );
+}
+
 // 애니메이션 중단 함수
 export function stopAnimation() {
   shouldAnimate = false;
@@ -8,6 +8,7 @@ import {
 } from "./animation.js";
 import { updateScore } from "./scoreboard.js";
 import { showGameOver, updateGamePopup } from "./gameOver.js";
+import { decodeBall, decodePaddle, decodeScore, decodeWith } from "./wire.js";
 import { JWT } from "../modules/authentication/jwt.mjs";
 import { clearBody } from "../modules/page/lowRankElements.mjs";
 import { LOGIN_EXPIRED_MSG } from "../modules/authentication/globalConstants.mjs";
@@ -23,6 +24,7 @@ export const gameSocketConnect = () => {
   socket = io("/game", {
     auth: {
       jwt: JWT.getJWTTokenFromCookie().accessToken,
+      binary: true,
     },
     path: "/game-sio/",
   });
@@ -98,19 +100,24 @@ export const runPongGame = () => {
       animate(scene, camera, composer, socket, paddleId);
     });
 
-    socket.on("updatePaddle", (data) => {
+    socket.on("updatePaddle", (packet) => {
+      const data = decodeWith(decodePaddle, packet);
       const paddle = scene.getObjectByName(data.paddleId);
       if (paddle) paddle.position.x = data.position;
     });
 
-    socket.on("updateBall", (ballData) => {
+    socket.on("updateBall", (packet) => {
+      const ballData = decodeWith(decodeBall, packet);
       const ball = scene.getObjectByName("ball");
       if (ball) {
         ball.position.set(ballData.x, ballData.y, 0.2);
+        ball.userData.vx = ballData.vx;
+        ball.userData.vy = ballData.vy;
       }
     });
 
-    socket.on("updateScore", (scores) => {
+    socket.on("updateScore", (packet) => {
+      const scores = decodeWith(decodeScore, packet);
       player1Score = scores.paddle1;
       player2Score = scores.paddle2;
       updateScore(scene, player1Score, player2Score, paddleId);
@@ -165,6 +172,8 @@ export const runPongGame = () => {
     if (paddle2) paddle2.position.set(0, 6.5, 0.2);
     if (ball) {
       ball.position.set(0, 0, 0.2);
+      ball.userData.vx = 0;
+      ball.userData.vy = 0;
       ball.vel = 0;
     }
   }
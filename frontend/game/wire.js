@@ -0,0 +1,36 @@
+// 서버의 gameapp/wire.py 와 같은 little-endian 바이너리 포맷
+// 모든 메시지는 매치별 sequence number(uint32)로 시작
+
+export function decodeBall(buffer) {
+  const view = new DataView(buffer);
+  return {
+    seq: view.getUint32(0, true),
+    x: view.getFloat32(4, true),
+    y: view.getFloat32(8, true),
+    vx: view.getFloat32(12, true),
+    vy: view.getFloat32(16, true),
+  };
+}
+
+export function decodePaddle(buffer) {
+  const view = new DataView(buffer);
+  return {
+    seq: view.getUint32(0, true),
+    paddleId: view.getUint8(4) === 0 ? "paddle1" : "paddle2",
+    position: view.getFloat32(5, true),
+  };
+}
+
+export function decodeScore(buffer) {
+  const view = new DataView(buffer);
+  return {
+    seq: view.getUint32(0, true),
+    paddle1: view.getUint16(4, true),
+    paddle2: view.getUint16(6, true),
+  };
+}
+
+// JSON 클라이언트와 같은 핸들러를 쓰기 위해, 바이너리일 때만 디코딩
+export function decodeWith(decoder, data) {
+  return data instanceof ArrayBuffer ? decoder(data) : data;
+}